@@ -0,0 +1,152 @@
+"""
+Vectorized hand scoring with NumPy.
+
+evaluate_hands scores a whole batch of hands for all four trump suits in one pass. It repeats the
+arithmetic of BotLogic.evaluate_hand operation for operation (walking the hand one column at a time
+so sums are added in hand order), so every score is bit-for-bit equal to the scalar version.
+"""
+import numpy as np
+
+try:
+    from . import card_engine as engine
+    from .bot_logic import BotLogic
+except ImportError:
+    import card_engine as engine
+    from bot_logic import BotLogic
+
+
+# Card lookup tables indexed [card, trump]
+_CARDS = range(engine.NUM_CARDS)
+_IS_TRUMP = np.array([[bool(engine.BITS[card] & engine.TRUMP_MASKS[trump]) for trump in range(4)] for card in _CARDS])
+_IS_RIGHT = np.array([[card == engine.RIGHT_BOWERS[trump] for trump in range(4)] for card in _CARDS])
+_IS_LEFT = np.array([[card == engine.LEFT_BOWERS[trump] for trump in range(4)] for card in _CARDS])
+_IS_OFF_ACE = np.array([[engine.CARD_RANKS[card] == engine.ACE and not _IS_TRUMP[card, trump] for trump in range(4)] for card in _CARDS])
+
+_CARD_SUITS = np.array(engine.CARD_SUITS)
+_SUIT_ONE_HOT = np.eye(4, dtype=np.int8)[_CARD_SUITS]
+
+# Indexed [trump, suit]
+_LEFT_BOWER_SUIT = np.eye(4, dtype=np.int8)[list(engine.SUIT_PAIRS)]
+_ACE_BASE = np.array([[0.9 if suit == engine.SUIT_PAIRS[trump] else 1.0 for suit in range(4)] for trump in range(4)])
+
+# Ace multiplier by number of cards held in the ace's suit (see BotLogic.evaluate_aces_id)
+_ACE_MULTIPLIERS = np.array([0.0, 1.0, 0.9, 0.7, 0.5, 0.5, 0.5])
+
+_TRUMP_MULTIPLIERS = np.array([1.0, 1.0, 1.0, 1.4, 1.6, 1.8, 1.0])
+_VOIDS_BY_SUITS = np.array([1.0, 0.9, 0.15, 0.0, 0.0])
+
+
+def _trump_values(trump_ranks):
+    """
+    Value each card adds to the trump score for each trump suit (0 for non-trump cards), indexed [card, trump]
+    """
+    values = np.zeros((engine.NUM_CARDS, 4))
+    for card in _CARDS:
+        for trump in range(4):
+            if card == engine.RIGHT_BOWERS[trump]:
+                values[card, trump] = trump_ranks["right"]
+            elif card == engine.LEFT_BOWERS[trump]:
+                values[card, trump] = trump_ranks["left"]
+            elif _IS_TRUMP[card, trump]:
+                values[card, trump] = trump_ranks[engine.RANKS[engine.CARD_RANKS[card]]]
+    return values
+
+
+# Hands scored per NumPy pass, small enough for the intermediate arrays to stay in cache
+CHUNK_SIZE = 1 << 14
+
+
+def evaluate_hands(hands, bot_logic=BotLogic):
+    """
+    Scores an (N, k) array of card ids for every trump suit and returns an (N, 4) float array where
+    column t equals bot_logic.evaluate_hand_id(hand, t).
+
+    bot_logic can be the BotLogic class, a subclass or an instance; its STRATEGY_WEIGHTS and TRUMP_RANKS are used
+    """
+    hands = np.asarray(hands, dtype=np.intp)
+    trump_values = _trump_values(bot_logic.TRUMP_RANKS)
+
+    scores = np.empty((hands.shape[0], 4))
+    for start in range(0, hands.shape[0], CHUNK_SIZE):
+        scores[start:start + CHUNK_SIZE] = _evaluate_chunk(hands[start:start + CHUNK_SIZE], trump_values, bot_logic)
+    return scores
+
+
+def _evaluate_chunk(hands, trump_values, bot_logic):
+    num_hands, hand_size = hands.shape
+    columns = [np.ascontiguousarray(hands[:, j]) for j in range(hand_size)]
+
+    trump_ranks = bot_logic.TRUMP_RANKS
+    strategy_weights = bot_logic.STRATEGY_WEIGHTS
+
+    # Everything below is shaped (N, 4) with one entry per trump suit unless noted
+    num_trump = np.zeros((num_hands, 4), dtype=np.int8)
+    has_right_bower = np.zeros((num_hands, 4), dtype=bool)
+    has_left_bower = np.zeros((num_hands, 4), dtype=bool)
+    printed_suit_counts = np.zeros((num_hands, 4), dtype=np.int8)
+    for cards in columns:
+        num_trump += np.take(_IS_TRUMP, cards, axis=0)
+        has_right_bower |= np.take(_IS_RIGHT, cards, axis=0)
+        has_left_bower |= np.take(_IS_LEFT, cards, axis=0)
+        printed_suit_counts += np.take(_SUIT_ONE_HOT, cards, axis=0)
+
+    # Number of non-trump suits held: every printed suit held, minus the trump suit, minus the left bower's suit
+    # when the left bower is the only card of it
+    suits_held = printed_suit_counts > 0
+    left_bower_alone = has_left_bower & (printed_suit_counts[:, list(engine.SUIT_PAIRS)] == 1)
+    num_non_trump_suits = suits_held.sum(axis=1, keepdims=True) - suits_held - left_bower_alone
+
+    # Trump strength (values are added in hand order, like the scalar loop)
+    trump_score = np.zeros((num_hands, 4))
+    for cards in columns:
+        trump_score += np.take(trump_values, cards, axis=0)
+
+    multiplier = _TRUMP_MULTIPLIERS[np.minimum(num_trump, 6)]
+    multiplier = multiplier + np.where(has_right_bower & has_left_bower, 0.15, 0.0)
+    trump_score *= multiplier
+
+    max_trump_score = (trump_ranks["right"] + trump_ranks["left"] + trump_ranks["A"] + trump_ranks["K"] + trump_ranks["Q"]) * 1.7
+    trump_strength = np.minimum(1.0, trump_score / max_trump_score)
+
+    # Off-suit aces (added in hand order, like the scalar loop)
+    aces_sum = np.zeros((num_hands, 4))
+    num_aces = np.zeros((num_hands, 4), dtype=np.int8)
+    for cards in columns:
+        is_off_ace = np.take(_IS_OFF_ACE, cards, axis=0)
+        if not is_off_ace.any():
+            continue
+        suits = np.take(_CARD_SUITS, cards)
+        # Non-trump cards in the ace's suit: its printed count, less the left bower if that suit holds it
+        suit_count = np.take_along_axis(printed_suit_counts, suits[:, None], axis=1)
+        suit_count = suit_count - (has_left_bower & np.take(_LEFT_BOWER_SUIT.T, suits, axis=0))
+        values = np.take(_ACE_BASE.T, suits, axis=0) * _ACE_MULTIPLIERS[suit_count]
+        aces_sum += np.where(is_off_ace, values, 0.0)
+        num_aces += is_off_ace
+
+    strong_trump = (num_trump >= 3) & (num_aces >= 1)
+    bonus = 1.0 + np.where(strong_trump, 0.2, 0.0)
+    bonus = bonus + np.where(strong_trump & (num_non_trump_suits == 1), 0.1, 0.0)
+    aces_sum *= bonus
+
+    aces_strength = np.minimum(1.0, aces_sum / 2.9)
+
+    # Suit voids
+    voids_strength = _VOIDS_BY_SUITS[num_non_trump_suits]
+    voids_strength = np.where((num_non_trump_suits == 1) & (num_trump == 3), 1.0, voids_strength)
+    voids_strength = np.where(num_trump == 0, 0.0, voids_strength)
+
+    score = trump_strength * strategy_weights['trump_cards']
+    score = score + aces_strength * strategy_weights['off_aces']
+    score = score + voids_strength * strategy_weights['num_suits']
+
+    return score
+
+
+def deal_hands(num_deals, rng=None):
+    """
+    Shuffles num_deals decks at once and returns (hands, up_cards): an (N, 4, 5) array of card ids dealt
+    five at a time to seats 0-3 and the (N,) up cards.
+    """
+    rng = np.random.default_rng(rng)
+    decks = rng.permuted(np.tile(np.arange(engine.NUM_CARDS, dtype=np.int8), (num_deals, 1)), axis=1)
+    return decks[:, :20].reshape(num_deals, 4, 5), decks[:, 20]
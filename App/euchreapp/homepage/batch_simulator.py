@@ -0,0 +1,439 @@
+"""
+Lockstep batch simulator with NumPy.
+
+play_batch bids and plays a whole batch of deals at once: hands are (N, 4, 5) arrays of card ids kept in
+hand order (a played card leaves an empty slot), and every trick is played one seat at a time for all deals
+together. Bidding goes through the compiled bidding policy (see bidding_policy.BiddingPolicy.decisions), and
+card play repeats BotLogic._determine_best_card_id / choose_lead_card_id branch for branch with lookup tables,
+taking the first card in hand order on ties like min / max do, so every deal ends exactly like
+MonteCarloSimulation.play_hand would play it.
+
+Bots with their own decision methods or a live bidding policy are played with the scalar code instead
+(see MonteCarloSimulation.run_batch_simulation).
+"""
+import random
+
+import numpy as np
+
+try:
+    from . import bidding_policy
+    from . import card_engine as engine
+    from . import hand_table
+    from .bot_logic import BotLogic
+    from .deal_stream import DealStream
+    from .simulation_stats import SEAT_NAMES, SimulationStats
+except ImportError:
+    import bidding_policy
+    import card_engine as engine
+    import hand_table
+    from bot_logic import BotLogic
+    from deal_stream import DealStream
+    from simulation_stats import SEAT_NAMES, SimulationStats
+
+
+# Empty hand slot; every card table below has an extra entry for it
+NO_CARD = engine.NUM_CARDS
+_CARDS = range(engine.NUM_CARDS)
+_BIG = 1 << 10
+
+_SUITS = np.array(engine.CARD_SUITS + (4,), dtype=np.intp)
+_IS_ACE = np.array([engine.CARD_RANKS[card] == engine.ACE for card in _CARDS] + [False])
+_BITS = np.array(engine.BITS + (0,), dtype=np.int64)
+
+# Indexed [card, suit]
+_SUIT_ONE_HOT = np.eye(5, dtype=bool)[_SUITS]
+
+# Indexed [trump, card]
+_EFFECTIVE_SUITS = np.array([suits + (4,) for suits in engine.EFFECTIVE_SUITS], dtype=np.intp)
+_IS_TRUMP = np.array([[bool(engine.BITS[card] & engine.TRUMP_MASKS[trump]) for card in _CARDS] + [False] for trump in range(4)])
+
+# Indexed [trump, lead (NO_LEAD for none), card]
+_RANKS = np.array([[ranks + (-1,) for ranks in lead_ranks] for lead_ranks in engine.RANK_TABLES], dtype=np.int16)
+
+
+def _boss_tables():
+    """
+    engine.boss_card for every suit and seen pattern: [suit, 6 bits of the suit] for non-trump and
+    [suit, 6 bits of the suit + the left bower bit] for trump (the only cards boss_card looks at)
+    """
+    plain = np.full((5, 64), -2, dtype=np.intp)
+    trump = np.full((5, 128), -2, dtype=np.intp)
+    for suit in range(4):
+        for pattern in range(128):
+            seen = (pattern & 0b111111) << (suit * 6)
+            if pattern >> 6:
+                seen |= engine.BITS[engine.LEFT_BOWERS[suit]]
+            trump[suit, pattern] = engine.boss_card(suit, seen, True)
+            if pattern < 64:
+                plain[suit, pattern] = engine.boss_card(suit, seen, False)
+    return plain, trump
+
+
+_BOSS_PLAIN, _BOSS_TRUMP = _boss_tables()
+_LEFT_BOWER_BITS = np.array(engine.LEFT_BOWERS + (0,), dtype=np.int64)
+
+
+def _plain_boss(suits, seen):
+    return _BOSS_PLAIN[suits, (seen >> (6 * suits)) & 0b111111]
+
+
+def _trump_boss(suits, seen):
+    pattern = ((seen >> (6 * suits)) & 0b111111) | (((seen >> _LEFT_BOWER_BITS[suits]) & 1) << 6)
+    return _BOSS_TRUMP[suits, pattern]
+
+
+def _is_boss(cards, seen, trump):
+    """
+    engine.is_boss for arrays of cards, seen masks and trump suits
+    """
+    suits = _SUITS[cards]
+    is_trump = _EFFECTIVE_SUITS[trump, cards] == trump
+    return np.where(is_trump, _trump_boss(suits, seen), _plain_boss(suits, seen)) == cards
+
+
+# Seats in play order, indexed [seat sitting out (4 for none), leader], padded with -1 when a partner sits out
+_PLAY_ORDERS = np.full((5, 4, 4), -1, dtype=np.intp)
+for _out in range(5):
+    for _leader in range(4):
+        _seats = [(_leader + i) % 4 for i in range(4) if (_leader + i) % 4 != _out]
+        _PLAY_ORDERS[_out, _leader, :len(_seats)] = _seats
+
+
+def _first(mask, values):
+    """
+    Slot of the lowest value where mask is set (the first one in hand order on ties)
+    """
+    return np.argmin(np.where(mask, values, _BIG), axis=1)
+
+
+def _last(mask, values):
+    """
+    Slot of the highest value where mask is set (the first one in hand order on ties)
+    """
+    return np.argmax(np.where(mask, values, -_BIG), axis=1)
+
+
+def worst_cards(hands, trump):
+    """
+    BotLogic.get_worst_card_id for an (N, k) array of hands (NO_CARD for empty slots), as (N,) slots
+    """
+    rows = np.arange(hands.shape[0])[:, None]
+    valid = hands != NO_CARD
+    ranks = _RANKS[trump[:, None], engine.NO_LEAD, hands]
+    non_trump = valid & ~_IS_TRUMP[trump[:, None], hands]
+
+    # Non-trump cards per printed suit, and single cards (not aces) that would leave a void
+    suits = _SUITS[hands]
+    suit_counts = (_SUIT_ONE_HOT[hands] & non_trump[:, :, None]).sum(axis=1)
+    possible_voids = non_trump & (suit_counts[rows, suits] == 1) & ~_IS_ACE[hands]
+
+    return np.where(
+        possible_voids.any(axis=1),
+        _first(possible_voids, ranks),
+        np.where(non_trump.any(axis=1), _first(non_trump, ranks), _first(valid, ranks)),
+    )
+
+
+def _lead_cards(hands, trump, seat, maker, alone, seen, led_suits, tricks_played, tricks_won):
+    """
+    choose_lead_card_id for every row, as slots in hands
+    """
+    t = trump[:, None]
+    valid = hands != NO_CARD
+    ranks = _RANKS[t, engine.NO_LEAD, hands]
+    is_trump = _IS_TRUMP[t, hands]
+    offsuit = valid & ~is_trump
+    num_trump = is_trump.sum(axis=1)
+
+    suits = _SUITS[hands]
+    non_trump_boss = offsuit & (_plain_boss(suits, seen[:, None]) == hands)
+    any_boss = non_trump_boss.any(axis=1)
+    highest_trump = _trump_boss(trump, seen)
+    have_highest_trump = (highest_trump >= 0) & (hands == highest_trump[:, None]).any(axis=1)
+    trump_was_led_previously = ((led_suits >> trump) & 1).astype(bool)
+    secured_point = tricks_won >= 3
+
+    partner_called_trump = maker == (seat ^ 2)
+    player_called_trump = maker == seat
+    opponent_called_trump = ~partner_called_trump & ~player_called_trump
+    player_going_alone = alone & player_called_trump
+
+    max_trump = _last(is_trump, ranks)
+    min_trump = _first(is_trump, ranks)
+
+    second_to_last = (tricks_played == 3) & (valid.sum(axis=1) == 2) & (num_trump == 1)
+
+    conditions = [
+        have_highest_trump & any_boss & (player_called_trump | partner_called_trump | (opponent_called_trump & trump_was_led_previously)),
+        second_to_last,
+        partner_called_trump & (num_trump > 0) & (~trump_was_led_previously | ((num_trump > 1) & any_boss)),
+        player_called_trump & (have_highest_trump | (num_trump > 1) | player_going_alone),
+        opponent_called_trump & any_boss & (num_trump >= 3),
+        any_boss,
+    ]
+    choices = [
+        max_trump,
+        np.where(player_going_alone & secured_point, max_trump, _first(valid, ranks)),
+        max_trump,
+        np.where(
+            have_highest_trump | ((num_trump > 1) & player_going_alone),
+            max_trump,
+            np.where(num_trump > 1, min_trump, _last(offsuit, ranks)),
+        ),
+        np.where(have_highest_trump, max_trump, min_trump),
+        _last(non_trump_boss, ranks),
+    ]
+    return np.select(conditions, choices, worst_cards(hands, trump))
+
+
+def _follow_cards(hands, trump, seat, seen, lead_suit, winning_card, winning_seat, played_trump, is_last):
+    """
+    _determine_best_card_id for every row when a card has been led, as slots in hands
+    """
+    t = trump[:, None]
+    valid = hands != NO_CARD
+    ranks = _RANKS[t, engine.NO_LEAD, hands]
+    lead_ranks = _RANKS[t, lead_suit[:, None], hands]
+    is_trump = _IS_TRUMP[t, hands]
+    rows = np.arange(hands.shape[0])
+
+    winning_rank = _RANKS[trump, engine.NO_LEAD, winning_card]
+    is_partner_winning = winning_seat == (seat ^ 2)
+    winning_is_boss = _is_boss(winning_card, seen, trump)
+    worst = worst_cards(hands, trump)
+
+    # Follow suit
+    lead_suit_cards = valid & (_EFFECTIVE_SUITS[t, hands] == lead_suit[:, None])
+    high_lead = _last(lead_suit_cards, lead_ranks)
+    low_lead = _first(lead_suit_cards, lead_ranks)
+    play_high = (ranks[rows, high_lead] > winning_rank) & ~(is_partner_winning & (is_last | winning_is_boss))
+    follow = np.where(play_high, high_lead, low_lead)
+
+    # No trump played yet: trump in small unless partner has the trick
+    small_trump = _first(is_trump, ranks)
+    no_trump_played = np.where(
+        is_trump.any(axis=1) & (~is_partner_winning | ((not is_last) & ~winning_is_boss)),
+        small_trump,
+        worst,
+    )
+
+    # Trump played: overtrump an opponent with the lowest trump that wins
+    winning_trump_cards = is_trump & (ranks > winning_rank[:, None])
+    trump_played = np.where(
+        ~is_partner_winning & winning_trump_cards.any(axis=1),
+        _first(winning_trump_cards, ranks),
+        worst,
+    )
+
+    return np.where(
+        lead_suit_cards.any(axis=1),
+        follow,
+        np.where(played_trump, trump_played, no_trump_played),
+    )
+
+
+def _bid(hands, up_cards, bot_logic):
+    """
+    Runs both bidding rounds like MonteCarloSimulation.simulate_deals (seat 3 deals) and returns (trump, maker,
+    going alone, round) arrays; the dealer's hand in hands is updated when they pick up the up card
+    """
+    num_deals = hands.shape[0]
+    policy = bidding_policy.load_policy(bot_logic)
+    bot = hand_table.bot_instance(bot_logic)
+
+    trump = np.full(num_deals, -1, dtype=np.intp)
+    maker = np.full(num_deals, -1, dtype=np.intp)
+    alone = np.zeros(num_deals, dtype=bool)
+    call_round = np.zeros(num_deals, dtype=np.intp)
+
+    for trump_round in ("1", "2"):
+        for seat, position in enumerate(bidding_policy.POSITIONS):
+            rows = np.flatnonzero(maker < 0)
+            if not len(rows):
+                break
+            decisions, going_alone = policy.decisions(hands[rows, seat], up_cards[rows], position, trump_round)
+            for i in np.flatnonzero(decisions == bidding_policy.ORDER_DEPENDENT):
+                # Decided on the actual order of the hand
+                decisions[i], going_alone[i] = bot.determine_trump_id(
+                    hands[rows[i], seat].tolist(), int(up_cards[rows[i]]), position, position == 'dealer', trump_round
+                )
+            called = decisions >= 0
+            rows = rows[called]
+            trump[rows] = decisions[called]
+            maker[rows] = seat
+            alone[rows] = going_alone[called]
+            call_round[rows] = int(trump_round)
+
+    # Dealer picks up the up card on a round 1 call and discards
+    rows = np.flatnonzero(call_round == 1)
+    dealer_hands = np.concatenate([hands[rows, 3], up_cards[rows, None]], axis=1)
+    discards = worst_cards(dealer_hands, trump[rows])
+    keep = np.ones(dealer_hands.shape, dtype=bool)
+    keep[np.arange(len(rows)), discards] = False
+    hands[rows, 3] = dealer_hands[keep].reshape(len(rows), 5)
+
+    return trump, maker, alone, call_round
+
+
+def _play(hands, trump, maker, alone):
+    """
+    Plays the five tricks of every deal (hands are emptied) and returns the (N, 2) tricks won by each team
+    """
+    num_deals = hands.shape[0]
+    all_rows = np.arange(num_deals)
+    out_seat = np.where(alone, maker ^ 2, 4)
+    # Seat 0 leads the first trick, or the next seat when seat 0 sits out
+    leader = np.where(out_seat == 0, 1, 0)
+
+    seen = np.zeros(num_deals, dtype=np.int64)
+    led_suits = np.zeros(num_deals, dtype=np.int64)
+    team_tricks = np.zeros((num_deals, 2), dtype=np.intp)
+
+    for tricks_played in range(5):
+        orders = _PLAY_ORDERS[out_seat, leader]
+        trick_seen = np.zeros(num_deals, dtype=np.int64)
+        lead_suit = winning_card = winning_seat = played_trump = None
+
+        for position in range(4):
+            seat = orders[:, position]
+            rows = all_rows if position < 3 else np.flatnonzero(seat >= 0)
+            seat = seat[rows]
+            hand = hands[rows, seat]
+            t = trump[rows]
+
+            if tricks_played == 4:
+                # Last card
+                slots = np.argmax(hand != NO_CARD, axis=1)
+            elif position == 0:
+                slots = _lead_cards(
+                    hand, t, seat, maker[rows], alone[rows], seen[rows], led_suits[rows],
+                    tricks_played, team_tricks[rows, seat % 2],
+                )
+            else:
+                slots = _follow_cards(
+                    hand, t, seat, seen[rows], lead_suit[rows], winning_card[rows], winning_seat[rows],
+                    played_trump[rows], position == 3,
+                )
+
+            cards = hand[np.arange(len(rows)), slots]
+            hands[rows, seat, slots] = NO_CARD
+            trick_seen[rows] |= _BITS[cards]
+
+            if position == 0:
+                lead_suit = _EFFECTIVE_SUITS[t, cards]
+                winning_card = cards
+                winning_seat = seat
+                played_trump = _IS_TRUMP[t, cards]
+            else:
+                lead_ranks = _RANKS[t, lead_suit[rows]]
+                rank_rows = np.arange(len(rows))
+                wins = lead_ranks[rank_rows, cards] > lead_ranks[rank_rows, winning_card[rows]]
+                winning_card[rows] = np.where(wins, cards, winning_card[rows])
+                winning_seat[rows] = np.where(wins, seat, winning_seat[rows])
+                played_trump[rows] |= _IS_TRUMP[t, cards]
+
+        seen |= trick_seen
+        led_suits |= np.left_shift(1, lead_suit)
+        team_tricks[all_rows, winning_seat % 2] += 1
+        leader = winning_seat
+
+    return team_tricks
+
+
+def _points(team_tricks, maker, alone):
+    """
+    MonteCarloSimulation.evaluate_points for every row, as (N, 2) points
+    """
+    calling_team = maker % 2
+    rows = np.arange(len(maker))
+    caller_tricks = team_tricks[rows, calling_team]
+    defender_tricks = team_tricks[rows, 1 - calling_team]
+
+    caller_points = np.where(caller_tricks < 3, 0, np.where(caller_tricks < 5, 1, np.where(alone, 4, 2)))
+    defender_points = np.where(defender_tricks >= 3, 2, 0)
+
+    points = np.zeros((len(maker), 2), dtype=np.intp)
+    points[rows, calling_team] = caller_points
+    points[rows, 1 - calling_team] = defender_points
+    return points
+
+
+def play_batch(hands, up_cards, bot_logic=BotLogic):
+    """
+    Bids and plays an (N, 4, 5) array of hands for seats 0-3 (seat 3 deals) with (N,) up cards.
+
+    Returns a dict of (N,) arrays "trump", "maker" (seat), "going_alone", "round" (1 or 2) and (N, 2) arrays
+    "tricks" and "points" for teams 1 and 2.
+    """
+    hands = np.array(hands, dtype=np.intp)
+    up_cards = np.asarray(up_cards, dtype=np.intp)
+
+    trump, maker, alone, call_round = _bid(hands, up_cards, bot_logic)
+    tricks = _play(hands, trump, maker, alone)
+    return {
+        "trump": trump,
+        "maker": maker,
+        "going_alone": alone,
+        "round": call_round,
+        "tricks": tricks,
+        "points": _points(tricks, maker, alone),
+    }
+
+
+def batch_stats(result):
+    """
+    SimulationStats of a play_batch result, the same as simulate_deals gives for the same deals
+    """
+    stats = SimulationStats()
+    maker, alone, call_round, points = result["maker"], result["going_alone"], result["round"], result["points"]
+    stats.num_simulations = len(maker)
+
+    for seat, name in enumerate(SEAT_NAMES):
+        by_seat = maker == seat
+        stats.calls_round1[name] = int(np.count_nonzero(by_seat & (call_round == 1)))
+        stats.calls_round2[name] = int(np.count_nonzero(by_seat & (call_round == 2)))
+        stats.loner_attempts_round1[name] = int(np.count_nonzero(by_seat & (call_round == 1) & alone))
+        stats.loner_attempts_round2[name] = int(np.count_nonzero(by_seat & (call_round == 2) & alone))
+
+    rows = np.arange(len(maker))
+    calling_team = maker % 2
+    team_points = points[rows, calling_team]
+    other_points = points[rows, 1 - calling_team]
+    for seat, name in enumerate(SEAT_NAMES):
+        by_seat = maker == seat
+        stats.seat_net_points[name] = int((team_points[by_seat] - other_points[by_seat]).sum())
+
+    for team in (1, 2):
+        by_team = calling_team == team - 1
+        won = by_team & (team_points > other_points)
+        stats.total_points[team] = int(points[:, team - 1].sum())
+        stats.calls[team] = int(np.count_nonzero(by_team))
+        stats.wins[team] = int(np.count_nonzero(won))
+        stats.marches[team] = int(np.count_nonzero(won & (team_points == 2)))
+        stats.loner_attempts[team] = int(np.count_nonzero(by_team & alone))
+        stats.loner_wins[team] = int(np.count_nonzero(by_team & alone & (team_points == 4)))
+
+    outcomes, counts = np.unique(points, axis=0, return_counts=True)
+    stats.outcomes = {(int(team1), int(team2)): int(count) for (team1, team2), count in zip(outcomes, counts)}
+    return stats
+
+
+# Deals per play_batch call in simulate_batch
+BATCH_SIZE = 1 << 16
+
+
+def simulate_batch(num_deals, seed=None, bot_logic=BotLogic, batch_size=BATCH_SIZE):
+    """
+    Plays the first num_deals deals of DealStream(seed) (see DealStream.deal_array) in batches, returning their
+    SimulationStats: the same deals, and the same stats, as MonteCarloSimulation.run_simulation with that seed
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 63)
+    deals = DealStream(seed)
+
+    stats = SimulationStats()
+    for start in range(0, num_deals, batch_size):
+        decks = deals.deal_array(start, min(start + batch_size, num_deals))
+        hands, up_cards = decks[:, :20].reshape(-1, 4, 5), decks[:, 20]
+        stats.merge(batch_stats(play_batch(hands, up_cards, bot_logic)))
+    return stats
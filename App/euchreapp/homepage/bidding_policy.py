@@ -0,0 +1,296 @@
+"""
+Compiled bidding policy.
+
+BotLogic.determine_trump only depends on the seat, the round, the up card and the five cards in hand, so
+every combination is run through BotLogic.determine_trump_id once and the (decision, go alone) pair is
+stored as one byte. Suits are canonicalized first: the up card's suit becomes hearts, its partner suit
+diamonds, and the two remaining suits keep their order as clubs and spades (which keeps the tie breaks
+between the two reverse suits). That leaves 4 seats x 2 rounds x 6 up card ranks x 42,504 hands.
+
+A few decisions also depend on the order of the hand: of cards tied for the dealer's hypothetical discard in
+round 1, the first in hand order is discarded, and hand scores that are sums of three or more values can round
+differently in another order (see hand_table). Hands where a tied discard or such a rounding error changes the
+decision are marked as order dependent, and are answered by determine_trump_id on the actual hand.
+
+The policy is written to a memory-mapped file next to the hand strength table and is rebuilt when the
+thresholds, weights or bidding code change (see policy_digest).
+
+Run this file to (re)build the policy, or with --check to compare it against the live logic:
+python bidding_policy.py [--check]
+"""
+import copy
+import hashlib
+import inspect
+import itertools
+import os
+
+try:
+    from . import card_engine as engine
+    from . import hand_table
+    from . import table_file
+except ImportError:
+    import card_engine as engine
+    import hand_table
+    import table_file
+
+
+POSITIONS = ('first', 'second', 'third', 'dealer')
+POSITION_INDEX = {position: i for i, position in enumerate(POSITIONS)}
+ROUND_INDEX = {"1": 0, "2": 1}
+
+NUM_ENTRIES = len(POSITIONS) * len(ROUND_INDEX) * len(engine.RANKS) * hand_table.NUM_HANDS
+
+# Error added to order dependent hand scores when looking for decisions a rounding error can change (far above
+# the rounding error of a score, far below any threshold margin that matters)
+_ROUNDING_ERROR = 1e-9
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bidding_policy.bin")
+
+_MAGIC = b"EUBP"
+_FORMAT_VERSION = 2
+
+# Entry bits: decision (0 for pass, canonical suit + 1 otherwise), go alone, and order dependent
+_DECISION_MASK = 0b111
+_GO_ALONE = 0b1000
+_ORDER_DEPENDENT = 0b10000
+
+# Decision of decisions() for an order dependent hand
+ORDER_DEPENDENT = -2
+
+
+# Loaded policies by (class, path): (parameters they were loaded for, policy)
+_policies = {}
+
+
+def _entry_index(position, trump_round, up_rank, hand_rank):
+    return ((POSITION_INDEX[position] * 2 + ROUND_INDEX[trump_round]) * 6 + up_rank) * hand_table.NUM_HANDS + hand_rank
+
+
+def _parameters(bot_logic):
+    return (bot_logic.STRATEGY_WEIGHTS, bot_logic.TRUMP_RANKS, bot_logic.BID_THRESHOLDS)
+
+
+def policy_digest(bot_logic):
+    """
+    Digest of everything determine_trump depends on for this BotLogic class or instance
+    """
+    cls = bot_logic if isinstance(bot_logic, type) else type(bot_logic)
+    parts = [hand_table.table_digest(bot_logic).hex(), repr(bot_logic.BID_THRESHOLDS)]
+    for name in ("determine_trump_id", "get_worst_card_id", "get_worst_cards_id", "_lowest_cards", "get_hand_score"):
+        parts.append(inspect.getsource(getattr(cls, name)))
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).digest()
+
+
+class BiddingPolicy:
+    """
+    Read-only view of a compiled bidding policy: decision(...) == determine_trump_id(...) for any five card hand
+    whose decision doesn't depend on its order
+    """
+    def __init__(self, entries, digest, source=None):
+        self._entries = entries
+        self.digest = digest
+        self._source = source
+
+    def decision(self, hand, up_card, position, trump_round):
+        """
+        Returns (trump suit index or -1 to pass, go alone) for a hand of card ids, or None when the decision
+        depends on the order of the hand
+        """
+        up_suit = engine.CARD_SUITS[up_card]
+        canonical_cards = engine.CANONICAL_CARDS[up_suit]
+        hand_rank = hand_table.hand_rank([canonical_cards[card] for card in hand])
+
+        entry = self._entries[_entry_index(position, trump_round, engine.CARD_RANKS[up_card], hand_rank)]
+        if entry & _ORDER_DEPENDENT:
+            return None
+        decision = (entry & _DECISION_MASK) - 1
+        if decision >= 0:
+            decision = engine.CANONICAL_SUITS[up_suit][decision]
+        return decision, bool(entry & _GO_ALONE)
+
+    def decisions(self, hands, up_cards, position, trump_round):
+        """
+        decision() for an (N, 5) NumPy array of hands and (N,) up cards, as (N,) arrays of trump suit
+        indexes (-1 to pass, ORDER_DEPENDENT when decision() returns None) and go alone flags
+        """
+        import numpy as np
+
+        hands = np.asarray(hands, dtype=np.intp)
+        up_cards = np.asarray(up_cards, dtype=np.intp)
+        up_suits = np.array(engine.CARD_SUITS)[up_cards]
+
+        canonical_hands = np.array(engine.CANONICAL_CARDS)[up_suits[:, None], hands]
+        indexes = _entry_index(position, trump_round, 0, 0) + np.array(engine.CARD_RANKS)[up_cards] * hand_table.NUM_HANDS
+        entries = np.frombuffer(self._entries, dtype=np.uint8)[indexes + hand_table.hand_ranks(canonical_hands)]
+
+        decisions = (entries & _DECISION_MASK).astype(np.intp) - 1
+        suits = np.array(engine.CANONICAL_SUITS)[up_suits, np.maximum(decisions, 0)]
+        suits = np.where(decisions >= 0, suits, -1)
+        return np.where(entries & _ORDER_DEPENDENT, ORDER_DEPENDENT, suits), (entries & _GO_ALONE) != 0
+
+    def close(self):
+        if self._source is not None:
+            self._entries.release()
+            self._source.close()
+            self._source = None
+
+
+class _RoundingProbe:
+    """
+    Runs determine_trump_id of a bot with the hand scores of get_hand_score, the order dependent ones (those the
+    hand strength table doesn't hold) moved by a rounding error either way
+    """
+    def __init__(self, bot):
+        self._table = hand_table.load_table(bot)
+        self._evaluate = bot.evaluate_hand_id
+        self.bot = copy.copy(bot)
+        self.bot.get_hand_score = self._hand_score
+        self._errors = {}
+        self._suits = set()
+
+    def _hand_score(self, hand, trump):
+        score = self._table.score(hand, trump) if len(hand) == 5 else None
+        if score is None:
+            self._suits.add(trump)
+            score = self._evaluate(hand, trump) + self._errors.get(trump, 0)
+        return score
+
+    def decisions(self, hand, up_card, position, is_dealer, trump_round):
+        """
+        Yields the decision for the hand, then its decision for every combination of errors on the order
+        dependent scores it used
+        """
+        self._errors = {}
+        self._suits = set()
+        yield self.bot.determine_trump_id(hand, up_card, position, is_dealer, trump_round)
+
+        suits = sorted(self._suits)
+        for errors in itertools.product((-_ROUNDING_ERROR, _ROUNDING_ERROR), repeat=len(suits)):
+            self._errors = dict(zip(suits, errors))
+            yield self.bot.determine_trump_id(hand, up_card, position, is_dealer, trump_round)
+
+
+def compile_policy(bot_logic, hands=None):
+    """
+    Runs determine_trump_id for every seat, round, up card rank and hand (with the up card in hearts)
+    and returns the encoded entries. Dealer hands in round 1 are also run with each card tied for the discard
+    first, and hands are marked as order dependent when any of those runs or a rounding error of an order
+    dependent score changes the decision.
+    hands limits the compilation to some sorted hands of card ids (with the up card in hearts), leaving the
+    entries of the others 0
+    """
+    bot = hand_table.bot_instance(bot_logic)
+    probe = _RoundingProbe(bot)
+    if hands is None:
+        hands = list(enumerate(list(hand) for hand in hand_table.all_hands()))
+    else:
+        hands = [(hand_table.hand_rank(hand), list(hand)) for hand in hands]
+
+    entries = bytearray(NUM_ENTRIES)
+    for position in POSITIONS:
+        is_dealer = position == 'dealer'
+        for trump_round in ROUND_INDEX:
+            for up_rank in range(len(engine.RANKS)):
+                # Canonical up card: hearts is suit 0
+                up_card = up_rank
+                offset = _entry_index(position, trump_round, up_rank, 0)
+                for i, hand in hands:
+                    variants = [hand]
+                    if is_dealer and trump_round == "1":
+                        # The up card goes last, so a tied discard is always one of the hand's own cards
+                        tied = [card for card in bot.get_worst_cards_id(hand + [up_card], engine.CARD_SUITS[up_card]) if card != up_card]
+                        variants += [[card] + [other for other in hand if other != card] for card in tied[1:]]
+
+                    decisions = [
+                        result
+                        for variant in variants
+                        for result in probe.decisions(variant, up_card, position, is_dealer, trump_round)
+                    ]
+                    decision, will_go_alone = decisions[0]
+                    entry = (decision + 1) | (_GO_ALONE if will_go_alone else 0)
+                    if any(result != decisions[0] for result in decisions[1:]):
+                        entry |= _ORDER_DEPENDENT
+                    entries[offset + i] = entry
+    return entries
+
+
+def build_policy(bot_logic, path=DEFAULT_PATH):
+    """
+    Compiles the policy and writes it to path (atomically)
+    """
+    entries = compile_policy(bot_logic)
+    table_file.write_table(path, _MAGIC, _FORMAT_VERSION, policy_digest(bot_logic), NUM_ENTRIES, bytes(entries))
+
+
+def _map_policy(path, digest):
+    mapped = table_file.map_table(path, _MAGIC, _FORMAT_VERSION, digest, NUM_ENTRIES, "B")
+    if mapped is None:
+        return None
+
+    source, entries = mapped
+    return BiddingPolicy(entries, digest, source)
+
+
+def load_policy(bot_logic, path=DEFAULT_PATH, build=True):
+    """
+    Returns the bidding policy for this BotLogic class or instance, compiling it first if the file is missing
+    or its parameters changed. With build False, returns None instead of compiling it (and looks for the file
+    again on the next call). Policies are loaded once per process.
+    """
+    cls = bot_logic if isinstance(bot_logic, type) else type(bot_logic)
+    cached = _policies.get((cls, path))
+    if cached is not None and cached[0] == _parameters(bot_logic):
+        return cached[1]
+
+    digest = policy_digest(bot_logic)
+    policy = _map_policy(path, digest)
+    if policy is None:
+        if not build:
+            return None
+        build_policy(bot_logic, path)
+        policy = _map_policy(path, digest)
+
+    _policies[cls, path] = (copy.deepcopy(_parameters(bot_logic)), policy)
+    return policy
+
+
+def check_policy(bot_logic, path=DEFAULT_PATH, hands=None, policy=None):
+    """
+    Compares the policy (the one at path by default) with determine_trump_id for every seat, round and up card
+    (in all four suits) over the given hands of card ids (every hand by default). Returns a list of mismatches as
+    (position, round, up card, hand, policy decision, live decision)
+    """
+    bot = hand_table.bot_instance(bot_logic)
+    if policy is None:
+        policy = load_policy(bot_logic, path)
+    if hands is None:
+        hands = [list(hand) for hand in hand_table.all_hands()]
+
+    mismatches = []
+    for position in POSITIONS:
+        is_dealer = position == 'dealer'
+        for trump_round in ROUND_INDEX:
+            for up_card in range(engine.NUM_CARDS):
+                for hand in hands:
+                    if up_card in hand:
+                        continue
+                    expected = bot.determine_trump_id(hand, up_card, position, is_dealer, trump_round)
+                    actual = policy.decision(hand, up_card, position, trump_round)
+                    if actual is not None and actual != expected:
+                        mismatches.append((position, trump_round, up_card, list(hand), actual, expected))
+    return mismatches
+
+
+if __name__ == "__main__":
+    import sys
+    from bot_logic import BotLogic
+
+    if "--check" in sys.argv:
+        mismatches = check_policy(BotLogic)
+        for position, trump_round, up_card, hand, actual, expected in mismatches[:20]:
+            print(f"{position} seat, round {trump_round}, up card {engine.CARD_NAMES[up_card]}, "
+                  f"hand {', '.join(engine.CARD_NAMES[card] for card in hand)}: policy {actual}, live {expected}")
+        print(f"{len(mismatches)} mismatches")
+    else:
+        build_policy(BotLogic)
+        print(f"Built bidding policy ({NUM_ENTRIES} entries) at {DEFAULT_PATH}")
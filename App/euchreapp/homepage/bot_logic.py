@@ -1,3 +1,25 @@
+import random
+
+try:
+    from . import card_engine as engine
+    from . import hand_table
+    from . import bidding_policy
+    from . import endgame_table
+    from . import pimc
+    from .trick_state import TrickState
+except ImportError:
+    import card_engine as engine
+    import hand_table
+    import bidding_policy
+    import endgame_table
+    import pimc
+    from trick_state import TrickState
+
+
+# Format of the parameter files written by parameter_search (see BotLogic.load_parameters)
+PARAMETERS_FORMAT_VERSION = 1
+
+
 class BotLogic:    
     SUIT_PAIRS = {
         'hearts': 'diamonds',
@@ -6,123 +28,209 @@ class BotLogic:
         'spades': 'clubs'
     }
 
-    @staticmethod
-    def euchre_rank(card, trump_suit, lead_suit=None):
-        """ Assigns rank values based on Euchre hierarchy. """
-        if card.is_right_bower(trump_suit):
-            return 25  # Right Bower (Highest)
-        elif card.is_left_bower(trump_suit):
-            return 24  # Left Bower
-        if card.suit == trump_suit:
-            return 15 + ["9", "10", "Q", "K", "A"].index(card.rank)
-        if card.suit == lead_suit:
-            return 6 + ["9", "10", "J", "Q", "K", "A"].index(card.rank)
-        return ["9", "10", "J", "Q", "K", "A"].index(card.rank)
+    # Weights used by evaluate_hand (also read by the batch evaluator)
+    STRATEGY_WEIGHTS = {
+        'trump_cards': 0.7,
+        'off_aces': 0.2,
+        'num_suits': 0.1
+        # 'seat_position': 0.2
+    }
 
-    def determine_trump(self, hand, dealer, up_card, player_order, trump_round):
-        """
-        Determines the trump suit by scoring their hand and comparing it to the thresholds for their position
-        """
-        # TODO: Add taking into account the up card rank and who it is going to (maybe would just affect the position thresholds? Like if it is a bower, dealer position threshold goes down)
-        
-        trump_suit = up_card.suit
-        position = self.get_seat_position(player_order)
+    # Value of each trump card used by evaluate_trump
+    TRUMP_RANKS = {"right": 1.0, "left": 0.9, "A": 0.8, "K": 0.7, "Q": 0.6, "10": 0.575, "9": 0.55}
 
-        # Thresholds for both rounds of trump selection
-        thresholds = {
-            'round1': {
-                'first': {
-                    'normal': 0.33,
-                    'loner': 0.51
-                },
-                'second': {
-                    'normal': 0.225,
-                    'loner': 0.451
-                },
-                'third': {
-                    'normal': 0.355,
-                    'loner': 0.525
+    # Hand score thresholds for both rounds of trump selection, by seat
+    BID_THRESHOLDS = {
+        'round1': {
+            'first': {
+                'normal': 0.33,
+                'loner': 0.51
+            },
+            'second': {
+                'normal': 0.225,
+                'loner': 0.451
+            },
+            'third': {
+                'normal': 0.355,
+                'loner': 0.525
+            },
+            'dealer': {
+                'normal': 0.26,
+                'loner': 0.47
+            }
+        },
+        'round2': {
+            'first': {
+                'next': {
+                    'normal': 0.2,
+                    'loner': 0.45
                 },
-                'dealer': {
-                    'normal': 0.26,
-                    'loner': 0.47
+                'reverse': {
+                    'normal': 0.315,
+                    'loner': 0.48
                 }
             },
-            'round2': {
-                'first': {
-                    'next': {
-                        'normal': 0.2,
-                        'loner': 0.45
-                    },
-                    'reverse': {
-                        'normal': 0.315,
-                        'loner': 0.48
-                    }
+            'second': {
+                'next': {
+                    'normal': 0.315,
+                    'loner': 0.48
                 },
-                'second': {
-                    'next': {
-                        'normal': 0.315,
-                        'loner': 0.48
-                    },
-                    'reverse': {
-                        'normal': 0.2,
-                        'loner': 0.45
-                    }
+                'reverse': {
+                    'normal': 0.2,
+                    'loner': 0.45
+                }
+            },
+            'third': {
+                'next': {
+                    'normal': 0.23,
+                    'loner': 0.465
                 },
-                'third': {
-                    'next': {
-                        'normal': 0.23,
-                        'loner': 0.465
-                    },
-                    'reverse': {
-                        'normal': 0.305,
-                        'loner': 0.485
-                    }
+                'reverse': {
+                    'normal': 0.305,
+                    'loner': 0.485
+                }
+            },
+            'dealer': {
+                'next': {
+                    'normal': 0.35,
+                    'loner': 0.46
                 },
-                'dealer': {
-                    'next': {
-                        'normal': 0.35,
-                        'loner': 0.46
-                    },
-                    'reverse': {
-                        'normal': 0.3,
-                        'loner': 0.45
-                    }
+                'reverse': {
+                    'normal': 0.3,
+                    'loner': 0.45
                 }
             }
         }
+    }
+
+    # Cache of card play decisions (see decision_cache), None to always work out the card to play
+    decision_cache = None
+
+    # How determine_trump is answered: 'table' reads the compiled bidding policy (see bidding_policy),
+    # 'live' runs determine_trump_id and 'check' does both and raises if they disagree
+    BIDDING_POLICY_MODE = 'table'
+
+    # How cards are played: 'heuristic' runs _determine_best_card_id, 'pimc' samples the hidden hands and solves
+    # them double dummy (see pimc) for up to PIMC_BUDGET_MS milliseconds per decision (a soft limit: one layout is
+    # always solved), 'ismcts' searches a tree of ISMCTS_MAX_NODES nodes at most (see ismcts) for ISMCTS_ITERATIONS
+    # iterations and / or ISMCTS_BUDGET_MS
+    CARD_PLAY_MODE = 'heuristic'
+    PIMC_BUDGET_MS = 50
+    ISMCTS_ITERATIONS = 1000
+    ISMCTS_BUDGET_MS = None
+    ISMCTS_MAX_NODES = 200000
+
+    # Cards per hand covered by the endgame table (see endgame_table), 0 to go without it. With a table,
+    # 'heuristic' play holding one card more than that samples ENDGAME_LAYOUTS layouts of the hidden cards and
+    # plays the card with the best exact outcome over them, and PIMC looks its endgames up
+    ENDGAME_CARDS = 0
+    ENDGAME_LAYOUTS = 32
+
+    # Whether a missing or out of date hand strength table, bidding policy or endgame table is built on first use.
+    # Bots that can't wait for them (models.Player, in a request) score hands and bid with the live logic and play
+    # without the endgame table until they are built (manage.py build_bot_tables)
+    BUILD_TABLES = True
+
+    @classmethod
+    def load_parameters(cls, path):
+        """
+        Sets the STRATEGY_WEIGHTS and BID_THRESHOLDS of this class from a parameter file written by parameter_search,
+        e.g. Bot.load_parameters("bot_parameters.json"). Returns the contents of the file
+        """
+        import json
+
+        with open(path, encoding="utf-8") as fh:
+            config = json.load(fh)
+        if config.get("format_version") != PARAMETERS_FORMAT_VERSION:
+            raise ValueError(f"{path} has parameter format {config.get('format_version')!r}, expected {PARAMETERS_FORMAT_VERSION}")
+
+        cls.STRATEGY_WEIGHTS = config["strategy_weights"]
+        cls.BID_THRESHOLDS = config["bid_thresholds"]
+        return config
+
+    @staticmethod
+    def euchre_rank(card, trump_suit, lead_suit=None):
+        """ Assigns rank values based on Euchre hierarchy. """
+        lead = engine.SUIT_INDEX.get(lead_suit, engine.NO_LEAD)
+        return engine.RANK_TABLES[engine.SUIT_INDEX[trump_suit]][lead][engine.card_id(card)]
+
+    def determine_trump(self, hand, dealer, up_card, player_order, trump_round):
+        """
+        Determines the trump suit by scoring their hand and comparing it to the thresholds for their position
+        """
+        position = self.get_seat_position(player_order)
+        is_dealer = self.name == dealer.name
+
+        hand_ids = [engine.card_id(card) for card in hand]
+        up_card_id = engine.card_id(up_card)
+
+        if trump_round not in ("1", "2"):
+            return None
+
+        mode = self.BIDDING_POLICY_MODE
+        policy = None
+        if mode != 'live' and is_dealer == (position == 'dealer') and len(hand_ids) == 5:
+            # The compiled policy only covers five card hands with the dealer in the dealer seat
+            policy = bidding_policy.load_policy(self, build=self.BUILD_TABLES)
+        if policy is None:
+            decision, will_go_alone = self.determine_trump_id(hand_ids, up_card_id, position, is_dealer, trump_round)
+        else:
+            result = policy.decision(hand_ids, up_card_id, position, trump_round)
+            if result is None:
+                # The decision depends on the order of the hand (which of tied cards the dealer would discard)
+                result = self.determine_trump_id(hand_ids, up_card_id, position, is_dealer, trump_round)
+            decision, will_go_alone = result
+
+            if mode == 'check':
+                expected = self.determine_trump_id(hand_ids, up_card_id, position, is_dealer, trump_round)
+                if (decision, will_go_alone) != expected:
+                    raise RuntimeError(
+                        f"Bidding policy returned {(decision, will_go_alone)} but the live logic returned {expected} "
+                        f"for {self.name} in {position} seat, round {trump_round}, up card {up_card}, hand {', '.join(str(card) for card in hand)}"
+                    )
+
+        return (engine.SUITS[decision] if decision >= 0 else 'pass'), will_go_alone
+
+    def determine_trump_id(self, hand, up_card, position, is_dealer, trump_round):
+        """
+        Same as determine_trump, working on card ids. Returns the trump suit index (-1 to pass) and whether to go alone
+        """
+        # TODO: Add taking into account the up card rank and who it is going to (maybe would just affect the position thresholds? Like if it is a bower, dealer position threshold goes down)
+
+        trump = engine.CARD_SUITS[up_card]
+        thresholds = self.BID_THRESHOLDS
 
         if trump_round == "1":
             # If you are dealer, in the first round, your hand should contain the up card and discard a card
-            if self.name == dealer.name:
+            if is_dealer:
                 # Dealer should analyze their hand as if they already picked up the up card
                 temp_hand = list(hand)
                 temp_hand.append(up_card)
 
                 # Discard a card
-                discarded_card = self.get_worst_card(temp_hand, up_card.suit)
+                discarded_card = self.get_worst_card_id(temp_hand, trump)
                 temp_hand.remove(discarded_card)
 
-                hand_score = self.evaluate_hand(temp_hand, trump_suit)
+                hand_score = self.get_hand_score(temp_hand, trump)
             else:
-                hand_score = self.evaluate_hand(hand, trump_suit)
+                hand_score = self.get_hand_score(hand, trump)
 
             first_round_thresholds = thresholds['round1']
 
             position_threshold = first_round_thresholds[position]
             # Go alone if hand is strong enough. However, if the up card is the right bower, first and third seat should not go alone
-            will_go_alone = hand_score >= position_threshold['loner'] and (up_card.rank != 'J' or position not in ['first', 'third'])
+            will_go_alone = hand_score >= position_threshold['loner'] and (engine.CARD_RANKS[up_card] != engine.JACK or position not in ['first', 'third'])
 
-            decision = trump_suit if hand_score >= position_threshold['normal'] else 'pass'
+            decision = trump if hand_score >= position_threshold['normal'] else -1
 
             # If you are in first seat with a callable hand, you should compare to the second round threshold because you will get first chance to call
-            if position == 'first' and decision != 'pass':
-                next_hand_score = self.evaluate_hand(hand, self.SUIT_PAIRS[trump_suit])
+            if position == 'first' and decision != -1:
+                next_hand_score = self.get_hand_score(hand, engine.SUIT_PAIRS[trump])
                 hand_score_margin = hand_score - position_threshold['normal']
                 next_hand_score_margin = next_hand_score - thresholds['round2'][position]['next']['normal']
 
                 if next_hand_score_margin > hand_score_margin:
-                    decision = 'pass'
+                    decision = -1
                     will_go_alone = False
             
             # Print hand score vs threshold for debugging
@@ -134,21 +242,19 @@ class BotLogic:
 
             second_round_thresholds = thresholds['round2']
 
-            next_suit = up_card.next_suit()
-
-            suits = ["hearts", "diamonds", "clubs", "spades"]
-            reverse_suits = [suit for suit in suits if suit not in [trump_suit, next_suit]]
+            next_suit = engine.SUIT_PAIRS[trump]
+            reverse_suits = [suit for suit in range(4) if suit not in [trump, next_suit]]
 
             seat_thresholds = second_round_thresholds[position]
 
-            next_suit_score = self.evaluate_hand(hand, next_suit)
-            reverse_suit_score_1 = self.evaluate_hand(hand, reverse_suits[0])
-            reverse_suit_score_2 = self.evaluate_hand(hand, reverse_suits[1])
+            next_suit_score = self.get_hand_score(hand, next_suit)
+            reverse_suit_score_1 = self.get_hand_score(hand, reverse_suits[0])
+            reverse_suit_score_2 = self.get_hand_score(hand, reverse_suits[1])
 
-            decision = 'pass'
+            decision = -1
             will_go_alone = False
             
-            if self.name == dealer.name:
+            if is_dealer:
                 next_margin = next_suit_score - seat_thresholds['next']['normal']
                 reverse_margin_1 = reverse_suit_score_1 - seat_thresholds['reverse']['normal']
                 reverse_margin_2 = reverse_suit_score_2 - seat_thresholds['reverse']['normal']
@@ -206,53 +312,84 @@ class BotLogic:
         """
         Evaluates the strength of the hand based on the trump suit, aces, and suit voids, multiplying each by the strategy weights
         """
-        strategy_weights = {
-            'trump_cards': 0.7,
-            'off_aces': 0.2,
-            'num_suits': 0.1
-            # 'seat_position': 0.2
-        }
+        return self.evaluate_hand_id([engine.card_id(card) for card in hand], engine.SUIT_INDEX[trump_suit])
+
+    def evaluate_hand_id(self, hand, trump):
+        """
+        Same as evaluate_hand, working on a list of card ids and a trump suit index
+        """
+        strategy_weights = self.STRATEGY_WEIGHTS
         
         score = 0
 
         # Evaluate strength of trump cards
-        trump_strength = self.evaluate_trump(hand, trump_suit)
+        trump_strength = self.evaluate_trump_id(hand, trump)
         score += trump_strength * strategy_weights['trump_cards']
 
         # Evaluate strength of Aces
-        aces_strength = self.evaluate_aces(hand, trump_suit)
+        aces_strength = self.evaluate_aces_id(hand, trump)
         score += aces_strength * strategy_weights['off_aces']
 
 
         # Evaluate suit voids
-        voids_strength = self.evaluate_voids(hand, trump_suit)
+        voids_strength = self.evaluate_voids_id(hand, trump)
         score += voids_strength * strategy_weights['num_suits']
 
         return score
 
+    def get_hand_score(self, hand, trump):
+        """
+        Returns evaluate_hand_id(hand, trump), read from the precomputed hand strength table for five card hands
+        whose score doesn't depend on their order (when the table is built, see BUILD_TABLES)
+        """
+        if len(hand) == 5:
+            table = hand_table.load_table(self, build=self.BUILD_TABLES)
+            score = table.score(hand, trump) if table is not None else None
+            if score is not None:
+                return score
+        return self.evaluate_hand_id(hand, trump)
+
+    def hand_score_order_dependent(self, hand, trump):
+        """
+        Returns True if evaluate_hand_id can score another order of the hand differently: the values of the trump
+        cards and of the off-suit aces are summed in hand order, and a float sum of three or more values can round
+        differently in another order
+        """
+        trump_mask = engine.TRUMP_MASKS[trump]
+        num_trump = sum(1 for card in hand if engine.BITS[card] & trump_mask)
+        num_aces = sum(1 for card in hand if engine.CARD_RANKS[card] == engine.ACE and not engine.BITS[card] & trump_mask)
+        return num_trump >= 3 or num_aces >= 3
+
     def evaluate_trump(self, hand, trump_suit):
         """
         Evaluates the strength of the trump cards in the hand by adding their values together and normalizing to 0-1
         """
+        return self.evaluate_trump_id([engine.card_id(card) for card in hand], engine.SUIT_INDEX[trump_suit])
+
+    def evaluate_trump_id(self, hand, trump):
+        """
+        Same as evaluate_trump, working on a list of card ids and a trump suit index
+        """
         # TODO: King could be a boss card (basically an Ace) if an ace was the up card and turned down, so should be evaluated differently (Same with Jacks if a bower was turned down the JA are top two, not JJ)
 
-        trump_cards = self.get_trump_cards(hand, trump_suit)
+        trump_mask = engine.TRUMP_MASKS[trump]
+        trump_cards = [card for card in hand if engine.BITS[card] & trump_mask]
 
-        trump_ranks = {"right": 1.0, "left": 0.9, "A": 0.8, "K": 0.7, "Q": 0.6, "10": 0.575, "9": 0.55}
+        trump_ranks = self.TRUMP_RANKS
 
         trump_score = 0
         has_right_bower = False
         has_left_bower = False
 
         for card in trump_cards:
-            if card.is_right_bower(trump_suit):
+            if card == engine.RIGHT_BOWERS[trump]:
                 trump_score += trump_ranks["right"]
                 has_right_bower = True
-            elif card.is_left_bower(trump_suit):
+            elif card == engine.LEFT_BOWERS[trump]:
                 trump_score += trump_ranks["left"]
                 has_left_bower = True
-            elif card.suit == trump_suit:
-                trump_score += trump_ranks[card.rank]
+            else:
+                trump_score += trump_ranks[engine.RANKS[engine.CARD_RANKS[card]]]
 
         multiplier = 1.0
         num_trump = len(trump_cards)
@@ -277,30 +414,39 @@ class BotLogic:
         """
         Evaluates the strength of the aces in the hand by adding 1 per ace and normalizing to 0-1
         """
+        return self.evaluate_aces_id([engine.card_id(card) for card in hand], engine.SUIT_INDEX[trump_suit])
+
+    def evaluate_aces_id(self, hand, trump):
+        """
+        Same as evaluate_aces, working on a list of card ids and a trump suit index
+        """
         # TODO: Add evaluation for doubletons (Kx, Qx) as those should be evaluated differently (could become sorta like aces)
         # TODO: King could be a boss card (basically an Ace) if an ace was the up card and turned down
         aces_sum = 0
         num_aces = 0
 
-        trump_cards = self.get_trump_cards(hand, trump_suit)
-        non_trump_cards = [card for card in hand if card not in trump_cards]
+        trump_mask = engine.TRUMP_MASKS[trump]
+        non_trump_cards = [card for card in hand if not engine.BITS[card] & trump_mask]
+        num_trump = len(hand) - len(non_trump_cards)
 
         suit_counts = {}
         for card in non_trump_cards:
-            if card.suit not in suit_counts:
-                suit_counts[card.suit] = 0
-            suit_counts[card.suit] += 1
+            suit = engine.CARD_SUITS[card]
+            if suit not in suit_counts:
+                suit_counts[suit] = 0
+            suit_counts[suit] += 1
 
         for card in non_trump_cards:
-            if card.rank == "A":
+            if engine.CARD_RANKS[card] == engine.ACE:
+                suit = engine.CARD_SUITS[card]
                 num_aces += 1
-                base_score = 0.9 if card.suit == self.SUIT_PAIRS[trump_suit] else 1
+                base_score = 0.9 if suit == engine.SUIT_PAIRS[trump] else 1
 
-                if suit_counts[card.suit] == 1:
+                if suit_counts[suit] == 1:
                     multiplier = 1
-                elif suit_counts[card.suit] == 2:
+                elif suit_counts[suit] == 2:
                     multiplier = 0.9
-                elif suit_counts[card.suit] == 3:
+                elif suit_counts[suit] == 3:
                     multiplier = 0.7
                 else:
                     multiplier = 0.5
@@ -310,7 +456,7 @@ class BotLogic:
         # Aces are more valuable if you have a lot of trump
         bonus = 1.0
         num_non_trump_suits = len(suit_counts)
-        if len(trump_cards) >= 3 and num_aces >= 1:
+        if num_trump >= 3 and num_aces >= 1:
             bonus += 0.2
             if num_non_trump_suits == 1:
                 bonus += 0.1
@@ -324,15 +470,22 @@ class BotLogic:
         """
         Evaluates the strength of the suit voids in the hand by counting the number of suits that are not in the hand and normalizing to 0-1
         """
+        return self.evaluate_voids_id([engine.card_id(card) for card in hand], engine.SUIT_INDEX[trump_suit])
+
+    def evaluate_voids_id(self, hand, trump):
+        """
+        Same as evaluate_voids, working on a list of card ids and a trump suit index
+        """
 
-        trump_cards = self.get_trump_cards(hand, trump_suit)
+        trump_mask = engine.TRUMP_MASKS[trump]
+        non_trump_cards = [card for card in hand if not engine.BITS[card] & trump_mask]
+        num_trump = len(hand) - len(non_trump_cards)
 
-        if len(trump_cards) == 0:
+        if num_trump == 0:
             # Voids are not valuable if you have no trump cards
             return 0
 
-        non_trump_cards = [card for card in hand if card not in trump_cards]
-        non_trump_suits = set(card.suit for card in non_trump_cards)
+        non_trump_suits = set(engine.CARD_SUITS[card] for card in non_trump_cards)
         num_non_trump_suits = len(non_trump_suits)
 
         if num_non_trump_suits == 0:
@@ -340,7 +493,7 @@ class BotLogic:
             return 1.0
         elif num_non_trump_suits == 1:
             # Only trump and one other suit, stronger if you have more trump cards
-            return 1.0 if len(trump_cards) == 3 else 0.9
+            return 1.0 if num_trump == 3 else 0.9
         elif num_non_trump_suits == 2:
             # Have one void
             return 0.15
@@ -370,164 +523,308 @@ class BotLogic:
         if len(hand) == 1:
             return hand[0]
 
+        state = TrickState.from_tricks(engine.SUIT_INDEX[trump_suit], previous_tricks, played_cards)
+        return self.determine_best_card_from_state(hand, state, trump_caller, going_alone, tricks_won)
+
+    def determine_best_card_from_state(self, hand, state, trump_caller, going_alone, tricks_won):
+        """
+        Same as determine_best_card, with the tricks played so far given as a TrickState
+        """
+        if len(hand) == 1:
+            return hand[0]
+
+        hand_ids = [engine.card_id(card) for card in hand]
+        best_card = self.determine_best_card_id(hand_ids, state, trump_caller, going_alone, tricks_won)
+        return hand[hand_ids.index(best_card)]
+
+    def determine_best_card_id(self, hand, state, trump_caller, going_alone, tricks_won):
+        """
+        Determines the best card to play in a trick, working on card ids (see card_engine)
+
+        hand is a list of card ids in hand order and state is the TrickState of the hand, with the current trick in state.trick.
+        Decisions are looked up in / added to self.decision_cache when it is set, in 'heuristic' CARD_PLAY_MODE
+        outside the endgame
+        """
+
+        if len(hand) == 1:
+            return hand[0]
+
+        # Sampled decisions are not cached. Tricks that can't be seated (e.g. a player without a partner set)
+        # are played with the heuristic. The layouts are sampled with a generator seeded from the position, so the
+        # same position is always played the same way
+        mode = self.CARD_PLAY_MODE
+        endgame = None
+        if self.ENDGAME_CARDS:
+            endgame = endgame_table.load_table(self.ENDGAME_CARDS, build=self.BUILD_TABLES)
+        if mode == 'pimc' or (mode == 'heuristic' and endgame is not None and len(hand) <= endgame.max_cards + 1):
+            max_layouts = None if mode == 'pimc' else self.ENDGAME_LAYOUTS
+            position = (self.name, sorted(hand), state.seen, [card for card, _ in state.trick])
+            try:
+                return pimc.choose_card(
+                    self, hand, state, trump_caller, going_alone, self.PIMC_BUDGET_MS, max_layouts,
+                    rng=random.Random(repr(position)), endgame=endgame
+                ).card
+            except ValueError:
+                pass
+        elif mode == 'ismcts':
+            try:
+                return self._ismcts_search().choose_card(
+                    self, hand, state, trump_caller, going_alone, self.ISMCTS_ITERATIONS, self.ISMCTS_BUDGET_MS
+                )
+            except ValueError:
+                pass
+
+        cache = self.decision_cache
+        if cache is None:
+            return self._determine_best_card_id(hand, state, trump_caller, going_alone, tricks_won)
+
+        key = self.get_decision_key(hand, state, trump_caller, going_alone, tricks_won)
+        index = cache.get(key)
+        if index is None:
+            index = hand.index(self._determine_best_card_id(hand, state, trump_caller, going_alone, tricks_won))
+            cache.put(key, index)
+        return hand[index]
+
+    def _ismcts_search(self):
+        """
+        The ISMCTS search of this bot, kept between its decisions so the tree is reused through a hand
+        """
+        search = getattr(self, "_ismcts", None)
+        if search is None or search.pool.capacity != self.ISMCTS_MAX_NODES:
+            try:
+                from . import ismcts
+            except ImportError:
+                import ismcts
+            search = self._ismcts = ismcts.ISMCTS(self.ISMCTS_MAX_NODES)
+        return search
+
+    def get_decision_key(self, hand, state, trump_caller, going_alone, tricks_won):
+        """
+        Key for a determine_best_card_id decision in a DecisionCache, built from exactly what the decision reads, so
+        it has to be kept in step with _determine_best_card_id and choose_lead_card_id:
+        the hand in order (ties between equal cards are broken by hand order), the lead suit, winning card and
+        winner of the current trick, which boss cards are held or winning, and the caller / going alone / tricks context.
+
+        Suits are relabeled around trump (see card_engine.CANONICAL_CARDS), so the same position with
+        another trump suit shares the key.
+        """
+        trump = state.trump
+        canonical_cards = engine.CANONICAL_CARDS[trump]
+        trump_mask = engine.TRUMP_MASKS[trump]
+        player_called_trump = trump_caller.name == self.name
+
+        trick = state.trick
+        if trick:
+            winning_card, winning_player = trick[engine.trick_winner([card for card, _ in trick], trump)]
+            trick_key = (
+                canonical_cards[trick[0][0]],
+                canonical_cards[winning_card],
+                winning_player.name == self.partner,
+                state.is_boss(winning_card),
+                len(trick),
+                any(engine.BITS[card] & trump_mask for card, _ in trick),
+            )
+        else:
+            trick_key = None
+
+        # Off suit boss cards in hand and whether the highest trump left is in hand (see choose_lead_card_id)
+        highest_trump = state.boss_card(trump, True)
+        boss_key = tuple([
+            not engine.BITS[card] & trump_mask and state.boss_card(engine.CARD_SUITS[card], False) == card
+            for card in hand
+        ])
+
+        return (
+            self._decision_strategy(),
+            tuple([canonical_cards[card] for card in hand]),
+            trick_key,
+            boss_key,
+            highest_trump >= 0 and highest_trump in hand,
+            state.trump_led,
+            state.tricks_played == 3,
+            trump_caller.name == self.partner,
+            player_called_trump,
+            going_alone and player_called_trump,
+            tricks_won >= 3,
+        )
+
+    @classmethod
+    def _decision_strategy(cls):
+        # Bots share cached decisions only if they play with the same methods (web players and simulator bots do)
+        return (cls._determine_best_card_id, cls.choose_lead_card_id, cls.get_worst_cards_id, cls._lowest_cards)
+
+    def _determine_best_card_id(self, hand, state, trump_caller, going_alone, tricks_won):
+        trump = state.trump
+        trick = state.trick
+
         partner_called_trump = trump_caller.name == self.partner
         player_called_trump = trump_caller.name == self.name
         opponent_called_trump = not partner_called_trump and not player_called_trump # TODO: It can be useful to know which opponent called trump specifically as that can change the card to play
         player_going_alone = going_alone and player_called_trump
 
         # Check if you are leading
-        if not played_cards:
+        if not trick:
             # Decide what card to lead
-            return self.choose_lead_card(hand, trump_suit, previous_tricks, partner_called_trump, player_called_trump, opponent_called_trump, player_going_alone, tricks_won)
-        
-        # Not leading, so get suit that was lead
-        if played_cards[0].card.is_left_bower(trump_suit):
-            lead_suit = played_cards[0].card.next_suit()
-        else:
-            lead_suit = played_cards[0].card.suit
+            return self.choose_lead_card_id(hand, state, partner_called_trump, player_called_trump, opponent_called_trump, player_going_alone, tricks_won)
+
+        # Not leading, so get suit that was lead (the left bower leads trump)
+        lead_suit = engine.EFFECTIVE_SUITS[trump][trick[0][0]]
+        lead_ranks = engine.RANK_TABLES[trump][lead_suit]
+        ranks = engine.RANK_TABLES[trump][engine.NO_LEAD]
 
         # Find winner of current trick
-        winning_played_card = max(played_cards, key=lambda x: BotLogic.euchre_rank(x.card, trump_suit, lead_suit))
-        current_winner = winning_played_card.player.name
-        
-        is_partner_winning = current_winner == self.partner
-        player_is_last_to_play = len(played_cards) == 3
+        winning_card, winning_player = trick[engine.trick_winner([card for card, _ in trick], trump)]
+
+        is_partner_winning = winning_player.name == self.partner
+        player_is_last_to_play = len(trick) == 3
 
         # Gather cards by suit
-        trump_cards = self.get_trump_cards(hand, trump_suit)
+        trump_mask = engine.TRUMP_MASKS[trump]
+        trump_cards = [card for card in hand if engine.BITS[card] & trump_mask]
         # If the lead suit is trump, get all trump cards, otherwise get all lead suit cards
-        if lead_suit == trump_suit:
-            lead_suit_cards = trump_cards
-        else:
-            lead_suit_cards = [card for card in hand if card.suit == lead_suit and not card.is_left_bower(trump_suit)]
-
-        # Get lowest card in hand
-        lowest_card = self.get_worst_card(hand, trump_suit)
+        follow_mask = engine.FOLLOW_MASKS[trump][lead_suit]
+        lead_suit_cards = [card for card in hand if engine.BITS[card] & follow_mask]
 
         if lead_suit_cards:
-            high_lead = max(lead_suit_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit, lead_suit))
-            low_lead = min(lead_suit_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit, lead_suit))
+            high_lead = max(lead_suit_cards, key=lead_ranks.__getitem__)
+            low_lead = min(lead_suit_cards, key=lead_ranks.__getitem__)
 
             # Follow suit
             if is_partner_winning:
                 if player_is_last_to_play:
                     # Partner already has the trick won, so play lowest card
                     return low_lead
-                elif self.is_boss_card(winning_played_card.card, previous_tricks, trump_suit):
+                elif state.is_boss(winning_card):
                     # If partner is winning with a boss card, play lowest card
                     return low_lead
                 else:
                     # If partner is not winning with a boss card, play highest card if you can win trick
-                    if BotLogic.euchre_rank(high_lead, trump_suit) > BotLogic.euchre_rank(winning_played_card.card, trump_suit):
+                    if ranks[high_lead] > ranks[winning_card]:
                         return high_lead
             else:
                 # Opponent is winning, so play highest card if you can win trick
-                if BotLogic.euchre_rank(high_lead, trump_suit) > BotLogic.euchre_rank(winning_played_card.card, trump_suit):
+                if ranks[high_lead] > ranks[winning_card]:
                     return high_lead
                 
             return low_lead
         
-        played_trump_cards = self.get_trump_cards([card.card for card in played_cards], trump_suit)
+        played_trump = any(engine.BITS[card] & trump_mask for card, _ in trick)
         
-        if not played_trump_cards:
+        if not played_trump:
             if trump_cards:
-                small_trump = min(trump_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
+                small_trump = min(trump_cards, key=ranks.__getitem__)
                 if is_partner_winning:
                     if player_is_last_to_play:
-                        return lowest_card
-                    elif not self.is_boss_card(winning_played_card.card, previous_tricks, trump_suit):
+                        return self.get_worst_card_id(hand, trump)
+                    elif not state.is_boss(winning_card):
                         # Partner is winning, but not with a good card, so play small trump
                         return small_trump
-                    return lowest_card
+                    return self.get_worst_card_id(hand, trump)
                 else:
                     # Opponent is winning, so play small trump
                     return small_trump
             else:
                 # Player has no trump cards, so play lowest card
-                return lowest_card
+                return self.get_worst_card_id(hand, trump)
                 
         # Trump cards have been played
         if is_partner_winning:
             # Partner is winning with a trump card
-            return lowest_card
+            return self.get_worst_card_id(hand, trump)
         else:
             # Opponent is winning with a trump card
-            winning_trump_cards = [card for card in trump_cards if BotLogic.euchre_rank(card, trump_suit) > BotLogic.euchre_rank(winning_played_card.card, trump_suit)]
+            winning_trump_cards = [card for card in trump_cards if ranks[card] > ranks[winning_card]]
             if winning_trump_cards:
                 # Play the highest trump necessary to take the lead
-                return min(winning_trump_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
+                return min(winning_trump_cards, key=ranks.__getitem__)
             else:
                 # Cannot win trick, so play lowest card
-                return lowest_card 
+                return self.get_worst_card_id(hand, trump)
 
     def choose_lead_card(self, hand, trump_suit, previous_tricks, partner_called_trump, player_called_trump, opponent_called_trump, player_going_alone, tricks_won):
         """
         Determines the best card to lead with
+        """
+        state = TrickState.from_tricks(engine.SUIT_INDEX[trump_suit], previous_tricks)
+        hand_ids = [engine.card_id(card) for card in hand]
+
+        lead_card = self.choose_lead_card_id(hand_ids, state, partner_called_trump, player_called_trump, opponent_called_trump, player_going_alone, tricks_won)
+        return hand[hand_ids.index(lead_card)]
+
+    def choose_lead_card_id(self, hand, state, partner_called_trump, player_called_trump, opponent_called_trump, player_going_alone, tricks_won):
+        """
+        Determines the best card to lead with, working on card ids (see determine_best_card_id)
 
         Possible things to add:
         1. consider if opponent are out of trump because if they are, but your team mate may still have trump, you don't want to lead trump unless you want to keep the lead (strong offsuit to backup)
         """
-        trump_cards = self.get_trump_cards(hand, trump_suit)
+        trump = state.trump
+        tricks_played = state.tricks_played
+        ranks = engine.RANK_TABLES[trump][engine.NO_LEAD]
+        trump_mask = engine.TRUMP_MASKS[trump]
+        trump_cards = [card for card in hand if engine.BITS[card] & trump_mask]
 
         # Get all cards that are the highest card in the suit remaining
-        boss_cards = self.get_boss_cards_in_hand(hand, previous_tricks, trump_suit)
-        non_trump_boss = [card for card in boss_cards if card.suit != trump_suit and not card.is_left_bower(trump_suit)]
-        offsuit_cards = [card for card in hand if card.suit != trump_suit and not card.is_left_bower(trump_suit)]
-        have_highest_trump = self.has_boss_card(hand, trump_suit, previous_tricks, trump_suit)
-        trump_was_led_previously = any((trick_cards[0].card.suit == trump_suit or trick_cards[0].card.is_left_bower(trump_suit)) for trick_cards in previous_tricks.values())
+        offsuit_cards = [card for card in hand if not engine.BITS[card] & trump_mask]
+        non_trump_boss = [card for card in offsuit_cards if state.boss_card(engine.CARD_SUITS[card], False) == card]
+        highest_trump = state.boss_card(trump, True)
+        have_highest_trump = highest_trump >= 0 and highest_trump in hand
+        trump_was_led_previously = state.trump_led
         secured_point = tricks_won >= 3
 
         # If you have highest trump card and a offsuit boss card, lead the trump then the boss card
         if have_highest_trump and non_trump_boss:
             if player_called_trump or partner_called_trump or (opponent_called_trump and trump_was_led_previously):
-                return max(trump_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
+                return max(trump_cards, key=ranks.__getitem__)
         
         # On second to last trick, if you have one trump and one offsuit, lead the offsuit if you called it
-        if len(previous_tricks) == 3 and len(hand) == 2:
+        if tricks_played == 3 and len(hand) == 2:
             if len(trump_cards) == 1:
                 if player_going_alone and secured_point:
-                    return max(trump_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit)) 
-                return min(hand, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
+                    return max(trump_cards, key=ranks.__getitem__) 
+                return min(hand, key=ranks.__getitem__)
 
         # Lead strong if partner called trump
         if partner_called_trump and trump_cards:
             # Do not lead a trump card if trump has already been led in a previous trick unless you have a strong hand
             if not trump_was_led_previously or (len(trump_cards) > 1 and non_trump_boss):
-                return max(trump_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
+                return max(trump_cards, key=ranks.__getitem__)
 
         # If you called trump and have highest trump, lead it
         if player_called_trump:
             if have_highest_trump:
-                return max(trump_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
+                return max(trump_cards, key=ranks.__getitem__)
             elif len(trump_cards) > 1:
                 if player_going_alone:
-                    return max(trump_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
-                return min(trump_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
+                    return max(trump_cards, key=ranks.__getitem__)
+                return min(trump_cards, key=ranks.__getitem__)
             elif player_going_alone:
-                return max(offsuit_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
+                return max(offsuit_cards, key=ranks.__getitem__)
 
         # If opponents called, but you have a strong hand, lead trump
         if opponent_called_trump:
             if non_trump_boss and len(trump_cards) >= 3:
                 if have_highest_trump:
-                    return max(trump_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
+                    return max(trump_cards, key=ranks.__getitem__)
                 else:
-                    return min(trump_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
+                    return min(trump_cards, key=ranks.__getitem__)
             
         # Lead highest off suit if it is a boss card
         if non_trump_boss:
-            return max(non_trump_boss, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
+            return max(non_trump_boss, key=ranks.__getitem__)
 
         # Otherwise, create void if possible or lead lowest card
-        return self.get_worst_card(hand, trump_suit)
+        return self.get_worst_card_id(hand, trump)
 
     def get_boss_cards_in_hand(self, hand, previous_tricks, trump_suit):
         """
         Determines all boss cards in hand
         """
+        state = TrickState.from_tricks(engine.SUIT_INDEX[trump_suit], previous_tricks)
+
         boss_cards = []
         for card in hand:
-            if self.is_boss_card(card, previous_tricks, trump_suit):
+            if state.is_boss(engine.card_id(card)):
                 boss_cards.append(card)
         return boss_cards
     
@@ -535,68 +832,68 @@ class BotLogic:
         """
         Determines the highest card of the highest rank remaining in the suit
         """
-        card_ranks = ["A", "K", "Q", "J", "10", "9"]
-
-        if is_trump:
-            all_previous_cards = [card for trick in previous_tricks.values() for card in trick]
-            # Deal with bowers
-            if not any(played_card.card.is_right_bower(suit) for played_card in all_previous_cards):
-                return "J", suit
-            elif not any(played_card.card.is_left_bower(suit) for played_card in all_previous_cards):
-                return "J", BotLogic.SUIT_PAIRS[suit] # Get left bower suit
-
-            # Both bowers have been played already    
-            card_ranks.remove("J")
+        state = TrickState.from_tricks(engine.SUIT_INDEX[suit], previous_tricks)
+        boss = state.boss_card(engine.SUIT_INDEX[suit], is_trump)
 
-        # Get all previous cards of the relevant suit
-        relevant_previous_cards = [card for trick_cards in previous_tricks.values() for card in trick_cards if card.card.suit == suit]
-
-        for card in relevant_previous_cards:
-            if card.card.rank in card_ranks:
-                card_ranks.remove(card.card.rank)
-
-        if card_ranks == []:
+        if boss < 0:
             return None, None
 
-        return card_ranks[0], suit
+        return engine.RANKS[engine.CARD_RANKS[boss]], engine.SUITS[engine.CARD_SUITS[boss]]
         
     def is_boss_card(self, card, previous_cards, trump_suit):
         """
         Determines if a card is the highest card of the highest rank remaining in the suit
         """
-        highest_card_rank, highest_card_suit = self.get_boss_card(card.suit, previous_cards, (card.suit == trump_suit or card.is_left_bower(trump_suit)))
+        state = TrickState.from_tricks(engine.SUIT_INDEX[trump_suit], previous_cards)
 
-        return card.rank == highest_card_rank and card.suit == highest_card_suit
+        return state.is_boss(engine.card_id(card))
 
     def has_boss_card(self, hand, suit, previous_cards, trump_suit):
         """
         Determines if the hand has a boss card in the given suit
         """
-        highest_card_rank, highest_card_suit = self.get_boss_card(suit, previous_cards, suit == trump_suit)
+        state = TrickState.from_tricks(engine.SUIT_INDEX[trump_suit], previous_cards)
+        boss = state.boss_card(engine.SUIT_INDEX[suit], suit == trump_suit)
 
-        if not highest_card_rank:
+        if boss < 0:
             return False
 
-        return any(card.rank == highest_card_rank and card.suit == highest_card_suit for card in hand)
+        return any(engine.card_id(card) == boss for card in hand)
                 
     def get_trump_cards(self, hand, trump_suit):
-        return [card for card in hand if card.suit == trump_suit or card.is_left_bower(trump_suit)]
+        trump_mask = engine.TRUMP_MASKS[engine.SUIT_INDEX[trump_suit]]
+        return [card for card in hand if engine.BITS[engine.card_id(card)] & trump_mask]
 
     def get_worst_card(self, hand, trump_suit):
         """
         Choose a card to discard based on creating a suit void if possible
         """
-        trump_cards = self.get_trump_cards(hand, trump_suit)
-        non_trump_cards = [card for card in hand if card not in trump_cards]
+        hand_ids = [engine.card_id(card) for card in hand]
+        worst_card = self.get_worst_card_id(hand_ids, engine.SUIT_INDEX[trump_suit])
+        return hand[hand_ids.index(worst_card)]
+
+    def get_worst_card_id(self, hand, trump):
+        """
+        Choose a card to discard based on creating a suit void if possible, working on card ids
+        """
+        return self.get_worst_cards_id(hand, trump)[0]
+
+    def get_worst_cards_id(self, hand, trump):
+        """
+        Returns every card tied for the discard get_worst_card_id makes, in hand order (get_worst_card_id takes the first)
+        """
+        ranks = engine.RANK_TABLES[trump][engine.NO_LEAD]
+        trump_mask = engine.TRUMP_MASKS[trump]
+        non_trump_cards = [card for card in hand if not engine.BITS[card] & trump_mask]
 
         if not non_trump_cards:
             # Hand is all trump cards, so discard lowest trump card
-            return min(trump_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
+            return self._lowest_cards(hand, ranks)
         
         # Find a possible void
         suit_counts = {}
         for card in non_trump_cards:
-            suit = card.suit
+            suit = engine.CARD_SUITS[card]
             if suit not in suit_counts:
                 suit_counts[suit] = []
             suit_counts[suit].append(card)
@@ -604,12 +901,17 @@ class BotLogic:
         # Find any suits with only one card (not Aces)
         possible_voids = [
             cards[0] for suit, cards in suit_counts.items()
-            if len(cards) == 1 and cards[0].rank != "A"
+            if len(cards) == 1 and engine.CARD_RANKS[cards[0]] != engine.ACE
         ]
 
         if possible_voids:
             # Choose the lowest card of the possible voids
-            return min(possible_voids, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
+            return self._lowest_cards(possible_voids, ranks)
         
         # If no possible voids, discard lowest non-trump card
-        return min(non_trump_cards, key=lambda x: BotLogic.euchre_rank(x, trump_suit))
\ No newline at end of file
+        return self._lowest_cards(non_trump_cards, ranks)
+
+    @staticmethod
+    def _lowest_cards(cards, ranks):
+        lowest = min(ranks[card] for card in cards)
+        return [card for card in cards if ranks[card] == lowest]
@@ -1,5 +1,12 @@
+import card_engine as engine
 from bot_logic import BotLogic
+from trick_state import Bidding, TrickState
 from simulation_trace import TraceConfig, JSONLTraceLogger
+from simulation_stats import SEAT_NAMES, RunningStats, SimulationStats
+from deal_stream import DealStream
+from deal_symmetry import equivalent_deals
+from hand_snapshot import HandSnapshot
+from checkpoint import CHECKPOINT_INTERVAL, Checkpoint
 
 class Bot(BotLogic):
     def __init__(self, name, partner, team):
@@ -12,6 +19,10 @@ class Bot(BotLogic):
 
 
 class Card():
+    """
+    Immutable simulator card. There is exactly one instance per card for the whole process, so
+    Card("A", "hearts") always returns the same object and deals and tricks only hold references.
+    """
     SUITS = [('hearts', 'Hearts'), ('diamonds', 'Diamonds'), ('clubs', 'Clubs'), ('spades', 'Spades')]
     RANKS = [
         ('9', '9'), ('10', '10'), ('J', 'Jack'), ('Q', 'Queen'),
@@ -25,12 +36,53 @@ class Card():
         'spades': 'clubs'
     }
 
-    def __init__(self, rank, suit):
-        self.rank = rank
-        self.suit = suit
+    __slots__ = ("rank", "suit", "card_id", "_name")
+
+    # Interned instances, indexed by card_engine id
+    _by_id = []
+
+    def __new__(cls, rank, suit):
+        return cls._by_id[engine.CARD_IDS[rank, suit]]
+
+    @classmethod
+    def _intern(cls, card_id):
+        card = object.__new__(cls)
+        object.__setattr__(card, "rank", engine.RANKS[engine.CARD_RANKS[card_id]])
+        object.__setattr__(card, "suit", engine.SUITS[engine.CARD_SUITS[card_id]])
+        object.__setattr__(card, "card_id", card_id)
+        object.__setattr__(card, "_name", engine.CARD_NAMES[card_id])
+        return card
+
+    @classmethod
+    def from_id(cls, card_id):
+        return cls._by_id[card_id]
+
+    @classmethod
+    def from_str(cls, card_str):
+        """ Parses "rank of suit" into the shared Card instance. """
+        return cls._by_id[engine.CARD_IDS_BY_NAME[card_str]]
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Card is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Card is immutable")
+
+    def __reduce__(self):
+        # Unpickle to the interned instance of the receiving process
+        return (Card.from_id, (self.card_id,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __str__(self):
-        return f"{self.rank} of {self.suit}"
+        return self._name
+
+    def __repr__(self):
+        return f"Card({self.rank!r}, {self.suit!r})"
     
     def next_suit(self):
         return self.SUITS_PAIRS[self.suit]
@@ -40,11 +92,59 @@ class Card():
     
     def is_left_bower(self, trump_suit):
         return self.suit == self.SUITS_PAIRS[trump_suit] and self.rank == 'J'
+
+
+Card._by_id = [Card._intern(card_id) for card_id in range(engine.NUM_CARDS)]
+
+# Deck in the order the simulator has always built it (A down to 9, each rank in suit order) before shuffling
+DECK = tuple(Card(rank, suit) for rank in ["A", "K", "Q", "J", "10", "9"] for suit in ["hearts", "diamonds", "clubs", "spades"])
+
+# Deals per chunk of the deal stream in seeded / parallel runs (see MonteCarloSimulation.run_simulation)
+SIMULATION_CHUNK_SIZE = 1000
+
+# Deals between precision checks of forced EV runs with a target_ci_width
+STOPPING_BATCH_SIZE = 500
+
+
+def _simulate_chunk(args):
+    """
+    Process pool entry point: plays one chunk (a DealStream slice) of a seeded run and returns its SimulationStats
+    """
+    deals, symmetry = args
+    return MonteCarloSimulation().simulate_deals(len(deals), None, deals=deals, symmetry=symmetry)
+
+
     
 class PlayedCard():
-    def __init__(self, card, player):
-        self.player = player
-        self.card = card
+    """
+    Immutable (card, player) pair. Instances are shared per player name, one for each card.
+    """
+    __slots__ = ("card", "player")
+
+    # player name -> list of PlayedCard indexed by card id (only the latest player object with that name is kept)
+    _by_player_name = {}
+
+    def __new__(cls, card, player):
+        played_cards = cls._by_player_name.get(player.name)
+        if played_cards is None:
+            played_cards = cls._by_player_name[player.name] = [None] * engine.NUM_CARDS
+
+        played_card = played_cards[card.card_id]
+        if played_card is None or played_card.player is not player:
+            played_card = object.__new__(cls)
+            object.__setattr__(played_card, "card", card)
+            object.__setattr__(played_card, "player", player)
+            played_cards[card.card_id] = played_card
+        return played_card
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PlayedCard is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("PlayedCard is immutable")
+
+    def __reduce__(self):
+        return (PlayedCard, (self.card, self.player))
 
     def __str__(self):
         return f"{self.player.name} played {self.card.rank} of {self.card.suit}"
@@ -55,247 +155,293 @@ class MonteCarloSimulation():
 
     def _hand_to_list(self, hand):
         return [self._card_to_str(c) for c in hand]
+
+    def _ids_to_list(self, hand):
+        return [engine.CARD_NAMES[c] for c in hand]
     
-    def run_simulation(self, num_simulations=1000):
+    def run_simulation(
+        self,
+        num_simulations=1000,
+        decision_cache=None,
+        workers=1,
+        seed=None,
+        deals=None,
+        symmetry=None,
+        checkpoint_path=None,
+        resume=False,
+        checkpoint_interval=CHECKPOINT_INTERVAL,
+    ):
         """
         Runs a simulation to determine the call percentage for each seat position in order to tweak thresholds and strategy weights
+
+        decision_cache is an optional DecisionCache the bots use for card play (see decision_cache).
+
+        With a seed the deals are the first num_simulations of DealStream(seed) (see deal_stream), split into
+        chunks of SIMULATION_CHUNK_SIZE consecutive deals that are run on a pool of workers processes when
+        workers > 1. The stats are the same for a given seed whatever the number of workers. deals is an optional
+        DealStream (a slice, or a DealCorpus) to take the deals from instead. Without any of those and with one
+        worker the deck is shuffled with the random module as before.
+
+        symmetry plays every deal as each of its equivalent deals as well (see simulate_deals): "dealer" gives
+        every hand of a deal to every seat in turn, which takes the luck of the deal out of the differences
+        between seats, "suits" relabels the suits and "full" does both.
+
+        run_batch_simulation plays the same seeded deals to the same stats about ten times faster, for bots that
+        play with BotLogic's heuristic.
+
+        With a checkpoint_path the stats and the position in the deals are saved to that file every
+        checkpoint_interval seconds (see checkpoint), which needs a seed or deals. With resume the run continues
+        from the file, with the same stats in the end as a run that was never interrupted.
+
+        Returns the SimulationStats of the run.
         """
         import random
 
-        bot1 = Bot("Bot 1", partner="Bot 3", team=1)
-        bot2 = Bot("Bot 2", partner="Bot 4", team=2)
-        bot3 = Bot("Bot 3", partner="Bot 1", team=1)
-        bot4 = Bot("Bot 4", partner="Bot 2", team=2) # always dealer
+        checkpoint = None
+        if checkpoint_path is not None:
+            if seed is None and deals is None:
+                raise ValueError("Checkpoints need a seed (or deals) to deal the same deals again")
+            key = {
+                "run": "simulation",
+                "num_simulations": num_simulations,
+                "seed": seed if deals is None else deals.seed,
+                "start": 0 if deals is None else deals.start,
+                "symmetry": symmetry,
+            }
+            checkpoint = Checkpoint(checkpoint_path, key, checkpoint_interval, resume)
+
+        if workers > 1 or seed is not None or deals is not None:
+            if decision_cache is not None and workers > 1:
+                raise ValueError("decision_cache can't be shared between worker processes")
+            if deals is None:
+                deals = DealStream(random.randrange(2 ** 63) if seed is None else seed)
+            stats = self._run_chunks(deals[:num_simulations], workers, decision_cache, symmetry, checkpoint)
+        else:
+            stats = self.simulate_deals(num_simulations, random, decision_cache, symmetry=symmetry)
 
-        players = [bot1, bot2, bot3, bot4]
+        stats.print_report()
 
-        # Track number of calls for each player
-        calls_round1 = {player.name: 0 for player in players}
-        calls_round2 = {player.name: 0 for player in players}
+        if decision_cache is not None:
+            cache_stats = decision_cache.stats()
+            print(f"Decision cache: {cache_stats['hit_rate']:.2%} hit rate ({cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions, {cache_stats['size']} entries)")
 
-        # Track number of wins for each team
-        team1_wins = 0
-        team2_wins = 0
+        return stats
 
-        # Track number of calls for each team
-        team1_calls = 0
-        team2_calls = 0
+    def _run_chunks(self, deals, workers, decision_cache=None, symmetry=None, checkpoint=None):
+        """
+        Runs the deals of a bounded DealStream in chunks (in order, or on a process pool) and merges their stats,
+        from the position saved in the checkpoint (a Checkpoint) and saving the stats there after every chunk when due
+        """
+        stats = SimulationStats()
+        position = 0
+        saved = checkpoint.get("simulation") if checkpoint is not None else None
+        if saved is not None:
+            stats, position = saved["stats"], saved["position"]
+
+        # Chunks start at multiples of SIMULATION_CHUNK_SIZE whatever the position, so the stats are merged the same way
+        chunks = deals[position:].chunks(SIMULATION_CHUNK_SIZE)
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(_simulate_chunk, [(chunk, symmetry) for chunk in chunks])
+        else:
+            executor = None
+            results = (self.simulate_deals(len(chunk), None, decision_cache, deals=chunk, symmetry=symmetry) for chunk in chunks)
+
+        try:
+            for chunk, chunk_stats in zip(chunks, results):
+                stats.merge(chunk_stats)
+                position += len(chunk)
+                if checkpoint is not None:
+                    checkpoint.update("simulation", lambda: {"stats": stats, "position": position})
+        finally:
+            if executor is not None:
+                # An interrupted run doesn't wait for the chunks not started yet
+                executor.shutdown(cancel_futures=True)
+
+        if checkpoint is not None:
+            checkpoint.update("simulation", lambda: {"stats": stats, "position": position}, force=True)
+        return stats
+
+    def simulate_deals(self, num_simulations, rng, decision_cache=None, deal=None, deals=None, symmetry=None, players=None, snapshots=None):
+        """
+        Deals and plays num_simulations hands (the deck shuffled with rng.shuffle) with Bot 4 dealing
+        and returns their SimulationStats
 
-        # Track number of times each team marches
-        team1_marches = 0
-        team2_marches = 0
+        deal is an optional function of rng returning the 21 card ids to deal (see stratified_sampling)
+        instead of the shuffled deck, deals an optional iterable of such deals (e.g. a DealStream) dealt in order.
 
-        # Track total points for each team
-        team1_total_points = 0
-        team2_total_points = 0
+        With a symmetry (a key of deal_symmetry.SYMMETRIES), every deal is also played as each of its equivalent
+        deals (suits relabelled and / or hands rotated around the table), and the stats get standard errors that
+        count the hands played from one deal as a single sample (see SimulationStats.record_equivalents).
 
-        # Track loner attempts
-        loner_attempts_round1 = {player.name: 0 for player in players}
-        loner_attempts_round2 = {player.name: 0 for player in players}
-        team1_loner_attempts = 0
-        team2_loner_attempts = 0
-        team1_loner_wins = 0
-        team2_loner_wins = 0
+        players is an optional list of the four players to use instead of Bots (named Bot 1-4 in seat order).
 
-        for _ in range(num_simulations):
-            
-            team1_points, team2_points = 0, 0
+        snapshots is an optional list the HandSnapshot of every card play decision is appended to (see play_hand).
+        """
+        if players is None:
+            bot1 = Bot("Bot 1", partner="Bot 3", team=1)
+            bot2 = Bot("Bot 2", partner="Bot 4", team=2)
+            bot3 = Bot("Bot 3", partner="Bot 1", team=1)
+            bot4 = Bot("Bot 4", partner="Bot 2", team=2) # always dealer
+            players = [bot1, bot2, bot3, bot4]
+        else:
+            bot4 = players[3]
 
-            # Make and shuffle deck
-            suits = ["hearts", "diamonds", "clubs", "spades"]
-            ranks = ["A", "K", "Q", "J", "10", "9"]
-            deck = [f"{rank} of {suit}" for rank in ranks for suit in suits]
-            random.shuffle(deck)
+        for bot in players:
+            bot.decision_cache = decision_cache
 
-            # Deal cards to players
-            dealt_hands = {}
-            for bot in players:
-                bot_cards = deck[:5]
-                deck = deck[5:]
+        stats = SimulationStats()
+        deals = iter(deals) if deals is not None else None
 
-                dealt_hands[bot.name] = self.convert_to_cards(bot_cards, bot)
+        for _ in range(num_simulations):
 
-            up_card_string = deck[0]
+            if deals is not None:
+                deck = [Card.from_id(card_id) for card_id in next(deals)]
+            elif deal is not None:
+                deck = [Card.from_id(card_id) for card_id in deal(rng)]
+            else:
+                # Shuffle the shared deck
+                deck = list(DECK)
+                rng.shuffle(deck)
+
+            if symmetry is not None:
+                # Every equivalent deal is played, and counted as one sample for the standard errors
+                card_ids = [engine.card_id(card) for card in deck[:21]]
+                variants = [[Card.from_id(card_id) for card_id in variant] for variant in equivalent_deals(card_ids, symmetry)]
+            else:
+                variants = [deck]
 
-            dealer = bot4
-            
-            up_card_rank, up_card_suit = up_card_string.split(" of ")
-            up_card = Card(up_card_rank, up_card_suit)
+            results = []
+            for deck in variants:
 
-            # Each bot makes trump decision
-            trump_maker = None
-            for trump_round in (1, 2):
-                for bot in players:
+                # Deal cards to players
+                dealt_hands = {}
+                for i, bot in enumerate(players):
+                    dealt_hands[bot.name] = deck[i * 5:i * 5 + 5]
 
-                    trump_decision, going_alone = bot.determine_trump(
-                        hand=dealt_hands[bot.name],
-                        dealer=dealer,
-                        up_card=up_card,
-                        player_order=players,
-                        trump_round=str(trump_round)
-                    )
+                up_card = deck[20]
 
-                    if trump_decision != 'pass':
+                dealer = bot4
 
-                        # print(f"{bot.name} called {trump_decision} ({up_card}) in round {trump_round} with hand: {', '.join([str(card) for card in dealt_hands[bot.name]])} ({going_alone})")
+                # Each bot makes trump decision
+                trump_maker = None
+                discarded_card = None
+                for trump_round in (1, 2):
+                    for bot in players:
 
-                        if trump_round == 1:
-                            calls_round1[bot.name] += 1
+                        trump_decision, going_alone = bot.determine_trump(
+                            hand=dealt_hands[bot.name],
+                            dealer=dealer,
+                            up_card=up_card,
+                            player_order=players,
+                            trump_round=str(trump_round)
+                        )
+
+                        if trump_decision != 'pass':
+
+                            # print(f"{bot.name} called {trump_decision} ({up_card}) in round {trump_round} with hand: {', '.join([str(card) for card in dealt_hands[bot.name]])} ({going_alone})")
 
-                            if going_alone:
-                                loner_attempts_round1[bot.name] += 1
+                            stats.record_call(bot.name, trump_round, going_alone)
 
-                            dealt_hands[dealer.name].append(up_card)
+                            if trump_round == 1:
+                                dealt_hands[dealer.name].append(up_card)
                             
-                            discarded_card = dealer.get_worst_card(dealt_hands[dealer.name], up_card.suit)
-                            dealt_hands[dealer.name].remove(discarded_card)
-                        else:
-                            calls_round2[bot.name] += 1
+                                discarded_card = dealer.get_worst_card(dealt_hands[dealer.name], up_card.suit)
+                                dealt_hands[dealer.name].remove(discarded_card)
 
-                            if going_alone:
-                                loner_attempts_round2[bot.name] += 1
+                            trump_maker = bot
 
-                        trump_maker = bot
+                            break
 
+                    if trump_maker:
                         break
 
-                if trump_maker:
-                    break
-
-            # Use this to get stats on how many times each call was successful or euchred
-            team1_points, team2_points = self.play_hand(dealt_hands, players, trump_decision, trump_maker, going_alone)
-
-            team1_total_points += team1_points
-            team2_total_points += team2_points
-
-            # Calculate calls and wins
-            if trump_maker.team == 1:
-                team1_calls += 1
-                if going_alone:
-                    team1_loner_attempts += 1
-                    if team1_points == 4:
-                        team1_loner_wins += 1
-                if team1_points > team2_points:
-                    team1_wins += 1
-                    if team1_points == 2:
-                        team1_marches += 1
-            else:
-                team2_calls += 1
-                if going_alone:
-                    team2_loner_attempts += 1
-                    if team2_points == 4:
-                        team2_loner_wins += 1
-                if team2_points > team1_points:
-                    team2_wins += 1
-                    if team2_points == 2:
-                        team2_marches += 1
-
-
-        # Calculate probabilities
-        call_rates_round1 = {
-            name: round(count / num_simulations * 100, 2)
-            for name, count in calls_round1.items()
-        }
-        call_rates_round2 = {
-            name: round(count / num_simulations * 100, 2)
-            for name, count in calls_round2.items()
-        }
+                bidding = self._bidding(dealer, up_card, trump_round, discarded_card)
 
-        total_calls = {
-            name: calls_round1[name] + calls_round2[name]
-            for name in calls_round1
-        }
-        total_call_rates = {
-            name: round(total_calls[name] / num_simulations * 100, 2)
-            for name in calls_round1
-        }
+                # Use this to get stats on how many times each call was successful or euchred
+                team1_points, team2_points = self.play_hand(
+                    dealt_hands, players, trump_decision, trump_maker, going_alone, snapshots=snapshots, bidding=bidding
+                )
 
-        loner_rates_round1 = {
-            name: round(loner_attempts_round1[name] / num_simulations * 100, 2)
-            for name in loner_attempts_round1
-        }
-        loner_rates_round2 = {
-            name: round(loner_attempts_round2[name] / num_simulations * 100, 2)
-            for name in loner_attempts_round2
-        }
-        total_loner_rates = {
-            name: round((loner_attempts_round1[name] + loner_attempts_round2[name]) / num_simulations * 100, 2)
-            for name in loner_attempts_round1
-        }
-        
-        print(f"Round 1 call rates after {num_simulations} simulations:")
-        for name, rate in call_rates_round1.items():
-            print(f"{name}: {rate}%")
+                stats.record_hand(trump_maker, going_alone, team1_points, team2_points)
+                results.append((trump_maker, team1_points, team2_points))
 
-        print(f"Round 2 call rates after {num_simulations} simulations:")
-        for name, rate in call_rates_round2.items():
-            print(f"{name}: {rate}%")
+            if symmetry is not None:
+                stats.record_equivalents(results)
 
-        print(f"Total call rates after {num_simulations} simulations:")
-        for name, rate in total_call_rates.items():
-            print(f"{name}: {rate}%")
+        return stats
 
-        print(f"Loner rates in round 1 after {num_simulations} simulations:")
-        for name, rate in loner_rates_round1.items():
-            print(f"{name}: {rate}%")
+    def run_batch_simulation(self, num_simulations=100000, seed=None):
+        """
+        Same as run_simulation, with the deals bid and played in lockstep batches by batch_simulator (NumPy).
+        With a seed the deals are the first num_simulations of DealStream(seed), like run_simulation's.
+        Falls back to simulate_deals when NumPy is not installed, the bots play with their own decision methods
+        or a search (PIMC, ISMCTS), or bidding is not going through the compiled policy.
 
-        print(f"Loner rates in round 2 after {num_simulations} simulations:")
-        for name, rate in loner_rates_round2.items():
-            print(f"{name}: {rate}%")
+        Returns the SimulationStats of the run.
+        """
+        import random
 
-        print(f"Total loner rates after {num_simulations} simulations:")
-        for name, rate in total_loner_rates.items():
-            print(f"{name}: {rate}%")
+        bot = Bot("Bot 1", partner="Bot 3", team=1)
+        try:
+            import batch_simulator
+        except ImportError:
+            batch_simulator = None
+
+        if (
+            batch_simulator is not None
+            and bot._decision_strategy() == BotLogic._decision_strategy()
+            and bot.BIDDING_POLICY_MODE == 'table'
+            and bot.CARD_PLAY_MODE == 'heuristic'
+        ):
+            stats = batch_simulator.simulate_batch(num_simulations, seed, Bot)
+        elif seed is not None:
+            stats = self.simulate_deals(num_simulations, None, deals=DealStream(seed)[:num_simulations])
+        else:
+            stats = self.simulate_deals(num_simulations, random)
 
+        stats.print_report()
+        return stats
 
-        # Calculate win rates
-        if team1_calls != 0:
-            print(f"Team 1 wins: {team1_wins}")
-            print(f"Team 1 calls: {team1_calls}")
-            team1_win_rate = (team1_wins / team1_calls) * 100
-        else:
-            team1_win_rate = 0
-        if team2_calls != 0:
-            print(f"Team 2 wins: {team2_wins}")
-            print(f"Team 2 calls: {team2_calls}")
-            team2_win_rate = (team2_wins / team2_calls) * 100
-        else:
-            team2_win_rate = 0
+    def run_stratified_simulation(self, num_simulations=1000, seat="Bot 1", min_share=0.05, seed=None, decision_cache=None):
+        """
+        Same as run_simulation but deals from the strata of stratified_sampling.TrumpCountStrata for seat (cards of
+        the up card's suit in its hand, and whether the up card is a jack), so that the four and five card
+        suits loners come from get min_share of the deals each instead of a few per thousand.
+        Estimates are reweighted by stratum probability, so they stay unbiased.
 
-        print(f"Team 1 win rate after {num_simulations} simulations: {team1_win_rate}%")
-        print(f"Team 2 win rate after {num_simulations} simulations: {team2_win_rate}%")
+        Returns the StratifiedStats of the run.
+        """
+        import random
 
-        # Print points per hand for each team
-        print(f"Team 1 points per hand: {team1_total_points / num_simulations}")
-        print(f"Team 2 points per hand: {team2_total_points / num_simulations}")
+        from stratified_sampling import StratifiedStats, TrumpCountStrata, allocate
 
-        if team1_marches != 0:
-            team1_marches_rate = (team1_marches / team1_calls) * 100
-            print(f"Team 1 marches: {team1_marches_rate}%")
-        if team2_marches != 0:
-            team2_marches_rate = (team2_marches / team2_calls) * 100
-            print(f"Team 2 marches: {team2_marches_rate}%")
+        strata = TrumpCountStrata(SEAT_NAMES.index(seat))
+        stats = StratifiedStats(strata.probabilities)
+        rng = random.Random(seed)
 
-        if team1_loner_attempts != 0:
-            team1_loner_success_rate = (team1_loner_wins / team1_loner_attempts) * 100
-            print(f"Team 1 loner success rate: {team1_loner_success_rate:.2f}%")
-        if team2_loner_attempts != 0:
-            team2_loner_success_rate = (team2_loner_wins / team2_loner_attempts) * 100
-            print(f"Team 2 loner success rate: {team2_loner_success_rate:.2f}%")
-        # Total loner success rate
-        if team1_loner_attempts + team2_loner_attempts != 0:
-            total_loner_success_rate = ((team1_loner_wins + team2_loner_wins) / (team1_loner_attempts + team2_loner_attempts)) * 100
-            print(f"Total loner success rate: {total_loner_success_rate:.2f}%")
+        for stratum, num_deals in allocate(strata.probabilities, num_simulations, min_share).items():
+            deal = lambda rng, stratum=stratum: strata.deal(stratum, rng)
+            stats.strata[stratum] = self.simulate_deals(num_deals, rng, decision_cache, deal=deal)
 
+        stats.print_report()
+        return stats
 
-    def play_hand(self, dealt_hands, players, trump_suit, trump_maker, going_alone, forced_lead=None, trace=None):
+    def play_hand(self, dealt_hands, players, trump_suit, trump_maker, going_alone, forced_lead=None, trace=None, snapshots=None, bidding=None):
         """
-        Simulates playing a hand of Euchre using bot.determine_best_card().
+        Simulates playing a hand of Euchre using bot.determine_best_card_id() on card ids (see card_engine).
+        players are in seat order and bidding is the trick_state.Bidding of the hand, if known: the card play
+        searches deal the hidden cards with them (see pimc).
+
+        snapshots is an optional list the HandSnapshot before every card played is appended to, to branch the
+        play from any decision (see hand_snapshot).
         """
 
-        previous_tricks = {}
-        team1_tricks = 0
-        team2_tricks = 0
+        # Hands are kept as lists of card ids in dealt order, the tricks played in a TrickState
+        hands = {name: [engine.card_id(card) for card in hand] for name, hand in dealt_hands.items()}
+        state = TrickState(engine.SUIT_INDEX[trump_suit], players, bidding)
 
         # Create copy of players list to keep track of player order
         play_order = players[:]
@@ -304,7 +450,9 @@ class MonteCarloSimulation():
         if going_alone:
             partner = next(p for p in play_order if p.name == trump_maker.partner)
             play_order.remove(partner)
-            del dealt_hands[partner.name]
+            del hands[partner.name]
+
+        hand_masks = {name: engine.mask_of(hand) for name, hand in hands.items()}
 
         if trace is not None:
             trace["trump_suit"] = trump_suit
@@ -312,69 +460,65 @@ class MonteCarloSimulation():
             trace["going_alone"] = bool(going_alone)
             trace["initial_play_order"] = [p.name for p in play_order]
             trace["tricks"] = []
-            trace["initial_hands"] = {name: self._hand_to_list(hand) for name, hand in dealt_hands.items()}
+            trace["initial_hands"] = {name: self._ids_to_list(hand) for name, hand in hands.items()}
 
-        forced_lead_applied = False
+        forced_lead_id = engine.card_id(forced_lead) if forced_lead is not None else None
 
-        for trick_number in range(1, 6):
-            played_cards = []
+        snapshot = None
+        if snapshots is not None:
+            # Later snapshots are played from this one, sharing what each card leaves unchanged
+            snapshot = HandSnapshot(
+                tuple(players), tuple(play_order), {name: tuple(hand) for name, hand in hands.items()},
+                state.copy(), trump_maker, going_alone
+            )
 
+        for trick_number in range(1, 6):
             # Each player plays a card
             for seat_idx, bot in enumerate(play_order):
-                if (forced_lead is not None) and (trick_number == 1) and (seat_idx == 0):
-                    # First player plays the forced lead card
-                    target = forced_lead
-                    # Make sure we have the card
-                    if any(c.rank == target.rank and c.suit == target.suit for c in dealt_hands[bot.name]):
-                        card_to_play = next(c for c in dealt_hands[bot.name] if c.rank == target.rank and c.suit == target.suit)
-                        forced_lead_applied = True
-                    else:
-                        # Don't have the card, play normally
-                        card_to_play = bot.determine_best_card(
-                            hand=dealt_hands[bot.name],
-                            trump_suit=trump_suit,
-                            played_cards=played_cards,
-                            previous_tricks=previous_tricks,
-                            trump_caller=trump_maker,
-                            going_alone=going_alone,
-                            tricks_won=team1_tricks if bot.team == 1 else team2_tricks
-                        )
+                hand = hands[bot.name]
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+
+                if (forced_lead_id in hand) and (trick_number == 1) and (seat_idx == 0):
+                    # First player plays the forced lead card if they have it, otherwise they play normally
+                    card_to_play = forced_lead_id
                 else:
-                    card_to_play = bot.determine_best_card(
-                        hand=dealt_hands[bot.name],
-                        trump_suit=trump_suit,
-                        played_cards=played_cards,
-                        previous_tricks=previous_tricks,
-                        trump_caller=trump_maker,
-                        going_alone=going_alone,
-                        tricks_won=team1_tricks if bot.team == 1 else team2_tricks
+                    card_to_play = bot.determine_best_card_id(
+                        hand,
+                        state,
+                        trump_maker,
+                        going_alone,
+                        state.tricks_won(bot.team)
                     )
 
-                dealt_hands[bot.name].remove(card_to_play)
+                # Bots are trusted to pick a card, not to follow suit (any card can be led)
+                if state.trick and not engine.is_legal(card_to_play, hand_masks[bot.name], state.trump, state.trick[0][0]):
+                    raise ValueError(f"{bot.name} played {engine.CARD_NAMES[card_to_play]} without following suit")
 
-                played_cards.append(PlayedCard(card=card_to_play, player=bot))
+                hand.remove(card_to_play)
+                hand_masks[bot.name] ^= engine.BITS[card_to_play]
+                if snapshot is not None:
+                    snapshot = snapshot.play(card_to_play)
 
-            # Determine the winner of the trick
-            winner = self.evaluate_trick_winner(trump_suit, played_cards)
+                state.play(card_to_play, bot)
 
-            # Add the played cards to the previous cards
-            previous_tricks[trick_number] = played_cards
+            trick = state.trick
 
-            # Add 1 to the number of tricks the winner has in the original player list
-            if winner.team == 1:
-              team1_tricks += 1
-            elif winner.team == 2:
-              team2_tricks += 1
+            # Determine the winner of the trick, which also adds the played cards to the previous cards
+            # and 1 to the number of tricks the winner's team has
+            winner = state.finish_trick()
+            team1_tricks = state.tricks_won(1)
+            team2_tricks = state.tricks_won(2)
 
             if trace is not None:
                 trace["tricks"].append({
                     "trick": trick_number,
-                    "lead_player": played_cards[0].player.name,
-                    "plays": [{"player": pc.player.name, "card": self._card_to_str(pc.card)} for pc in played_cards],
+                    "lead_player": trick[0][1].name,
+                    "plays": [{"player": bot.name, "card": engine.CARD_NAMES[card]} for card, bot in trick],
                     "winner": winner.name,
                     "team1_tricks": team1_tricks,
                     "team2_tricks": team2_tricks,
-                    "hands_after": {name: self._hand_to_list(hand) for name, hand in dealt_hands.items()},
+                    "hands_after": {name: self._ids_to_list(hand) for name, hand in hands.items()},
                 })
 
             # Rotate the players list so that the winner leads the next trick
@@ -449,12 +593,7 @@ class MonteCarloSimulation():
         return team1_points, team2_points
 
     def convert_to_cards(self, string_cards, player):
-        dummy_hand = []
-        for card_str in string_cards:
-            rank, suit = card_str.split(" of ")
-            dummy_card = Card(rank=rank, suit=suit)
-            dummy_hand.append(dummy_card)
-        return dummy_hand        
+        return [Card.from_str(card_str) for card_str in string_cards]
     
     def print_hand_scores(self, hand_str, trump_suit):
         """
@@ -466,10 +605,7 @@ class MonteCarloSimulation():
         bot = Bot("Bot", partner="Bot", team=1)
 
         # Convert string to list of cards
-        hand = []
-        for card_str in hand_str.split(", "):
-            rank, suit = card_str.split(" of ")
-            hand.append(Card(rank=rank, suit=suit))
+        hand = self.convert_to_cards(hand_str.split(", "), bot)
             
         print(f"\nScoring hand: {hand_str}")
         print("---------------")
@@ -487,6 +623,136 @@ class MonteCarloSimulation():
         print(f"  Total Score: {total_score:.3f}")
 
     
+    def score_deals(self, num_simulations, seed=None):
+        """
+        Deals num_simulations hands with NumPy and scores every seat for every trump suit in one batch, without playing them.
+
+        Returns a dict with "hands" (N, 4, 5) card ids for Bot 1-4, "up_cards" (N,) and "scores" (N, 4 seats, 4 suits),
+        where scores match BotLogic.evaluate_hand exactly. Useful for threshold analysis over millions of deals.
+        """
+        from batch_evaluator import deal_hands, evaluate_hands
+
+        hands, up_cards = deal_hands(num_simulations, seed)
+        scores = evaluate_hands(hands.reshape(-1, 5)).reshape(num_simulations, 4, 4)
+
+        return {"hands": hands, "up_cards": up_cards, "scores": scores}
+
+    def record_threshold_sweep(self, num_simulations, position="first", kind="normal", seed=None, decision_cache=None):
+        """
+        Records the deals of DealStream(seed) once for a what-if sweep of BID_THRESHOLDS['round1'][position][kind]
+        (see threshold_sweep): every deal the seat in that position bids on in round 1 is played with the seat
+        calling and passing ('normal'), or going alone and not ('loner') when it calls, the rest of the bidding as usual.
+
+        Returns the ThresholdSweep, e.g. record_threshold_sweep(20000).grid(0.2, 0.45, 26)
+        """
+        import random
+
+        from threshold_sweep import ThresholdSweep
+
+        if kind not in ("normal", "loner"):
+            raise ValueError(f"Only round 1 'normal' and 'loner' thresholds can be swept, not {kind!r}")
+
+        bot1 = Bot("Bot 1", partner="Bot 3", team=1)
+        bot2 = Bot("Bot 2", partner="Bot 4", team=2)
+        bot3 = Bot("Bot 3", partner="Bot 1", team=1)
+        bot4 = Bot("Bot 4", partner="Bot 2", team=2)  # dealer
+        players = [bot1, bot2, bot3, bot4]
+        dealer = bot4
+
+        for bot in players:
+            bot.decision_cache = decision_cache
+
+        controlled_bot = players[["first", "second", "third", "dealer"].index(position)]
+        thresholds = controlled_bot.BID_THRESHOLDS['round1'][position]
+        deals = DealStream(random.randrange(2 ** 63) if seed is None else seed)
+
+        def play(dealt_hands, up, forced_action, forced_going_alone=False):
+            # Net points of the controlled team, and whether the controlled seat got to bid in round 1
+            hands_copy = {k: list(v) for k, v in dealt_hands.items()}
+            trump_decision, trump_maker, going_alone, override_applied, bidding = self._resolve_trump_with_override(
+                players=players,
+                dealer=dealer,
+                up_card=up,
+                dealt_hands=hands_copy,
+                controlled_bot_name=controlled_bot.name,
+                forced_round=1,
+                forced_action=forced_action,
+                forced_going_alone=forced_going_alone,
+            )
+            if trump_maker is None:
+                return 0, override_applied
+            team1_pts, team2_pts = self.play_hand(hands_copy, players, trump_decision, trump_maker, going_alone, bidding=bidding)
+            return (team1_pts - team2_pts if controlled_bot.team == 1 else team2_pts - team1_pts), override_applied
+
+        base_net = 0
+        records = []
+        for deal in deals[:num_simulations]:
+            deck = [Card.from_id(card_id) for card_id in deal]
+            dealt_hands = {bot.name: deck[i * 5:i * 5 + 5] for i, bot in enumerate(players)}
+            up = deck[20]
+
+            pass_net, reached = play(dealt_hands, up, "pass")
+            if not reached:
+                base_net += pass_net
+                continue
+
+            hand = dealt_hands[controlled_bot.name]
+            score, critical, alone_allowed = self._round1_critical_value(controlled_bot, hand, up, position)
+            calls = thresholds['normal'] <= critical
+            # Whether the seat goes alone when it calls, at any 'normal' threshold
+            alone_if_called = alone_allowed and score >= thresholds['loner']
+
+            # The critical value must give the live decision at the current thresholds
+            decision, going_alone = controlled_bot.determine_trump(
+                hand=hand, dealer=dealer, up_card=up, player_order=players, trump_round="1"
+            )
+            if ((decision != "pass") != calls or bool(going_alone) != (calls and alone_if_called)) and abs(critical - thresholds['normal']) > 1e-9:
+                raise RuntimeError(
+                    f"Critical value {critical} of {controlled_bot.name} does not match its live decision "
+                    f"{(decision, going_alone)} for up card {up}, hand {', '.join(str(card) for card in hand)}"
+                )
+
+            if kind == "normal":
+                call_net, _ = play(dealt_hands, up, "order_up", alone_if_called)
+                records.append((critical, call_net, pass_net, alone_if_called))
+            elif not calls:
+                base_net += pass_net
+            else:
+                call_net, _ = play(dealt_hands, up, "order_up", False)
+                if alone_allowed:
+                    alone_net, _ = play(dealt_hands, up, "order_up", True)
+                    records.append((score, alone_net, call_net, True))
+                else:
+                    base_net += call_net
+
+        return ThresholdSweep(position, kind, thresholds[kind], num_simulations, base_net, records)
+
+    @staticmethod
+    def _round1_critical_value(bot, hand, up_card, position):
+        """
+        (hand score, highest 'normal' threshold the seat still calls at, whether it may go alone) for a round 1
+        bid of bot in position, the way BotLogic.determine_trump_id scores it
+        """
+        hand_ids = [engine.card_id(card) for card in hand]
+        up_card_id = engine.card_id(up_card)
+        trump = engine.CARD_SUITS[up_card_id]
+
+        if position == "dealer":
+            temp_hand = hand_ids + [up_card_id]
+            temp_hand.remove(bot.get_worst_card_id(temp_hand, trump))
+            score = bot.get_hand_score(temp_hand, trump)
+        else:
+            score = bot.get_hand_score(hand_ids, trump)
+
+        critical = score
+        if position == "first":
+            # First seat passes when its hand is further above the round 2 threshold for the next suit
+            next_margin = bot.get_hand_score(hand_ids, engine.SUIT_PAIRS[trump]) - bot.BID_THRESHOLDS['round2']['first']['next']['normal']
+            critical = min(score, score - next_margin)
+
+        alone_allowed = engine.CARD_RANKS[up_card_id] != engine.JACK or position not in ("first", "third")
+        return score, critical, alone_allowed
+
     def _forced_decision_to_trump(self, forced_action, up_card):
         """
         forced_action:
@@ -529,6 +795,7 @@ class MonteCarloSimulation():
         we force (forced_action) instead of calling bot.determine_trump.
 
         override_applied is True only if we actually reached the controlled bot's turn in that round.
+        Returns (trump_decision, trump_maker, going_alone, override_applied, Bidding of the hand or None).
         """
         trump_maker = None
         trump_decision = "pass"
@@ -553,15 +820,96 @@ class MonteCarloSimulation():
                 if trump_decision != "pass":
                     trump_maker = bot
 
+                    discarded = None
                     if trump_round == 1:
                         # dealer picks up and discards
                         dealt_hands[dealer.name].append(up_card)
                         discarded = dealer.get_worst_card(dealt_hands[dealer.name], up_card.suit)
                         dealt_hands[dealer.name].remove(discarded)
 
-                    return trump_decision, trump_maker, going_alone, override_applied
+                    bidding = self._bidding(dealer, up_card, trump_round, discarded)
+                    return trump_decision, trump_maker, going_alone, override_applied, bidding
+
+        return "pass", None, False, override_applied, None
+
+    @staticmethod
+    def _bidding(dealer, up_card, trump_round, discarded_card):
+        """
+        trick_state.Bidding of a hand whose trump was called in trump_round (1 or 2), discarded_card being the
+        Card the dealer discarded in round 1
+        """
+        discard = engine.card_id(discarded_card) if discarded_card is not None else None
+        return Bidding(dealer, engine.card_id(up_card), str(trump_round), discard)
 
-        return "pass", None, False, override_applied
+    def _deal_forced_trial(self, players, controlled_bot, controlled_hand=None, up_card=None, deck=None):
+        """
+        Shuffles the deck and deals a forced EV trial: controlled_hand (if given) goes to controlled_bot and
+        up_card (if given) is kept out of the other hands. deck is an optional shuffled deck (24 Cards) to deal
+        from instead. Returns (dealt hands by player name, up card)
+        """
+        import random
+
+        if deck is None:
+            # Shuffle the shared deck
+            deck = list(DECK)
+            random.shuffle(deck)
+        else:
+            deck = list(deck)
+
+        dealt_hands = {b.name: [] for b in players}
+
+        # If we have a fixed up_card and/or fixed controlled hand, remove them from deck first
+        def remove_card_from_deck(card):
+            # Cards are interned, so this is an identity lookup
+            try:
+                deck.remove(Card(card.rank, card.suit))
+            except ValueError:
+                raise ValueError(f"Card not found in deck: {card.rank} of {card.suit}")
+
+        if up_card is not None:
+            remove_card_from_deck(up_card)
+
+        if controlled_hand is not None:
+            if len(controlled_hand) != 5:
+                raise ValueError("controlled_hand must have exactly 5 cards")
+            for c in controlled_hand:
+                remove_card_from_deck(c)
+            dealt_hands[controlled_bot.name] = list(controlled_hand)
+
+        # Deal remaining hands
+        for b in players:
+            if dealt_hands[b.name]:
+                continue
+            dealt_hands[b.name] = deck[:5]
+            deck = deck[5:]
+
+        # Determine up card if not fixed
+        up = deck[0] if up_card is None else up_card
+
+        return dealt_hands, up
+
+    def _stream_deck(self, stream, sim_idx):
+        """
+        Deck of deal sim_idx of a DealStream as Cards, or None (shuffle at random) without a stream
+        """
+        if stream is None:
+            return None
+        return [Card.from_id(card_id) for card_id in stream.permutation(sim_idx)]
+
+    def regenerate_forced_trial(self, seed, sim_idx, controlled_bot_name, controlled_hand=None, up_card=None):
+        """
+        Deals trial sim_idx of a forced EV run made with seed (and the same controlled_hand and up_card) again,
+        e.g. for a hand of its trace. Returns (dealt hands by player name, up card)
+        """
+        players = [
+            Bot("Bot 1", partner="Bot 3", team=1),
+            Bot("Bot 2", partner="Bot 4", team=2),
+            Bot("Bot 3", partner="Bot 1", team=1),
+            Bot("Bot 4", partner="Bot 2", team=2),
+        ]
+        controlled_bot = next(b for b in players if b.name == controlled_bot_name)
+        deck = self._stream_deck(DealStream(seed), sim_idx)
+        return self._deal_forced_trial(players, controlled_bot, controlled_hand, up_card, deck)
 
     def simulate_forced_ev(
         self,
@@ -576,6 +924,13 @@ class MonteCarloSimulation():
         forced_lead_card=None, # list of cards to simulate EV for leading 
         trace_enabled=False,
         trace_path="simulation_trace.jsonl",
+        decision_cache=None,
+        target_ci_width=None,
+        confidence=0.95,
+        batch_size=STOPPING_BATCH_SIZE,
+        seed=None,
+        checkpoint=None,
+        checkpoint_part="forced_ev",
     ):
         """
         EV for controlled bot's TEAM, computed ONLY over trials where the override was actually applied.
@@ -584,9 +939,19 @@ class MonteCarloSimulation():
           EV = (points_for_controlled_team) - (points_for_other_team)
 
         So if the opponents score 2 and you score 0, EV = -2.
-        """
-        import random
 
+        decision_cache is an optional DecisionCache the bots use for card play (see decision_cache).
+
+        With target_ci_width, num_simulations is a budget: deals are run in batches of batch_size and the run stops
+        after the first batch where the confidence interval on the EV is narrower than target_ci_width.
+        The result has the standard error of the EV ("se") and the number of deals used ("deals").
+
+        With a seed, trial sim_idx is dealt from deal sim_idx of DealStream(seed), so runs are reproducible and
+        any trial (see regenerate_forced_trial) can be dealt again from the seed and its sim_idx in the trace.
+
+        checkpoint is an optional Checkpoint (see checkpoint) of a seeded run the totals and the next sim_idx are
+        saved to, under checkpoint_part, and resumed from. The trace is cut back to the hands logged at the checkpoint.
+        """
         bot1 = Bot("Bot 1", partner="Bot 3", team=1)
         bot2 = Bot("Bot 2", partner="Bot 4", team=2)
         bot3 = Bot("Bot 3", partner="Bot 1", team=1)
@@ -594,59 +959,69 @@ class MonteCarloSimulation():
         players = [bot1, bot2, bot3, bot4]
         dealer = bot4
 
+        for bot in players:
+            bot.decision_cache = decision_cache
+
         name_to_bot = {b.name: b for b in players}
         controlled_bot = name_to_bot[controlled_bot_name]
 
         total_net_points = 0.0
         applied = 0
         positive_turns = 0
+        net_stats = RunningStats()
+        deals = 0
+
+        saved = None
+        if checkpoint is not None:
+            if seed is None:
+                raise ValueError("Checkpoints need a seed to deal the same deals again")
+            saved = checkpoint.get(checkpoint_part)
+            if saved is not None and "result" in saved:
+                return saved["result"]
+        if saved is not None:
+            total_net_points, applied, positive_turns = saved["total_net_points"], saved["applied"], saved["positive_turns"]
+            net_stats, deals = saved["net_stats"], saved["deals"]
+
+        def checkpoint_state():
+            return {
+                "total_net_points": total_net_points,
+                "applied": applied,
+                "positive_turns": positive_turns,
+                "net_stats": net_stats,
+                "deals": deals,
+                "trace_size": logger.tell(),
+            }
 
-        suits = ["hearts", "diamonds", "clubs", "spades"]
-        ranks = ["A", "K", "Q", "J", "10", "9"]
-
-        trace_cfg = TraceConfig(enabled=bool(trace_enabled), path=trace_path, flush_each_hand=False)
+        stream = DealStream(seed) if seed is not None else None
+        trace_cfg = TraceConfig(
+            enabled=bool(trace_enabled),
+            path=trace_path,
+            flush_each_hand=False,
+            resume_at=saved["trace_size"] if saved is not None else None,
+        )
 
         with JSONLTraceLogger(trace_cfg) as logger:
-            for sim_idx in range(num_simulations):
-                # Build deck as Card objects
-                deck = [Card(rank, suit) for rank in ranks for suit in suits]
-                random.shuffle(deck)
-
-                dealt_hands = {b.name: [] for b in players}
-
-                # If we have a fixed up_card and/or fixed controlled hand, remove them from deck first
-                def remove_card_from_deck(card):
-                    for i, c in enumerate(deck):
-                        if c.rank == card.rank and c.suit == card.suit:
-                            deck.pop(i)
-                            return
-                    raise ValueError(f"Card not found in deck: {card.rank} of {card.suit}")
-
-                if up_card is not None:
-                    remove_card_from_deck(up_card)
-
-                if controlled_hand is not None:
-                    if len(controlled_hand) != 5:
-                        raise ValueError("controlled_hand must have exactly 5 cards")
-                    for c in controlled_hand:
-                        remove_card_from_deck(c)
-                    dealt_hands[controlled_bot.name] = list(controlled_hand)
-
-                # Deal remaining hands
-                for b in players:
-                    if dealt_hands[b.name]:
-                        continue
-                    dealt_hands[b.name] = deck[:5]
-                    deck = deck[5:]
-
-                # Determine up card if not fixed
-                up = deck[0] if up_card is None else up_card
+            # Every deal is a trial, the next one to play is sim_idx deals
+            for sim_idx in range(deals, num_simulations):
+                if checkpoint is not None:
+                    checkpoint.update(checkpoint_part, checkpoint_state)
+                if (
+                    target_ci_width is not None
+                    and deals % batch_size == 0
+                    and net_stats.ci_width(confidence) < target_ci_width
+                ):
+                    break
+                deals += 1
+
+                dealt_hands, up = self._deal_forced_trial(
+                    players, controlled_bot, controlled_hand, up_card, self._stream_deck(stream, sim_idx)
+                )
 
                 # Resolve trump with override
                 # Copy hands for this trial because trump selection may change dealer hand if they pick up upcard
                 hands_copy = {k: list(v) for k, v in dealt_hands.items()}
 
-                trump_decision, trump_maker, going_alone, override_applied = self._resolve_trump_with_override(
+                trump_decision, trump_maker, going_alone, override_applied, bidding = self._resolve_trump_with_override(
                     players=players,
                     dealer=dealer,
                     up_card=up,
@@ -682,15 +1057,21 @@ class MonteCarloSimulation():
                         },
                         "forced_first_lead_card": (self._card_to_str(forced_lead_card) if forced_lead_card else None),
                     }
+                    if seed is not None:
+                        trace["seed"] = seed
 
                 if trump_maker is None or trump_decision == "pass":
+                    net_stats.add(0)
                     if trace is not None:
                         trace["note"] = "no trump called"
                         trace["net_ev"] = 0
                         logger.log_hand(trace)
                     continue
 
-                team1_pts, team2_pts = self.play_hand(hands_copy, players, trump_decision, trump_maker, going_alone, forced_lead=forced_lead_card, trace=trace)
+                team1_pts, team2_pts = self.play_hand(
+                    hands_copy, players, trump_decision, trump_maker, going_alone, forced_lead=forced_lead_card, trace=trace,
+                    bidding=bidding
+                )
 
                 if controlled_bot.team == 1:
                     net = team1_pts - team2_pts
@@ -698,6 +1079,7 @@ class MonteCarloSimulation():
                     net = team2_pts - team1_pts
 
                 total_net_points += net
+                net_stats.add(net)
 
                 if net > 0:
                     positive_turns += 1
@@ -707,7 +1089,17 @@ class MonteCarloSimulation():
                     logger.log_hand(trace)
 
         ev = (total_net_points / applied) if applied else 0.0
-        return {"ev": ev, "positive_point_turns": positive_turns, "applied": applied, "requested": num_simulations}
+        result = {
+            "ev": ev,
+            "se": net_stats.standard_error,
+            "positive_point_turns": positive_turns,
+            "applied": applied,
+            "requested": num_simulations,
+            "deals": deals,
+        }
+        if checkpoint is not None:
+            checkpoint.update(checkpoint_part, lambda: {"result": result}, force=True)
+        return result
     
     def simulate_forced_ev_table(
         self,
@@ -718,6 +1110,12 @@ class MonteCarloSimulation():
         up_card=None,          # Card or None
         forced_going_alone=False,
         include_round2=True,
+        decision_cache=None,
+        paired=False,
+        target_ci_width=None,
+        confidence=0.95,
+        seed=None,
+        checkpoint=None,
     ):
         """
         Runs ALL forced scenarios in one call and returns a sorted table.
@@ -725,6 +1123,18 @@ class MonteCarloSimulation():
         Scenarios:
           Round 1: pass, order_up
           Round 2: pass, next, reverse1, reverse2 (optional)
+
+        With paired=True every deal is dealt once and played under all scenarios (common random numbers), see
+        simulate_forced_ev_paired. Rows then also have the paired EV difference to the best scenario with its
+        standard error.
+
+        With target_ci_width each scenario stops once its EV confidence interval is that narrow, or, when
+        paired, all scenarios stop once the interval on the EV difference between the top two is.
+
+        With a seed every scenario is run on the deals of DealStream(seed) (see simulate_forced_ev).
+
+        checkpoint is an optional Checkpoint the scenarios are saved to (each under its label, or all of them
+        under "paired") and resumed from, see simulate_forced_ev.
         """
         scenarios = [
             ("R1 pass",      1, "pass"),
@@ -753,6 +1163,21 @@ class MonteCarloSimulation():
                     ("R2 reverse2",  2, "reverse2"),
                 ])
 
+        if paired:
+            return self.simulate_forced_ev_paired(
+                num_simulations=num_simulations,
+                controlled_bot_name=controlled_bot_name,
+                scenarios=scenarios,
+                controlled_hand=controlled_hand,
+                up_card=up_card,
+                forced_going_alone=forced_going_alone,
+                decision_cache=decision_cache,
+                target_ci_width=target_ci_width,
+                confidence=confidence,
+                seed=seed,
+                checkpoint=checkpoint,
+            )
+
         rows = []
         for label, forced_round, forced_action in scenarios:
             res = self.simulate_forced_ev(
@@ -763,6 +1188,12 @@ class MonteCarloSimulation():
                 controlled_hand=controlled_hand,
                 up_card=up_card,
                 forced_going_alone=forced_going_alone,
+                decision_cache=decision_cache,
+                target_ci_width=target_ci_width,
+                confidence=confidence,
+                seed=seed,
+                checkpoint=checkpoint,
+                checkpoint_part=label,
             )
             applied = res.get("applied", 0) or 0
             requested = res.get("requested", num_simulations) or num_simulations
@@ -772,14 +1203,175 @@ class MonteCarloSimulation():
             rows.append({
                 "scenario": label,
                 "ev": ev,
+                "se": res["se"],
                 "applied": applied,
                 "requested": requested,
+                "deals": res["deals"],
                 "positive_turn_rate": (positive_turns / applied) if applied else 0.0,
             })
 
         rows.sort(key=lambda r: r["ev"], reverse=True)
         return rows
 
+    def simulate_forced_ev_paired(
+        self,
+        *,
+        num_simulations,
+        controlled_bot_name,
+        scenarios,              # list of (label, forced_round, forced_action)
+        controlled_hand=None,   # list[Card] or None
+        up_card=None,           # Card or None; if None, random each deal
+        forced_going_alone=False,
+        decision_cache=None,
+        target_ci_width=None,
+        confidence=0.95,
+        batch_size=STOPPING_BATCH_SIZE,
+        seed=None,
+        checkpoint=None,
+    ):
+        """
+        Common random numbers version of simulate_forced_ev for several scenarios: every deal is dealt once and
+        played under each scenario whose forced decision applies to it, so the scenarios are compared on the
+        same cards and the noise of the deal mostly cancels out of their EV differences.
+
+        Returns the rows of simulate_forced_ev_table sorted by EV, each with "se" (standard error of the EV),
+        "deals", and "diff", "diff_se" and "paired" (number of deals both applied to) for the EV difference
+        between the scenario and the best one, averaged over the deals both scenarios were applied to.
+
+        With target_ci_width, deals are run in batches of batch_size until the confidence interval on the EV
+        difference between the two best scenarios is narrower than target_ci_width (or num_simulations is reached).
+
+        With a seed, deal sim_idx is deal sim_idx of DealStream(seed) (see simulate_forced_ev).
+
+        checkpoint is an optional Checkpoint of a seeded run the stats are saved to, under "paired", and resumed from.
+        """
+        bot1 = Bot("Bot 1", partner="Bot 3", team=1)
+        bot2 = Bot("Bot 2", partner="Bot 4", team=2)
+        bot3 = Bot("Bot 3", partner="Bot 1", team=1)
+        bot4 = Bot("Bot 4", partner="Bot 2", team=2)  # dealer
+        players = [bot1, bot2, bot3, bot4]
+        dealer = bot4
+
+        for bot in players:
+            bot.decision_cache = decision_cache
+
+        controlled_bot = next(b for b in players if b.name == controlled_bot_name)
+
+        num_scenarios = len(scenarios)
+        # Net points per scenario, and net_i - net_j per pair of scenarios over the deals both applied to
+        net_stats = [RunningStats() for _ in range(num_scenarios)]
+        diff_stats = [[RunningStats() for _ in range(num_scenarios)] for _ in range(num_scenarios)]
+        positive_turns = [0] * num_scenarios
+
+        def top_two_ci_width():
+            by_ev = sorted(range(num_scenarios), key=lambda i: net_stats[i].mean, reverse=True)
+            if num_scenarios == 1:
+                return net_stats[0].ci_width(confidence)
+            return diff_stats[by_ev[0]][by_ev[1]].ci_width(confidence)
+
+        stream = DealStream(seed) if seed is not None else None
+        deals = 0
+
+        if checkpoint is not None:
+            if seed is None:
+                raise ValueError("Checkpoints need a seed to deal the same deals again")
+            saved = checkpoint.get("paired")
+            if saved is not None and "rows" in saved:
+                return saved["rows"]
+            if saved is not None:
+                net_stats, diff_stats = saved["net_stats"], saved["diff_stats"]
+                positive_turns, deals = saved["positive_turns"], saved["deals"]
+
+        def checkpoint_state():
+            return {"net_stats": net_stats, "diff_stats": diff_stats, "positive_turns": positive_turns, "deals": deals}
+
+        for sim_idx in range(deals, num_simulations):
+            if checkpoint is not None:
+                checkpoint.update("paired", checkpoint_state)
+            if target_ci_width is not None and deals % batch_size == 0 and top_two_ci_width() < target_ci_width:
+                break
+            deals += 1
+
+            dealt_hands, up = self._deal_forced_trial(
+                players, controlled_bot, controlled_hand, up_card, self._stream_deck(stream, sim_idx)
+            )
+
+            # Scenarios often end up with the same trump call (e.g. when the seat before the controlled
+            # seat calls), each distinct call is only played once per deal
+            played = {}
+            nets = [None] * num_scenarios
+            for i, (_, forced_round, forced_action) in enumerate(scenarios):
+                hands_copy = {k: list(v) for k, v in dealt_hands.items()}
+
+                trump_decision, trump_maker, going_alone, override_applied, bidding = self._resolve_trump_with_override(
+                    players=players,
+                    dealer=dealer,
+                    up_card=up,
+                    dealt_hands=hands_copy,
+                    controlled_bot_name=controlled_bot_name,
+                    forced_round=forced_round,
+                    forced_action=forced_action,
+                    forced_going_alone=forced_going_alone,
+                )
+
+                if not override_applied:
+                    continue
+
+                if trump_maker is None or trump_decision == "pass":
+                    net = 0
+                else:
+                    key = (trump_decision, trump_maker.name, bool(going_alone), tuple(hands_copy[dealer.name]))
+                    net = played.get(key)
+                    if net is None:
+                        team1_pts, team2_pts = self.play_hand(
+                            hands_copy, players, trump_decision, trump_maker, going_alone, bidding=bidding
+                        )
+                        net = team1_pts - team2_pts if controlled_bot.team == 1 else team2_pts - team1_pts
+                        played[key] = net
+
+                nets[i] = net
+                net_stats[i].add(net)
+                if net > 0:
+                    positive_turns[i] += 1
+
+            for i in range(num_scenarios):
+                if nets[i] is None:
+                    continue
+                for j in range(num_scenarios):
+                    if j != i and nets[j] is not None:
+                        diff_stats[i][j].add(nets[i] - nets[j])
+
+        rows = []
+        for i, (label, _, _) in enumerate(scenarios):
+            stats = net_stats[i]
+            rows.append({
+                "scenario": label,
+                "ev": stats.mean,
+                "se": stats.standard_error,
+                "applied": stats.count,
+                "requested": num_simulations,
+                "deals": deals,
+                "positive_turn_rate": (positive_turns[i] / stats.count) if stats.count else 0.0,
+                "index": i,
+            })
+
+        rows.sort(key=lambda r: r["ev"], reverse=True)
+
+        best = rows[0]["index"]
+        for row in rows:
+            i = row.pop("index")
+            if i == best:
+                row["diff"], row["diff_se"], row["paired"] = 0.0, 0.0, row["applied"]
+            else:
+                stats = diff_stats[i][best]
+                row["diff"] = stats.mean
+                row["diff_se"] = stats.standard_error
+                row["paired"] = stats.count
+
+        if checkpoint is not None:
+            checkpoint.update("paired", lambda: {"rows": rows}, force=True)
+        return rows
+
     def print_forced_ev_table(
         self,
         *,
@@ -790,10 +1382,35 @@ class MonteCarloSimulation():
         forced_going_alone=False,
         include_round2=True,
         forced_lead_card=None,
+        paired=False,
+        target_ci_width=None,
+        seed=None,
+        checkpoint_path=None,
+        resume=False,
+        checkpoint_interval=CHECKPOINT_INTERVAL,
     ):
         """
         Convenience printer for simulate_forced_ev_table().
+
+        With a checkpoint_path (and a seed) the run is saved to that file every checkpoint_interval seconds and
+        with resume it continues from the file (see checkpoint), printing the table an uninterrupted run would.
         """
+        checkpoint = None
+        if checkpoint_path is not None:
+            key = {
+                "run": "forced_ev_table",
+                "num_simulations": num_simulations,
+                "controlled_bot_name": controlled_bot_name,
+                "controlled_hand": [str(card) for card in controlled_hand] if controlled_hand is not None else None,
+                "up_card": str(up_card) if up_card is not None else None,
+                "forced_going_alone": forced_going_alone,
+                "include_round2": include_round2,
+                "paired": paired,
+                "target_ci_width": target_ci_width,
+                "seed": seed,
+            }
+            checkpoint = Checkpoint(checkpoint_path, key, checkpoint_interval, resume)
+
         rows = self.simulate_forced_ev_table(
             num_simulations=num_simulations,
             controlled_bot_name=controlled_bot_name,
@@ -801,6 +1418,10 @@ class MonteCarloSimulation():
             up_card=up_card,
             forced_going_alone=forced_going_alone,
             include_round2=include_round2,
+            paired=paired,
+            target_ci_width=target_ci_width,
+            seed=seed,
+            checkpoint=checkpoint,
         )
 
         scenario_w = max(len("scenario"), max((len(r["scenario"]) for r in rows), default=0))
@@ -812,10 +1433,14 @@ class MonteCarloSimulation():
             f"{'applied':>10} "
             f"{'pos_rate':>9}"
         )
+        if paired:
+            header += f" {'SE':>8} {'diff':>8} {'diff_SE':>8} {'paired':>8}"
 
         print("\nForced EV table")
         print("===============")
         print(f"controlled={controlled_bot_name}, sims={num_simulations}, up_card={up_card}, alone={forced_going_alone}")
+        if target_ci_width is not None:
+            print(f"target CI width={target_ci_width}, deals used={max(r['deals'] for r in rows)}")
         print("")
         print(header)
         print("-" * len(header))
@@ -825,20 +1450,37 @@ class MonteCarloSimulation():
             if len(scen) > scenario_w:
                 scen = scen[: scenario_w - 1] + "…"  # truncate if needed
 
-            print(
+            line = (
                 f"{scen:<{scenario_w}} "
                 f"{r['ev']:>10.4f} "
                 f"{r['applied']:>10d} "
                 f"{r['positive_turn_rate']:>8.2%}"
             )
+            if paired:
+                line += f" {r['se']:>8.4f} {r['diff']:>8.4f} {r['diff_se']:>8.4f} {r['paired']:>8d}"
+            print(line)
 
         print("")
 
 
         
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, help="seed of the deals, which a checkpointed run needs")
+    parser.add_argument("--checkpoint", help="file the run is checkpointed to, e.g. simulation_checkpoint.pkl")
+    parser.add_argument("--resume", action="store_true", help="continue the run saved in the checkpoint file")
+    args = parser.parse_args()
+    if args.checkpoint is not None and args.seed is None:
+        parser.error("--checkpoint needs --seed")
+    if args.resume and args.checkpoint is None:
+        parser.error("--resume needs --checkpoint")
+
     simulation = MonteCarloSimulation()
     # simulation.run_simulation(10000)
+    # simulation.run_simulation(1000000, workers=32, seed=args.seed, checkpoint_path=args.checkpoint, resume=args.resume)
+    # Bot.CARD_PLAY_MODE = 'pimc'; simulation.run_simulation(200, seed=1)  # or 'ismcts'
     # simulation.print_hand_scores("A of diamonds, A of hearts, J of spades, J of diamonds, J of hearts", "diamonds")
 
     simulation.print_forced_ev_table(
@@ -855,4 +1497,7 @@ if __name__ == "__main__":
         forced_going_alone=False,
         include_round2=True,
         forced_lead_card=Card("9", "diamonds"),
+        seed=args.seed,
+        checkpoint_path=args.checkpoint,
+        resume=args.resume,
     )
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+Checkpoints of long simulation runs, to resume them after an interruption.
+
+A run saves its accumulated statistics and its position in the deal stream to a checkpoint file every interval
+seconds and once it is done. The file is replaced atomically, so it always holds a complete checkpoint. A resumed
+run loads that state and plays the deals from the saved position on. The deals come from a seeded DealStream and
+the statistics are added in the same order, so the results are the same as those of an uninterrupted run.
+
+A checkpoint is keyed by the parameters of its run, and resuming from the checkpoint of another run is an error.
+A run made of several parts (e.g. the scenarios of a forced EV table) keeps the state of each part under its name.
+"""
+import os
+import pickle
+import time
+
+
+# Seconds between checkpoints of a run
+CHECKPOINT_INTERVAL = 60.0
+
+_FORMAT_VERSION = 1
+
+
+class Checkpoint:
+    """
+    Checkpoint file of the run with the parameters key (a dict of plain values). With resume the saved states
+    are loaded, a missing file being a run that has not started yet
+    """
+    def __init__(self, path, key, interval=CHECKPOINT_INTERVAL, resume=False):
+        self.path = path
+        self.key = key
+        self.interval = interval
+        self.parts = load_parts(path, key) if resume else {}
+        self._saved_at = time.monotonic()
+
+    def get(self, part):
+        """
+        Saved state of a part of the run, or None
+        """
+        return self.parts.get(part)
+
+    def update(self, part, state, force=False):
+        """
+        Saves the state of a part (a function returning it, only called when saving) if interval seconds passed
+        since the last save, or force. Returns True if it saved
+        """
+        if not force and time.monotonic() - self._saved_at < self.interval:
+            return False
+        self.parts[part] = state()
+        self.save()
+        return True
+
+    def save(self):
+        """
+        Writes the checkpoint, replacing the file atomically
+        """
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as fh:
+            pickle.dump(
+                {"format_version": _FORMAT_VERSION, "key": self.key, "parts": self.parts},
+                fh,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self.path)
+        self._saved_at = time.monotonic()
+
+
+def load_parts(path, key):
+    """
+    Returns the saved states of the parts of the run key from a checkpoint file ({} when there is none).
+    Raises ValueError for a checkpoint of another run or format
+    """
+    try:
+        with open(path, "rb") as fh:
+            checkpoint = pickle.load(fh)
+    except FileNotFoundError:
+        return {}
+
+    if checkpoint.get("format_version") != _FORMAT_VERSION:
+        raise ValueError(f"{path} is not a checkpoint of this version")
+    if checkpoint["key"] != key:
+        changed = sorted(name for name in set(key) | set(checkpoint["key"]) if key.get(name) != checkpoint["key"].get(name))
+        raise ValueError(f"{path} is the checkpoint of another run (different {', '.join(changed)})")
+    return checkpoint["parts"]
@@ -0,0 +1,273 @@
+"""
+Seekable, counter-based stream of deals.
+
+Deal i of a stream is a pure function of (seed, i): the deck is shuffled (Fisher-Yates) with the words of a
+splitmix64 generator at counters i * DRAWS_PER_DEAL onwards, so any deal can be produced on its own without
+replaying the ones before it. Slices of a stream are streams over a range of deal numbers, which lets worker
+processes claim disjoint ranges of one run, and a deal noted in a trace (its sim_idx) can be dealt again from
+the seed alone.
+
+A deal is 21 card ids (see card_engine): five per seat in turn, then the up card. The deals of a stream can
+also be written once to a binary corpus (write_corpus) and memory-mapped (load_corpus); a DealCorpus deals
+exactly the same cards as its stream.
+
+Run this file to write a corpus: python deal_stream.py seed count [path]
+"""
+import hashlib
+
+try:
+    from . import card_engine as engine
+    from . import table_file
+except ImportError:
+    import card_engine as engine
+    import table_file
+
+
+DEAL_SIZE = 21
+
+# Generator words reserved per deal (a deck takes NUM_CARDS - 1 of them)
+DRAWS_PER_DEAL = 32
+
+_MAGIC = b"EUDL"
+_FORMAT_VERSION = 1
+
+_MASK64 = (1 << 64) - 1
+_GAMMA = 0x9E3779B97F4A7C15
+
+# Loaded corpora by (seed, count, path)
+_corpora = {}
+
+
+def _mix(x):
+    """
+    splitmix64 output function
+    """
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def seed_key(seed):
+    """
+    64-bit generator key of a seed (any value with a stable str, like the seeds of random.Random)
+    """
+    return int.from_bytes(hashlib.sha256(f"deal stream:{seed}".encode("utf-8")).digest()[:8], "little")
+
+
+def shuffle(key, index, cards):
+    """
+    Returns the card ids in cards shuffled for deal index of the stream with key (at most DRAWS_PER_DEAL + 1 cards)
+    """
+    cards = list(cards)
+    counter = key + index * DRAWS_PER_DEAL * _GAMMA
+    for k in range(len(cards) - 1, 0, -1):
+        counter += _GAMMA
+        # Top 32 bits of the word scaled to 0..k
+        j = ((_mix(counter & _MASK64) >> 32) * (k + 1)) >> 32
+        cards[k], cards[j] = cards[j], cards[k]
+    return cards
+
+
+class DealStream:
+    """
+    Deals start to stop (None for no end) of the stream of seed. Indexes and slices are relative to start,
+    deal(index) takes the deal number in the whole stream
+    """
+    def __init__(self, seed, start=0, stop=None):
+        if start < 0 or (stop is not None and stop < start):
+            raise ValueError(f"Invalid deal range {start}:{stop}")
+        self.seed = seed
+        self.key = seed_key(seed)
+        self.start = start
+        self.stop = stop
+
+    def permutation(self, index):
+        """
+        The whole deck (24 card ids) as shuffled for deal number index
+        """
+        return shuffle(self.key, index, range(engine.NUM_CARDS))
+
+    def deal(self, index):
+        """
+        Deal number index of the stream: a tuple of 21 card ids
+        """
+        return tuple(self.permutation(index)[:DEAL_SIZE])
+
+    def hand_masks(self, index):
+        """
+        Deal number index encoded as ([hand mask of seats 0-3], up card id)
+        """
+        deal = self.deal(index)
+        return [engine.mask_of(deal[seat * 5:seat * 5 + 5]) for seat in range(4)], deal[20]
+
+    def deal_array(self, start, stop):
+        """
+        Deals number start to stop as an (N, 21) NumPy array of card ids, the same as deal() row by row
+        """
+        import numpy as np
+
+        num_cards = engine.NUM_CARDS
+        indexes = np.arange(start, stop, dtype=np.uint64)
+        # uint64 arithmetic wraps around like the masked Python version
+        counters = np.uint64(self.key) + indexes * np.uint64(DRAWS_PER_DEAL * _GAMMA & _MASK64)
+        decks = np.tile(np.arange(num_cards, dtype=np.int8), (len(indexes), 1))
+        rows = np.arange(len(indexes))
+        with np.errstate(over="ignore"):
+            for step, k in enumerate(range(num_cards - 1, 0, -1), 1):
+                x = counters + np.uint64(step * _GAMMA & _MASK64)
+                x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+                x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+                x ^= x >> np.uint64(31)
+                j = (((x >> np.uint64(32)) * np.uint64(k + 1)) >> np.uint64(32)).astype(np.intp)
+                swapped = decks[rows, j]
+                decks[rows, j] = decks[:, k]
+                decks[:, k] = swapped
+        return decks[:, :DEAL_SIZE]
+
+    def __len__(self):
+        if self.stop is None:
+            raise TypeError("An unbounded DealStream has no length")
+        return self.stop - self.start
+
+    def __iter__(self):
+        index = self.start
+        while self.stop is None or index < self.stop:
+            yield self.deal(index)
+            index += 1
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            if item.step not in (None, 1):
+                raise ValueError("DealStream slices can't have a step")
+            start, stop = item.start, item.stop
+            if self.stop is not None:
+                start, stop, _ = item.indices(len(self))
+            elif (start or 0) < 0 or (stop or 0) < 0:
+                raise IndexError("An unbounded DealStream can't be indexed from the end")
+            start = self.start + (start or 0)
+            stop = self.start + stop if stop is not None else None
+            return self._view(start, max(start, stop) if stop is not None else None)
+
+        if item < 0:
+            item += len(self)
+        if item < 0 or (self.stop is not None and item >= len(self)):
+            raise IndexError("DealStream index out of range")
+        return self.deal(self.start + item)
+
+    def _view(self, start, stop):
+        view = DealStream.__new__(type(self))
+        view.__dict__.update(self.__dict__)
+        view.start = start
+        view.stop = stop
+        return view
+
+    def chunks(self, size):
+        """
+        Splits a bounded stream into consecutive streams of size deals (the last one may be shorter)
+        """
+        return [self[start:start + size] for start in range(0, len(self), size)]
+
+    def shards(self, count):
+        """
+        Splits a bounded stream into count consecutive streams of (nearly) the same length
+        """
+        length = len(self)
+        bounds = [length * shard // count for shard in range(count + 1)]
+        return [self[low:high] for low, high in zip(bounds, bounds[1:])]
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.seed!r}, {self.start}, {self.stop})"
+
+
+def corpus_digest(seed):
+    """
+    Digest of what the deals of a corpus depend on: the seed and the generator
+    """
+    parts = [repr(seed), repr(seed_key(seed)), repr(DRAWS_PER_DEAL), repr(engine.NUM_CARDS)]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).digest()
+
+
+class DealCorpus(DealStream):
+    """
+    DealStream reading deals 0 to count - 1 from a memory-mapped corpus file (deals after those are generated)
+    """
+    def __init__(self, seed, count, path, source, entries):
+        super().__init__(seed)
+        self.count = count
+        self.path = path
+        self._source = source
+        self._entries = entries
+
+    def deal(self, index):
+        if index < self.count:
+            offset = index * DEAL_SIZE
+            return tuple(self._entries[offset:offset + DEAL_SIZE])
+        return super().deal(index)
+
+    def __reduce__(self):
+        # The map is opened again in other processes
+        return _load_view, (self.seed, self.count, self.path, self.start, self.stop)
+
+    def close(self):
+        if self._source is not None:
+            self._entries.release()
+            self._source.close()
+            self._source = None
+
+
+def write_corpus(seed, count, path):
+    """
+    Writes deals 0 to count - 1 of the stream of seed to a corpus file (atomically)
+    """
+    stream = DealStream(seed)
+    try:
+        data = stream.deal_array(0, count).tobytes()
+    except ImportError:
+        data = bytes(card for index in range(count) for card in stream.deal(index))
+    table_file.write_table(path, _MAGIC, _FORMAT_VERSION, corpus_digest(seed), count * DEAL_SIZE, data)
+
+
+def _map_corpus(seed, count, path):
+    mapped = table_file.map_table(path, _MAGIC, _FORMAT_VERSION, corpus_digest(seed), count * DEAL_SIZE, "B")
+    if mapped is None:
+        return None
+
+    source, entries = mapped
+    return DealCorpus(seed, count, path, source, entries)
+
+
+def load_corpus(seed, count, path):
+    """
+    Returns the DealCorpus of the first count deals of the stream of seed, writing the file first if it is
+    missing or holds other deals. Corpora are loaded once per process.
+    """
+    corpus = _corpora.get((seed, count, path))
+    if corpus is not None:
+        return corpus
+
+    corpus = _map_corpus(seed, count, path)
+    if corpus is None:
+        write_corpus(seed, count, path)
+        corpus = _map_corpus(seed, count, path)
+
+    _corpora[seed, count, path] = corpus
+    return corpus
+
+
+def _load_view(seed, count, path, start, stop):
+    return load_corpus(seed, count, path)[start:stop]
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) < 3:
+        print("Usage: python deal_stream.py seed count [path]")
+        sys.exit(1)
+
+    seed, count = int(sys.argv[1]), int(sys.argv[2])
+    path = sys.argv[3] if len(sys.argv) > 3 else f"deals_{seed}.bin"
+    started = time.time()
+    write_corpus(seed, count, path)
+    print(f"{count} deals of seed {seed} written to {path} in {time.time() - started:.1f}s")
@@ -0,0 +1,61 @@
+"""
+Equivalent deals: a deal with its suits relabelled and / or its hands rotated around the table.
+
+Swapping the two suits of a colour, or the two colours, keeps the rank of every card for every trump (the
+bowers included), so the 8 colour preserving suit permutations of a deal are the same deal for the rules. Rotating
+the hands gives each hand of a deal to every seat in turn, so with the dealer fixed every hand is played from
+every position and the differences between seats are measured on the same cards.
+
+The hands played from the equivalents of one deal are correlated (the suit permutations barely change the play
+at all), so they are counted as a single sample, their average, for standard errors
+(see SimulationStats.record_equivalents).
+
+Deals are lists of 21 card ids in deal order: five cards for each seat in turn, then the up card.
+"""
+try:
+    from . import card_engine as engine
+except ImportError:
+    import card_engine as engine
+
+
+# Suit permutations (new suit of every suit) that keep the colours: swap within either colour, swap the colours
+SUIT_PERMUTATIONS = tuple(
+    tuple(colours[pair][suit % 2 ^ swap[pair]] for pair in (0, 1) for suit in (0, 1))
+    for colours in (((0, 1), (2, 3)), ((2, 3), (0, 1)))
+    for swap in ((0, 0), (1, 0), (0, 1), (1, 1))
+)
+
+# New card id of every card id, for every suit permutation
+CARD_PERMUTATIONS = tuple(
+    tuple(permutation[engine.CARD_SUITS[card]] * 6 + engine.CARD_RANKS[card] for card in range(engine.NUM_CARDS))
+    for permutation in SUIT_PERMUTATIONS
+)
+
+# Seats every hand moves on by
+ROTATIONS = (0, 1, 2, 3)
+
+# (suit permutations, rotations) of each symmetry, the identity first
+SYMMETRIES = {
+    "dealer": (CARD_PERMUTATIONS[:1], ROTATIONS),
+    "suits": (CARD_PERMUTATIONS, ROTATIONS[:1]),
+    "full": (CARD_PERMUTATIONS, ROTATIONS),
+}
+
+
+def equivalent_deals(deal, symmetry):
+    """
+    Returns the deals equivalent to deal under a symmetry (a key of SYMMETRIES), deal itself first
+    """
+    try:
+        card_permutations, rotations = SYMMETRIES[symmetry]
+    except KeyError:
+        raise ValueError(f"Unknown symmetry {symmetry!r}, expected one of {', '.join(SYMMETRIES)}") from None
+
+    deals = []
+    for card_permutation in card_permutations:
+        cards = [card_permutation[card] for card in deal]
+        for rotation in rotations:
+            # Seat s gets the hand seat s - rotation was dealt
+            start = (4 - rotation) % 4 * 5
+            deals.append(cards[start:20] + cards[:start] + cards[20:21])
+    return deals
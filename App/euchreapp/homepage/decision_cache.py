@@ -0,0 +1,80 @@
+"""
+Bounded LRU cache of card play decisions.
+
+BotLogic.determine_best_card_id is a pure function of the hand, the trick state and the caller / going
+alone / tricks won context, so a decision can be reused whenever the same position comes up again (very
+often in the last tricks of a hand). BotLogic.get_decision_key builds the key with suits relabeled
+around trump, and the cache stores the position of the chosen card in the hand.
+
+A bot uses a cache when its decision_cache attribute is set. One cache can be shared by any number of
+bots, threads and simulation runs; entries only hold ints and tuples.
+"""
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_MAX_SIZE = 200_000
+
+
+class DecisionCache:
+    """
+    Thread-safe LRU mapping decision keys to the index of the card to play
+    """
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Returns the cached card index for key, or None
+        """
+        with self._lock:
+            index = self._entries.get(key)
+            if index is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return index
+
+    def put(self, key, index):
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """
+        Returns the hit, miss and eviction counts, hit rate and size of the cache
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hit_rate,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
@@ -0,0 +1,266 @@
+"""
+Precomputed endgame table: the exact (double dummy) outcome of every position at the start of a trick with
+up to max_cards cards per hand.
+
+Only the order of the cards still in play matters in an endgame, not their ranks, so a position is reduced to
+its pattern: for every suit (trump first, then the other suits in the CANONICAL_SUITS order), which seat holds
+each of its cards in play from the highest down, seats being numbered in play order from the leader. A
+pattern is a sequence of seat numbers with a separator between suits, and patterns are indexed by their rank
+among the permutations of that multiset, so a lookup is a single table read. There is one table per number
+of cards per hand and seat sitting out (none, or 1-3 seats after the leader), every trump suit and leader
+sharing them.
+
+Entries are the tricks the leader's side takes, or UNREACHABLE for patterns with more cards in a suit than it has.
+With 2 cards per hand the file holds about 440,000 entries; 3 cards per hand would take 170 million.
+
+Run this file to (re)build the table: python endgame_table.py [max cards]
+"""
+import hashlib
+import os
+from math import factorial
+
+try:
+    from . import card_engine as engine
+    from . import table_file
+    from .double_dummy import DoubleDummySolver
+except ImportError:
+    import card_engine as engine
+    import table_file
+    from double_dummy import DoubleDummySolver
+
+
+DEFAULT_MAX_CARDS = 2
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "endgame_table.bin")
+
+_MAGIC = b"EUEG"
+_FORMAT_VERSION = 1
+
+UNREACHABLE = 255
+
+# Seat sitting out, relative to the leader (0 for none)
+SITTING_OUT = (0, 1, 2, 3)
+
+# Cards of every effective suit for each trump, canonical suits in order and highest card first
+_SUIT_ORDERS = tuple(
+    tuple(
+        tuple(sorted(
+            engine.cards_in(engine.FOLLOW_MASKS[trump][suit]), key=engine.RANK_TABLES[trump][suit].__getitem__, reverse=True
+        ))
+        for suit in engine.CANONICAL_SUITS[trump]
+    )
+    for trump in range(4)
+)
+
+# Loaded tables by (max cards, path)
+_tables = {}
+
+
+def _layout(max_cards):
+    """
+    Returns {(cards per hand, seat sitting out): (offset of the table, number of patterns)} and the total number of entries
+    """
+    layout = {}
+    offset = 0
+    for cards in range(1, max_cards + 1):
+        for sitting_out in SITTING_OUT:
+            seats = 4 if not sitting_out else 3
+            size = factorial(seats * cards + 3) // (factorial(cards) ** seats * factorial(3))
+            layout[cards, sitting_out] = (offset, size)
+            offset += size
+    return layout, offset
+
+
+def pattern_rank(pattern, counts):
+    """
+    Rank of a sequence of symbols among the permutations of its multiset (counts[symbol] of each) in
+    lexicographic order
+    """
+    counts = list(counts)
+    remaining = len(pattern)
+    permutations = factorial(remaining)
+    for count in counts:
+        permutations //= factorial(count)
+
+    rank = 0
+    for symbol in pattern:
+        # Permutations starting with a smaller symbol come first
+        for smaller in range(symbol):
+            rank += permutations * counts[smaller] // remaining
+        permutations = permutations * counts[symbol] // remaining
+        counts[symbol] -= 1
+        remaining -= 1
+    return rank
+
+
+def _patterns(counts):
+    """
+    Yields every permutation of the multiset in lexicographic (rank) order
+    """
+    total = sum(counts)
+    counts = list(counts)
+    pattern = []
+
+    def extend():
+        if len(pattern) == total:
+            yield tuple(pattern)
+            return
+        for symbol, count in enumerate(counts):
+            if count:
+                counts[symbol] -= 1
+                pattern.append(symbol)
+                yield from extend()
+                pattern.pop()
+                counts[symbol] += 1
+
+    return extend()
+
+
+def table_digest(max_cards):
+    """
+    Digest of everything the table depends on: the card play rules and the number of cards per hand
+    """
+    parts = [
+        repr(max_cards),
+        repr(engine.RANK_TABLES),
+        repr(engine.FOLLOW_MASKS),
+        repr(engine.EFFECTIVE_SUITS),
+    ]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).digest()
+
+
+class EndgameTable:
+    """
+    Read-only view of an endgame table
+    """
+    def __init__(self, entries, max_cards, digest, source=None):
+        self._entries = entries
+        self.max_cards = max_cards
+        self.digest = digest
+        self._source = source
+        self._layout = _layout(max_cards)[0]
+
+    def value(self, hands, leader, trump):
+        """
+        Tricks the leader's side takes with perfect play from the start of a trick: hands are the 4 seat masks
+        (0 for a seat sitting out), all with the same number of cards, at most max_cards
+        """
+        seats = [(leader + i) % 4 for i in range(4)]
+        sitting_out = 0
+        for i in (1, 2, 3):
+            if not hands[seats[i]]:
+                sitting_out = i
+        # (hand, symbol) of the seats in play
+        owners = [(hands[seat], symbol) for symbol, seat in enumerate(seat for seat in seats if hands[seat])]
+
+        separator = len(owners)
+        in_play = hands[0] | hands[1] | hands[2] | hands[3]
+        follow_masks = engine.FOLLOW_MASKS[trump]
+        pattern = []
+        for i, suit in enumerate(engine.CANONICAL_SUITS[trump]):
+            if i:
+                pattern.append(separator)
+            suit_in_play = in_play & follow_masks[suit]
+            if not suit_in_play:
+                continue
+            for card in _SUIT_ORDERS[trump][i]:
+                bit = engine.BITS[card]
+                if suit_in_play & bit:
+                    for hand, symbol in owners:
+                        if hand & bit:
+                            pattern.append(symbol)
+                            break
+
+        cards = bin(hands[leader]).count("1")
+        offset, _ = self._layout[cards, sitting_out]
+        return self._entries[offset + pattern_rank(pattern, [cards] * separator + [3])]
+
+    def close(self):
+        if self._source is not None:
+            self._entries.release()
+            self._source.close()
+            self._source = None
+
+
+def compile_table(max_cards=DEFAULT_MAX_CARDS):
+    """
+    Solves the position of every pattern (with hearts as trump and seat 0 leading) and returns the entries
+    """
+    trump = 0
+    layout, size = _layout(max_cards)
+    entries = bytearray([UNREACHABLE]) * size
+    suit_orders = _SUIT_ORDERS[trump]
+
+    for (cards, sitting_out), (offset, _) in layout.items():
+        active = [seat for seat in range(4) if seat != sitting_out or not sitting_out]
+        separator = len(active)
+        for i, pattern in enumerate(_patterns([cards] * separator + [3])):
+            if i % 10000 == 0:
+                # Keep the transposition table small
+                solver = DoubleDummySolver(trump)
+
+            # The highest cards of every suit stand for the cards in play
+            hands = [0, 0, 0, 0]
+            suit = 0
+            depth = 0
+            for symbol in pattern:
+                if symbol == separator:
+                    suit += 1
+                    depth = 0
+                    continue
+                if depth == len(suit_orders[suit]):
+                    break
+                hands[active[symbol]] |= engine.BITS[suit_orders[suit][depth]]
+                depth += 1
+            else:
+                entries[offset + i] = solver.solve(hands, 0, 0)
+    return entries
+
+
+def build_table(max_cards=DEFAULT_MAX_CARDS, path=DEFAULT_PATH):
+    """
+    Compiles the table and writes it to path (atomically)
+    """
+    entries = compile_table(max_cards)
+    table_file.write_table(path, _MAGIC, _FORMAT_VERSION, table_digest(max_cards), len(entries), bytes(entries))
+
+
+def _map_table(path, max_cards, digest):
+    mapped = table_file.map_table(path, _MAGIC, _FORMAT_VERSION, digest, _layout(max_cards)[1], "B")
+    if mapped is None:
+        return None
+
+    source, entries = mapped
+    return EndgameTable(entries, max_cards, digest, source)
+
+
+def load_table(max_cards=DEFAULT_MAX_CARDS, path=DEFAULT_PATH, build=True):
+    """
+    Returns the endgame table for up to max_cards cards per hand, building the file first if it is missing or
+    was built for other parameters. With build False, returns None instead of building it (and looks for the
+    file again on the next call). Tables are loaded once per process.
+    """
+    table = _tables.get((max_cards, path))
+    if table is not None:
+        return table
+
+    digest = table_digest(max_cards)
+    table = _map_table(path, max_cards, digest)
+    if table is None:
+        if not build:
+            return None
+        build_table(max_cards, path)
+        table = _map_table(path, max_cards, digest)
+
+    _tables[max_cards, path] = table
+    return table
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    start = time.time()
+    max_cards = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MAX_CARDS
+    build_table(max_cards)
+    print(f"Endgame table for up to {max_cards} cards per hand built in {time.time() - start:.1f}s")
@@ -0,0 +1,164 @@
+"""
+Snapshots of a hand being played, to branch the play at any decision point.
+
+A HandSnapshot is the position before a card is played: the cards left in every hand, the TrickState of the
+tricks so far and the order the current trick is played in. Snapshots are never changed once made, so they
+share what stays the same with the snapshot they were played from: play() copies the TrickState (the finished
+tricks themselves are shared, see TrickState.copy) and only replaces the hand the card leaves.
+MonteCarloSimulation.play_hand (and simulate_deals) append the snapshot of every decision of the hands they
+play to a snapshots list, e.g. for a deal of a DealStream:
+
+    snapshots = []
+    MonteCarloSimulation().simulate_deals(1, None, deals=[stream.deal(index)], snapshots=snapshots)
+    print_branches(snapshots[7], branch(snapshots[7], rollouts=500))
+
+branch() plays every legal card of the seat to play and rolls each one out to the end of the hand with the
+players' own card play, with the hands the seat can't see dealt again at random for every rollout (consistent
+with what it has seen, see pimc.Observation, including the up card when the hand was played with its Bidding).
+"""
+import random
+
+try:
+    from . import card_engine as engine
+    from . import pimc
+    from .simulation_stats import RunningStats
+except ImportError:
+    import card_engine as engine
+    import pimc
+    from simulation_stats import RunningStats
+
+
+class HandSnapshot:
+    """
+    Position before a card is played. players are the four players in seat order, play_order the players of the
+    current trick in the order they play (without the partner of a lone caller), hands {player name: tuple of
+    card ids in hand order} and state the TrickState of the hand
+    """
+    __slots__ = ("players", "play_order", "hands", "state", "trump_maker", "going_alone")
+
+    def __init__(self, players, play_order, hands, state, trump_maker, going_alone):
+        self.players = players
+        self.play_order = play_order
+        self.hands = hands
+        self.state = state
+        self.trump_maker = trump_maker
+        self.going_alone = going_alone
+
+    @property
+    def finished(self):
+        return self.state.tricks_played == 5
+
+    @property
+    def to_play(self):
+        """
+        Player whose turn it is
+        """
+        return self.play_order[len(self.state.trick)]
+
+    def legal_cards(self):
+        """
+        Card ids the player to play can play, in hand order
+        """
+        hand = self.hands[self.to_play.name]
+        lead_card = self.state.trick[0][0] if self.state.trick else -1
+        legal = engine.legal_moves(engine.mask_of(hand), self.state.trump, lead_card)
+        return [card for card in hand if engine.BITS[card] & legal]
+
+    def play(self, card):
+        """
+        Returns the snapshot after the player to play plays card (an id). Raises ValueError for a card the player
+        doesn't hold or can't play
+        """
+        bot = self.to_play
+        hand = self.hands[bot.name]
+        state = self.state
+        if card not in hand:
+            raise ValueError(f"{bot.name} doesn't hold {engine.CARD_NAMES[card]}")
+        if state.trick and not engine.is_legal(card, engine.mask_of(hand), state.trump, state.trick[0][0]):
+            raise ValueError(f"{bot.name} played {engine.CARD_NAMES[card]} without following suit")
+
+        state = state.copy()
+        state.play(card, bot)
+        hands = dict(self.hands)
+        hands[bot.name] = tuple(other for other in hand if other != card)
+
+        play_order = self.play_order
+        if len(state.trick) == len(play_order):
+            # The winner leads the next trick
+            winner_idx = play_order.index(state.finish_trick())
+            play_order = play_order[winner_idx:] + play_order[:winner_idx]
+
+        return HandSnapshot(self.players, play_order, hands, state, self.trump_maker, self.going_alone)
+
+    def play_out(self):
+        """
+        Plays the rest of the hand with every player's determine_best_card_id and returns the finished snapshot
+        """
+        snapshot = self
+        while not snapshot.finished:
+            bot = snapshot.to_play
+            state = snapshot.state
+            card = bot.determine_best_card_id(
+                list(snapshot.hands[bot.name]),
+                state,
+                snapshot.trump_maker,
+                snapshot.going_alone,
+                state.tricks_won(bot.team)
+            )
+            snapshot = snapshot.play(card)
+        return snapshot
+
+    def net_points(self, team):
+        """
+        Points of a team minus the other team's for a finished hand
+        """
+        return pimc.net_points(self.state.tricks_won(team), self.trump_maker.team == team, self.going_alone)
+
+    def resample(self, rng):
+        """
+        Returns the snapshot with the cards the player to play can't see dealt at random to the other hands
+        (see pimc.deal_layout)
+        """
+        bot = self.to_play
+        hand = self.hands[bot.name]
+        hand_mask = engine.mask_of(hand)
+        seats = pimc.relative_seats(bot, self.players)
+
+        observation = pimc.observe(bot, hand_mask, self.state, self.trump_maker, self.going_alone, rng, seats=seats)
+        layout = observation.deal(hand_mask, rng)
+        hands = {
+            name: hand if name == bot.name else tuple(engine.cards_in(layout[seats[name]]))
+            for name in self.hands
+        }
+        return HandSnapshot(self.players, self.play_order, hands, self.state, self.trump_maker, self.going_alone)
+
+
+def branch(snapshot, rollouts=100, rng=None, resample=True):
+    """
+    Net points of the team of the player to play for every legal card of a snapshot: {card id: RunningStats}
+    over the rollouts, in hand order. Every card is rolled out from the same layouts, so the differences
+    between cards are measured on the same hidden hands. With resample False the actual hands are rolled out
+    """
+    rng = rng or random.Random()
+    team = snapshot.to_play.team
+    results = {card: RunningStats() for card in snapshot.legal_cards()}
+    for _ in range(rollouts):
+        layout = snapshot.resample(rng) if resample else snapshot
+        for card, stats in results.items():
+            stats.add(layout.play(card).play_out().net_points(team))
+    return results
+
+
+def print_branches(snapshot, results):
+    """
+    Prints the position of a snapshot and the results of branch() for it, best card first
+    """
+    bot = snapshot.to_play
+    state = snapshot.state
+    trick = ", ".join(f"{player.name} {engine.CARD_NAMES[card]}" for card, player in state.trick) or "leading"
+    print(f"{bot.name} to play to trick {state.tricks_played + 1} ({trick}), "
+          f"{engine.SUITS[state.trump]} trump called by {snapshot.trump_maker.name}"
+          f"{' alone' if snapshot.going_alone else ''}, tricks {state.tricks_won(1)}-{state.tricks_won(2)}")
+    print(f"{'Card':<20} {'EV':>8} {'SE':>8} {'Rollouts':>9}")
+    for card, stats in sorted(results.items(), key=lambda item: -item[1].mean):
+        print(f"{engine.CARD_NAMES[card]:<20} {stats.mean:>8.4f} {stats.standard_error:>8.4f} {stats.count:>9}")
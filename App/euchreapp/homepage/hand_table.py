@@ -0,0 +1,189 @@
+"""
+Precomputed hand strength table.
+
+There are only C(24, 5) = 42,504 five card hands, so BotLogic.evaluate_hand is computed once for every
+hand and trump suit and written to a binary file that is memory-mapped on load. Hands are indexed by
+their combinatorial rank (see hand_rank), which makes a bid a single table read.
+
+evaluate_hand sums card values in hand order, so a hand with a sum of three or more values (see
+BotLogic.hand_score_order_dependent, about one score in eight) can score differently in another order by a
+rounding error. Those scores are stored negated (they are all positive) and are computed on the actual hand.
+
+The file header stores a digest of everything the scores depend on (strategy weights, trump card values
+and the source of the evaluate functions), and a file with a different digest is rebuilt on load.
+
+Run this file to (re)build the table: python hand_table.py
+"""
+import hashlib
+import inspect
+import itertools
+import os
+import struct
+from math import comb
+
+try:
+    from . import card_engine as engine
+    from . import table_file
+except ImportError:
+    import card_engine as engine
+    import table_file
+
+
+NUM_HANDS = comb(engine.NUM_CARDS, 5)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hand_strength.bin")
+
+_MAGIC = b"EUHS"
+_FORMAT_VERSION = 3
+
+# _BINOMIALS[k][n] = C(n, k + 1)
+_BINOMIALS = tuple(tuple(comb(n, k + 1) for n in range(engine.NUM_CARDS)) for k in range(5))
+
+# Loaded tables by (class, path): (strategy weights, trump ranks, table)
+_tables = {}
+
+
+def hand_rank(hand):
+    """
+    Combinatorial (colex) rank of a five card hand of card ids, from 0 to NUM_HANDS - 1
+    """
+    a, b, c, d, e = sorted(hand)
+    return _BINOMIALS[0][a] + _BINOMIALS[1][b] + _BINOMIALS[2][c] + _BINOMIALS[3][d] + _BINOMIALS[4][e]
+
+
+def hand_ranks(hands):
+    """
+    hand_rank for every row of an (N, 5) NumPy array of card ids, as an (N,) array
+    """
+    import numpy as np
+
+    hands = np.sort(np.asarray(hands, dtype=np.intp), axis=1)
+    binomials = np.array(_BINOMIALS, dtype=np.int64)
+    return sum(binomials[k][hands[:, k]] for k in range(5))
+
+
+def all_hands():
+    """
+    Returns every five card hand as a sorted tuple of card ids, in rank order
+    """
+    hands = [None] * NUM_HANDS
+    for hand in itertools.combinations(range(engine.NUM_CARDS), 5):
+        hands[hand_rank(hand)] = hand
+    return hands
+
+
+def bot_instance(bot_logic):
+    """
+    bot_logic if it is an instance, otherwise an instance of the class made without calling __init__ (which can
+    take a name and seat, like bot_simulations.Bot): scoring and bidding only read class attributes
+    """
+    return bot_logic.__new__(bot_logic) if isinstance(bot_logic, type) else bot_logic
+
+
+def table_digest(bot_logic):
+    """
+    Digest of everything evaluate_hand depends on for this BotLogic class or instance
+    """
+    cls = bot_logic if isinstance(bot_logic, type) else type(bot_logic)
+    parts = [
+        repr(sorted(bot_logic.STRATEGY_WEIGHTS.items())),
+        repr(sorted(bot_logic.TRUMP_RANKS.items())),
+    ]
+    for name in ("evaluate_hand_id", "evaluate_trump_id", "evaluate_aces_id", "evaluate_voids_id", "hand_score_order_dependent"):
+        parts.append(inspect.getsource(getattr(cls, name)))
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).digest()
+
+
+class HandStrengthTable:
+    """
+    Read-only view of a hand strength table: score(hand, trump) == evaluate_hand_id(hand, trump) for any five card hand,
+    or None when the score depends on the order of the hand
+    """
+    def __init__(self, scores, digest, source=None):
+        self._scores = scores
+        self.digest = digest
+        self._source = source
+
+    def score(self, hand, trump):
+        score = self._scores[hand_rank(hand) * 4 + trump]
+        return score if score >= 0 else None
+
+    def close(self):
+        if self._source is not None:
+            self._scores.release()
+            self._source.close()
+            self._source = None
+
+
+def build_table(bot_logic, path=DEFAULT_PATH):
+    """
+    Scores every hand for every trump suit and writes the table to path (atomically)
+    """
+    hands = all_hands()
+    bot = bot_instance(bot_logic)
+
+    try:
+        from .batch_evaluator import evaluate_hands
+    except ImportError:
+        try:
+            from batch_evaluator import evaluate_hands
+        except ImportError:
+            # NumPy is not installed
+            evaluate_hands = None
+
+    if evaluate_hands is not None:
+        scores = evaluate_hands(hands, bot_logic).ravel().tolist()
+    else:
+        scores = [bot.evaluate_hand_id(list(hand), trump) for hand in hands for trump in range(4)]
+
+    # Mark the scores that depend on the order of the hand
+    for i, hand in enumerate(hands):
+        for trump in range(4):
+            if bot.hand_score_order_dependent(hand, trump):
+                scores[i * 4 + trump] = -scores[i * 4 + trump]
+
+    digest = table_digest(bot_logic)
+    data = struct.pack(f"<{len(scores)}d", *scores)
+    table_file.write_table(path, _MAGIC, _FORMAT_VERSION, digest, NUM_HANDS * 4, data)
+
+
+def _map_table(path, digest):
+    """
+    Memory-maps a table file, returns None if it is missing, malformed or built for other parameters
+    """
+    mapped = table_file.map_table(path, _MAGIC, _FORMAT_VERSION, digest, NUM_HANDS * 4, "d")
+    if mapped is None:
+        return None
+
+    source, scores = mapped
+    return HandStrengthTable(scores, digest, source)
+
+
+def load_table(bot_logic, path=DEFAULT_PATH, build=True):
+    """
+    Returns the hand strength table for this BotLogic class or instance, building the file first if it is
+    missing or its parameters changed. With build False, returns None instead of building it (and looks for the
+    file again on the next call). Tables are loaded once per process.
+    """
+    cls = bot_logic if isinstance(bot_logic, type) else type(bot_logic)
+    cached = _tables.get((cls, path))
+    if cached is not None and cached[0] == bot_logic.STRATEGY_WEIGHTS and cached[1] == bot_logic.TRUMP_RANKS:
+        return cached[2]
+
+    digest = table_digest(bot_logic)
+    table = _map_table(path, digest)
+    if table is None:
+        if not build:
+            return None
+        build_table(bot_logic, path)
+        table = _map_table(path, digest)
+
+    _tables[cls, path] = (dict(bot_logic.STRATEGY_WEIGHTS), dict(bot_logic.TRUMP_RANKS), table)
+    return table
+
+
+if __name__ == "__main__":
+    from bot_logic import BotLogic
+
+    build_table(BotLogic)
+    print(f"Built hand strength table for {NUM_HANDS} hands at {DEFAULT_PATH}")
@@ -0,0 +1,343 @@
+"""
+Information set Monte Carlo tree search (ISMCTS) card play.
+
+The tree is searched from the point of view of one seat (single observer ISMCTS): a node is a sequence of
+cards played from the root, by any seat. Every iteration deals the hidden cards at random, consistent with
+what the seat has seen (see pimc.Observation), walks down the tree through the cards that are legal in that
+layout (UCB1 with availability counts, so cards that are only sometimes playable are not undervalued), adds
+one node, plays the hand out with the heuristic BotLogic for every seat and backs the net points up the path.
+
+Node statistics live in flat arrays (NodePool) of a fixed capacity, so memory stays bounded however many
+iterations run: the search stops growing the tree when the pool is full, and the tree is kept from one
+decision to the next of a hand by moving the root down the cards played in between, which frees every node
+the play has made unreachable for reuse.
+"""
+import math
+import random
+import time
+from array import array
+
+try:
+    from . import card_engine as engine
+    from . import pimc
+    from .bot_logic import BotLogic
+except ImportError:
+    import card_engine as engine
+    import pimc
+    from bot_logic import BotLogic
+
+
+NO_NODE = -1
+
+# Net points of a hand go from -4 to 4, rewards from 0 to 1
+_POINTS_RANGE = 8
+
+_random = random.Random()
+
+
+class NodePool:
+    """
+    Tree nodes stored as indexes into flat arrays, with a free list of released nodes.
+    Children are linked through first_child / next_sibling
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.card = array("b", [-1]) * capacity
+        # Relative seat that played the node's card
+        self.seat = array("b", [0]) * capacity
+        self.first_child = array("i", [NO_NODE]) * capacity
+        self.next_sibling = array("i", [NO_NODE]) * capacity
+        self.visits = array("l", [0]) * capacity
+        # Iterations in which the node's card was legal when its parent was reached
+        self.available = array("l", [0]) * capacity
+        # Sum of the rewards of the observer's team
+        self.reward = array("d", [0.0]) * capacity
+        self._free = array("i", range(capacity - 1, -1, -1))
+
+    @property
+    def in_use(self):
+        return self.capacity - len(self._free)
+
+    @property
+    def full(self):
+        return not self._free
+
+    def allocate(self, parent, card, seat):
+        """
+        Returns a new child of parent (NO_NODE for a root), or NO_NODE when the pool is full
+        """
+        if not self._free:
+            return NO_NODE
+        node = self._free.pop()
+        self.card[node] = card
+        self.seat[node] = seat
+        self.first_child[node] = NO_NODE
+        self.visits[node] = 0
+        self.available[node] = 0
+        self.reward[node] = 0.0
+        if parent != NO_NODE:
+            self.next_sibling[node] = self.first_child[parent]
+            self.first_child[parent] = node
+        else:
+            self.next_sibling[node] = NO_NODE
+        return node
+
+    def child(self, node, card):
+        """
+        Returns the child of node reached by card, or NO_NODE
+        """
+        child = self.first_child[node]
+        while child != NO_NODE and self.card[child] != card:
+            child = self.next_sibling[child]
+        return child
+
+    def children(self, node):
+        child = self.first_child[node]
+        while child != NO_NODE:
+            yield child
+            child = self.next_sibling[child]
+
+    def release(self, node):
+        """
+        Frees node and everything below it (node must not be linked from a parent that stays in use)
+        """
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            stack.extend(self.children(node))
+            self._free.append(node)
+
+
+class _RolloutBot(BotLogic):
+    """
+    Heuristic player for a relative seat in the rollouts
+    """
+    CARD_PLAY_MODE = 'heuristic'
+    decision_cache = None
+
+    def __init__(self, name, partner, team, seat):
+        self.name = name
+        self.partner = partner
+        self.team = team
+        self.seat = seat
+
+
+class ISMCTS:
+    """
+    Search for one seat, kept between its decisions in a hand so the tree is reused. The seating the tree was
+    built with (the node seats) is kept with it and passed to pimc.observe for the next decisions of the hand.
+    max_nodes bounds the memory used (about 38 bytes per node), exploration is the UCB1 constant
+    """
+    def __init__(self, max_nodes=200000, exploration=0.7):
+        self.pool = NodePool(max_nodes)
+        self.exploration = exploration
+        self.root = NO_NODE
+        # Cards played in the hand up to the root, and the trump suit, seat, hand and seating the tree was built for
+        self._history = ()
+        self._hand_key = None
+        self._seats = None
+        self.iterations = 0
+
+    def choose_card(self, bot, hand, state, trump_caller, going_alone, iterations=None, budget_ms=None, rng=None):
+        """
+        Chooses the card bot plays from hand (card ids in hand order) with the TrickState state of the hand,
+        searching for a number of iterations and / or milliseconds (at least one iteration runs).
+        Raises ValueError like pimc.choose_card
+        """
+        if iterations is None and budget_ms is None:
+            raise ValueError("An iteration or time limit is needed")
+        deadline = time.perf_counter() + budget_ms / 1000 if budget_ms is not None else None
+        rng = rng or _random
+
+        hand_mask = engine.mask_of(hand)
+        lead_card = state.trick[0][0] if state.trick else -1
+        legal = [card for card in hand if engine.is_legal(card, hand_mask, state.trump, lead_card)]
+        if len(legal) == 1:
+            return legal[0]
+
+        seats = self._kept_seats(bot, hand_mask, state, trump_caller)
+        observation = pimc.observe(bot, hand_mask, state, trump_caller, going_alone, rng, seats=seats)
+        self._move_root(bot, hand_mask, state, observation.seats)
+        players = self._rollout_players(bot, observation, trump_caller)
+        caller = players[observation.seats[trump_caller.name]]
+
+        self.iterations = 0
+        while True:
+            self._iterate(bot, hand_mask, state, observation, players, caller, going_alone, rng)
+            self.iterations += 1
+            if iterations is not None and self.iterations >= iterations:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+
+        # Most visited card, ties going to the first card in hand order
+        pool = self.pool
+        visits = {pool.card[child]: pool.visits[child] for child in pool.children(self.root)}
+        return max(legal, key=lambda card: visits.get(card, -1))
+
+    @staticmethod
+    def _hand_history(bot, hand_mask, state):
+        """
+        Returns the cards played in the hand and the key telling the hand apart: the trump suit, the seat and its
+        hand as dealt (which tells hands with the same trump apart)
+        """
+        plays = [(card, player) for trick in state.tricks + [state.trick] for card, player in trick]
+        dealt = hand_mask | engine.mask_of(card for card, player in plays if player.name == bot.name)
+        return tuple(card for card, _ in plays), (state.trump, bot.name, dealt)
+
+    def _kept_seats(self, bot, hand_mask, state, trump_caller):
+        """
+        The seating the tree was built with when it is for this hand and places every player seen so far, or None
+        """
+        seats = self._seats
+        if seats is None or self._hand_history(bot, hand_mask, state)[1] != self._hand_key:
+            return None
+        names = {player.name for trick in state.tricks + [state.trick] for _, player in trick}
+        if trump_caller.name not in seats or not names <= seats.keys():
+            return None
+        return seats
+
+    def _move_root(self, bot, hand_mask, state, seats):
+        """
+        Moves the root down the cards played since the last decision, or starts a new tree for a new hand or when
+        seats ({player name: relative seat}) places a player elsewhere than the tree's seating
+        """
+        pool = self.pool
+        history, hand_key = self._hand_history(bot, hand_mask, state)
+
+        if (
+            self.root == NO_NODE or hand_key != self._hand_key
+            or history[:len(self._history)] != self._history
+            or any(self._seats.get(name, seat) != seat for name, seat in seats.items())
+        ):
+            if self.root != NO_NODE:
+                pool.release(self.root)
+            self.root = pool.allocate(NO_NODE, -1, 0)
+        else:
+            for card in history[len(self._history):]:
+                child = pool.child(self.root, card)
+                if child == NO_NODE:
+                    # Never searched: nothing below the root can be kept
+                    pool.release(self.root)
+                    self.root = pool.allocate(NO_NODE, -1, 0)
+                    break
+                # Unlink the child so releasing the old root keeps its subtree
+                previous = NO_NODE
+                for sibling in pool.children(self.root):
+                    if sibling == child:
+                        break
+                    previous = sibling
+                if previous == NO_NODE:
+                    pool.first_child[self.root] = pool.next_sibling[child]
+                else:
+                    pool.next_sibling[previous] = pool.next_sibling[child]
+                pool.release(self.root)
+                pool.next_sibling[child] = NO_NODE
+                self.root = child
+
+        self._history = history
+        self._hand_key = hand_key
+        self._seats = seats
+
+    @staticmethod
+    def _rollout_players(bot, observation, trump_caller):
+        """
+        _RolloutBot for every relative seat, named like the players where they are known
+        """
+        names = {seat: name for name, seat in observation.seats.items()}
+        names = [names.get(seat, f"Seat {seat}") for seat in range(4)]
+        other_team = 3 - bot.team if bot.team in (1, 2) else None
+        return [
+            _RolloutBot(names[seat], names[(seat + 2) % 4], bot.team if seat % 2 == 0 else other_team, seat)
+            for seat in range(4)
+        ]
+
+    def _iterate(self, bot, hand_mask, state, observation, players, caller, going_alone, rng):
+        """
+        One iteration: deal a layout, select and expand down the tree, play out, back the result up
+        """
+        pool = self.pool
+        hands = observation.deal(hand_mask, rng)
+        state = state.copy()
+        trump = state.trump
+        active = [seat for seat in range(4) if seat != observation.sitting_out]
+        seat_of = {player.name: player.seat for player in players}
+
+        seat = 0
+        node = self.root
+        path = []
+        in_tree = True
+        while state.tricks_played < 5:
+            card = None
+            if in_tree:
+                lead_card = state.trick[0][0] if state.trick else -1
+                legal = engine.legal_moves(hands[seat], trump, lead_card)
+
+                # Children whose card is legal in this layout, and the legal cards without a child yet
+                available = []
+                untried = legal
+                for child in pool.children(node):
+                    bit = engine.BITS[pool.card[child]]
+                    if legal & bit:
+                        available.append(child)
+                        untried &= ~bit
+
+                if untried and not pool.full:
+                    # Expand one node per iteration, then play out
+                    card = rng.choice(engine.cards_in(untried))
+                    node = pool.allocate(node, card, seat)
+                    available.append(node)
+                    path.append(node)
+                    in_tree = False
+                elif available:
+                    node = self._select(available, seat)
+                    card = pool.card[node]
+                    path.append(node)
+                else:
+                    in_tree = False
+
+                for child in available:
+                    pool.available[child] += 1
+
+            if card is None:
+                card = self._rollout_card(players[seat], hands[seat], state, caller, going_alone)
+
+            hands[seat] ^= engine.BITS[card]
+            state.play(card, players[seat])
+            if len(state.trick) == len(active):
+                seat = seat_of[state.finish_trick().name]
+            else:
+                seat = active[(active.index(seat) + 1) % len(active)]
+
+        net = pimc.net_points(state.tricks_won(bot.team), caller.team == bot.team, going_alone)
+        reward = (net + _POINTS_RANGE / 2) / _POINTS_RANGE
+        for node in path:
+            pool.visits[node] += 1
+            pool.reward[node] += reward
+
+    def _select(self, children, seat):
+        """
+        UCB1 over the available children, rewards seen from the side of the seat to play
+        """
+        pool = self.pool
+        exploration = self.exploration
+        best = NO_NODE
+        best_value = -math.inf
+        for child in children:
+            visits = pool.visits[child]
+            if not visits:
+                return child
+            mean = pool.reward[child] / visits
+            if seat % 2:
+                mean = 1 - mean
+            value = mean + exploration * math.sqrt(math.log(pool.available[child]) / visits)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+    @staticmethod
+    def _rollout_card(player, hand_mask, state, caller, going_alone):
+        hand = engine.cards_in(hand_mask)
+        if len(hand) == 1:
+            return hand[0]
+        return player._determine_best_card_id(hand, state, caller, going_alone, state.tricks_won(player.team))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from homepage import bidding_policy, endgame_table, hand_table
+from homepage.models import Player
+
+
+class Command(BaseCommand):
+    help = "Builds the precomputed tables the bots load on their first decision, if missing or out of date"
+
+    def handle(self, *args, **options):
+        hand_table.load_table(Player)
+        self.stdout.write(f"Hand strength table: {hand_table.DEFAULT_PATH}")
+        bidding_policy.load_policy(Player)
+        self.stdout.write(f"Bidding policy: {bidding_policy.DEFAULT_PATH}")
+        if Player.ENDGAME_CARDS:
+            endgame_table.load_table(Player.ENDGAME_CARDS)
+            self.stdout.write(f"Endgame table: {endgame_table.DEFAULT_PATH}")
@@ -0,0 +1,170 @@
+"""
+Match equity: the probability that team 1 wins the game from any score, by dynamic programming over the
+outcome of a hand instead of simulating whole games.
+
+A score state is (team 1 points, team 2 points, dealer seat), seats numbered like the simulator's bots (0-3,
+Bot 1 to Bot 4, even seats on team 1). Every hand gives points to exactly one team, so each hand moves the game
+to a state with more points in total and the equity of every state follows from the states after it, starting
+from the finished games (a team at POINTS_TO_WIN or more).
+
+The hand outcomes come from a simulation (outcome_distribution of its SimulationStats): the probability of every
+(points of the dealing team, points of the other team). The simulator's dealer is Bot 4, so a distribution from
+it already is relative to the dealing team.
+
+Tables are written to a binary file keyed by the distribution (see table_file) and loaded once per process, so a
+lookup in a game (equity, or expected_equity of a bid's outcomes) is a single read.
+"""
+import hashlib
+import os
+import struct
+
+try:
+    from . import table_file
+except ImportError:
+    import table_file
+
+
+POINTS_TO_WIN = 10
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "match_equity.bin")
+
+_MAGIC = b"EUME"
+_FORMAT_VERSION = 1
+
+# Loaded tables by (distribution digest, path)
+_tables = {}
+
+
+def outcome_distribution(stats):
+    """
+    {(dealing team points, other team points): probability} of the hands of a SimulationStats (Bot 4, team 2, dealing)
+    """
+    total = sum(stats.outcomes.values())
+    if not total:
+        raise ValueError("No hands in the stats")
+    return {(team2, team1): count / total for (team1, team2), count in sorted(stats.outcomes.items())}
+
+
+def table_digest(distribution, points_to_win=POINTS_TO_WIN):
+    """
+    Digest of everything the table depends on: the hand outcome distribution and the points to win
+    """
+    parts = [repr(points_to_win), repr(sorted(distribution.items()))]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).digest()
+
+
+def _index(team1, team2, dealer, points_to_win):
+    return (team1 * points_to_win + team2) * 4 + dealer
+
+
+class MatchEquityTable:
+    """
+    Read-only view of a match equity table
+    """
+    def __init__(self, entries, points_to_win, digest, source=None):
+        self._entries = entries
+        self.points_to_win = points_to_win
+        self.digest = digest
+        self._source = source
+
+    def equity(self, team1, team2, dealer):
+        """
+        Probability that team 1 wins from team1 - team2 points with the seat dealer (0-3) dealing the next hand
+        """
+        points_to_win = self.points_to_win
+        if team1 >= points_to_win:
+            return 1.0
+        if team2 >= points_to_win:
+            return 0.0
+        return self._entries[_index(team1, team2, dealer, points_to_win)]
+
+    def expected_equity(self, team1, team2, dealer, distribution):
+        """
+        Team 1's equity after the next hand, dealt by dealer, when its outcome has the distribution
+        {(dealing team points, other team points): probability}, e.g. the outcomes of one bid for a score-aware decision
+        """
+        next_dealer = (dealer + 1) % 4
+        equity = 0.0
+        for (dealing, other), probability in distribution.items():
+            points1, points2 = (other, dealing) if dealer % 2 else (dealing, other)
+            equity += probability * self.equity(team1 + points1, team2 + points2, next_dealer)
+        return equity
+
+    def close(self):
+        if self._source is not None:
+            self._entries.release()
+            self._source.close()
+            self._source = None
+
+
+def compile_table(distribution, points_to_win=POINTS_TO_WIN):
+    """
+    Equity of every score state, states with more points in total first
+    """
+    if any(dealing + other <= 0 for dealing, other in distribution):
+        raise ValueError("Every hand outcome must give points")
+
+    entries = [0.0] * (points_to_win * points_to_win * 4)
+    table = MatchEquityTable(entries, points_to_win, None)
+    for total in range(2 * (points_to_win - 1), -1, -1):
+        for team1 in range(max(0, total - points_to_win + 1), min(total, points_to_win - 1) + 1):
+            team2 = total - team1
+            for dealer in range(4):
+                entries[_index(team1, team2, dealer, points_to_win)] = table.expected_equity(team1, team2, dealer, distribution)
+    return entries
+
+
+def build_table(distribution, points_to_win=POINTS_TO_WIN, path=DEFAULT_PATH):
+    """
+    Compiles the table and writes it to path (atomically)
+    """
+    entries = compile_table(distribution, points_to_win)
+    data = struct.pack(f"<{len(entries)}d", *entries)
+    table_file.write_table(path, _MAGIC, _FORMAT_VERSION, table_digest(distribution, points_to_win), len(entries), data)
+
+
+def _map_table(path, points_to_win, digest):
+    mapped = table_file.map_table(path, _MAGIC, _FORMAT_VERSION, digest, points_to_win * points_to_win * 4, "d")
+    if mapped is None:
+        return None
+
+    source, entries = mapped
+    return MatchEquityTable(entries, points_to_win, digest, source)
+
+
+def load_table(distribution, points_to_win=POINTS_TO_WIN, path=DEFAULT_PATH):
+    """
+    Returns the match equity table for a hand outcome distribution, building the file first if it is missing or
+    was built for another distribution. Tables are loaded once per process.
+    """
+    digest = table_digest(distribution, points_to_win)
+    table = _tables.get((digest, path))
+    if table is not None:
+        return table
+
+    table = _map_table(path, points_to_win, digest)
+    if table is None:
+        build_table(distribution, points_to_win, path)
+        table = _map_table(path, points_to_win, digest)
+
+    _tables[digest, path] = table
+    return table
+
+
+if __name__ == "__main__":
+    import sys
+
+    from bot_simulations import MonteCarloSimulation
+    from deal_stream import DealStream
+
+    num_deals = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    stats = MonteCarloSimulation().simulate_deals(num_deals, None, deals=DealStream(0)[:num_deals])
+    distribution = outcome_distribution(stats)
+    table = load_table(distribution)
+
+    print(f"Hand outcomes over {num_deals} deals (dealing team, other team):")
+    for outcome, probability in distribution.items():
+        print(f"  {outcome}: {probability:.4f}")
+    print("Team 1 match equity, team 1 dealing next (rows: team 1 points, columns: team 2 points):")
+    for team1 in range(POINTS_TO_WIN):
+        print(" ".join(f"{table.equity(team1, team2, 0):.3f}" for team2 in range(POINTS_TO_WIN)))
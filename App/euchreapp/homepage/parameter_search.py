@@ -0,0 +1,262 @@
+"""
+Search for the bidding parameters of BotLogic: the BID_THRESHOLDS of determine_trump and the STRATEGY_WEIGHTS
+of evaluate_hand.
+
+A candidate (a value for every parameter, see parameter_names) is scored against the current parameters on a
+fixed set of deals, the first num_deals of DealStream(seed): every deal is played twice, once with each team
+bidding with the candidate, and the score is the candidate's net points per hand (0 for the current
+parameters). Every candidate is scored on the same deals, so the noise of the deal cancels out of the
+comparisons and the search is deterministic.
+
+ParameterSearch runs a coordinate (pattern) search: every parameter is moved up and down by a step, the best
+move is taken while one improves the score, and the step is halved when none does. The candidates of a round
+are scored in parallel on a process pool, and scores are kept in a cache file so candidates seen before (in this
+run or an earlier one on the same deals) are not played again. The best parameters are written to a file
+BotLogic.load_parameters reads.
+
+Run this file for an overnight search: python parameter_search.py [deals] [workers] [rounds]
+"""
+import copy
+import hashlib
+import json
+import os
+import time
+
+import bidding_policy
+from bot_logic import PARAMETERS_FORMAT_VERSION, BotLogic
+from bot_simulations import Bot, MonteCarloSimulation
+from deal_stream import DealStream
+
+
+_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(_DIRECTORY, "bot_parameters.json")
+DEFAULT_CACHE_PATH = os.path.join(_DIRECTORY, "parameter_cache.jsonl")
+
+# (name, partner, team) of the seats, Bot 4 dealing
+_SEATS = (("Bot 1", "Bot 3", 1), ("Bot 2", "Bot 4", 2), ("Bot 3", "Bot 1", 1), ("Bot 4", "Bot 2", 2))
+
+
+def _flatten(prefix, values, into):
+    for key, value in values.items():
+        name = f"{prefix}.{key}"
+        if isinstance(value, dict):
+            _flatten(name, value, into)
+        else:
+            into[name] = value
+    return into
+
+
+def parameter_names():
+    """
+    Names of the parameters searched, e.g. "thresholds.round1.first.normal" or "weights.trump_cards"
+    """
+    return list(current_parameters())
+
+
+def current_parameters():
+    """
+    {parameter name: value} of BotLogic's current parameters
+    """
+    parameters = _flatten("thresholds", BotLogic.BID_THRESHOLDS, {})
+    return _flatten("weights", BotLogic.STRATEGY_WEIGHTS, parameters)
+
+
+def to_settings(parameters):
+    """
+    (STRATEGY_WEIGHTS, BID_THRESHOLDS) for {parameter name: value}
+    """
+    settings = {"weights": copy.deepcopy(BotLogic.STRATEGY_WEIGHTS), "thresholds": copy.deepcopy(BotLogic.BID_THRESHOLDS)}
+    for name, value in parameters.items():
+        keys = name.split(".")
+        target = settings
+        for key in keys[:-1]:
+            target = target[key]
+        target[keys[-1]] = value
+    return settings["weights"], settings["thresholds"]
+
+
+def _live_hand_score(self, hand, trump):
+    # Candidates score hands directly instead of building a hand strength table per candidate
+    return self.evaluate_hand_id(hand, trump)
+
+
+def candidate_class(parameters):
+    """
+    Bot subclass bidding with the parameters ({parameter name: value}), without precomputed tables
+    """
+    weights, thresholds = to_settings(parameters)
+    return type("CandidateBot", (Bot,), {
+        "STRATEGY_WEIGHTS": weights,
+        "BID_THRESHOLDS": thresholds,
+        "BIDDING_POLICY_MODE": "live",
+        "get_hand_score": _live_hand_score,
+    })
+
+
+def score_candidate(parameters, seed, num_deals):
+    """
+    Net points per hand of a team bidding with the parameters against a team bidding with BotLogic's, over the
+    first num_deals deals of DealStream(seed) played with each team as the candidate
+    """
+    candidate = candidate_class(parameters)
+    simulation = MonteCarloSimulation()
+    deals = DealStream(seed)[:num_deals]
+
+    net_points = 0
+    for candidate_team in (1, 2):
+        players = [
+            (candidate if team == candidate_team else Bot)(name, partner=partner, team=team)
+            for name, partner, team in _SEATS
+        ]
+        stats = simulation.simulate_deals(num_deals, None, deals=deals, players=players)
+        net_points += stats.total_points[candidate_team] - stats.total_points[3 - candidate_team]
+    return net_points / (2 * num_deals)
+
+
+def _score_task(args):
+    """
+    Process pool entry point for score_candidate
+    """
+    parameters, seed, num_deals = args
+    return score_candidate(parameters, seed, num_deals)
+
+
+def baseline_digest():
+    """
+    Digest of the bidding the candidates play against: scores cached for another one are not reused
+    """
+    return hashlib.sha256(bidding_policy.policy_digest(BotLogic)).hexdigest()[:16]
+
+
+class ParameterSearch:
+    """
+    Coordinate search over the parameters, scoring candidates on num_deals deals of DealStream(seed) on a
+    pool of workers processes. step is the initial move of every parameter, the search ends when it falls
+    below min_step.
+    """
+    def __init__(self, num_deals=2000, seed=0, workers=1, step=0.02, min_step=0.0025, cache_path=DEFAULT_CACHE_PATH):
+        self.num_deals = num_deals
+        self.seed = seed
+        self.workers = workers
+        self.step = step
+        self.min_step = min_step
+        self.cache_path = cache_path
+        self.baseline = baseline_digest()
+        self.cache = {}
+        self.evaluated = 0
+        self._load_cache()
+
+    def _key(self, parameters):
+        return tuple(sorted((name, round(value, 9)) for name, value in parameters.items()))
+
+    def _load_cache(self):
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return
+        with open(self.cache_path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Line cut short by an interrupted run
+                    continue
+                if (record["seed"], record["deals"], record["baseline"]) == (self.seed, self.num_deals, self.baseline):
+                    self.cache[self._key(record["parameters"])] = record["score"]
+
+    def score(self, candidates):
+        """
+        Scores of a list of candidates ({parameter name: value}), playing the ones not in the cache
+        """
+        missing = []
+        for parameters in candidates:
+            key = self._key(parameters)
+            if key not in self.cache and all(key != self._key(other) for other in missing):
+                missing.append(parameters)
+
+        if missing:
+            tasks = [(parameters, self.seed, self.num_deals) for parameters in missing]
+            if self.workers > 1:
+                from concurrent.futures import ProcessPoolExecutor
+
+                with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                    scores = list(executor.map(_score_task, tasks))
+            else:
+                scores = [_score_task(task) for task in tasks]
+
+            self.evaluated += len(missing)
+            for parameters, score in zip(missing, scores):
+                self.cache[self._key(parameters)] = score
+            if self.cache_path is not None:
+                with open(self.cache_path, "a", encoding="utf-8") as fh:
+                    for parameters, score in zip(missing, scores):
+                        fh.write(json.dumps({
+                            "seed": self.seed, "deals": self.num_deals, "baseline": self.baseline,
+                            "parameters": parameters, "score": score,
+                        }) + "\n")
+
+        return [self.cache[self._key(parameters)] for parameters in candidates]
+
+    def run(self, start=None, max_rounds=50, log=print):
+        """
+        Searches from start (BotLogic's current parameters by default) and returns (best parameters, score)
+        """
+        current = dict(start or current_parameters())
+        current_score = self.score([current])[0]
+        step = self.step
+
+        for round_number in range(1, max_rounds + 1):
+            if step < self.min_step:
+                break
+
+            candidates = []
+            for name, value in current.items():
+                for move in (step, -step):
+                    if value + move >= 0:
+                        candidates.append({**current, name: round(value + move, 9)})
+
+            started = time.time()
+            scores = self.score(candidates)
+            best = max(range(len(candidates)), key=scores.__getitem__)
+            if scores[best] > current_score:
+                moved = next(name for name in current if candidates[best][name] != current[name])
+                current, current_score = candidates[best], scores[best]
+                log(f"Round {round_number}: {moved} -> {current[moved]}, {current_score:+.4f} points per hand "
+                    f"({time.time() - started:.0f}s)")
+            else:
+                step /= 2
+                log(f"Round {round_number}: no better move, step {step}")
+
+        return current, current_score
+
+    def save(self, parameters, score, path=DEFAULT_PATH):
+        """
+        Writes parameters to a file BotLogic.load_parameters reads (atomically)
+        """
+        weights, thresholds = to_settings(parameters)
+        config = {
+            "format_version": PARAMETERS_FORMAT_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "score": score,
+            "deals": self.num_deals,
+            "seed": self.seed,
+            "baseline": self.baseline,
+            "strategy_weights": weights,
+            "bid_thresholds": thresholds,
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(config, fh, indent=2)
+        os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    import sys
+
+    num_deals = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    max_rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    search = ParameterSearch(num_deals=num_deals, workers=workers)
+    parameters, score = search.run(max_rounds=max_rounds)
+    search.save(parameters, score)
+    print(f"Best parameters ({score:+.4f} points per hand against the current ones, {search.evaluated} candidates played) "
+          f"written to {DEFAULT_PATH}")
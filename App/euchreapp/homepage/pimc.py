@@ -0,0 +1,344 @@
+"""
+Perfect information Monte Carlo (PIMC) card play.
+
+For a card play decision, the cards the seat has not seen are dealt at random to the other seats, consistent
+with what it has seen (how many cards every seat still holds, the suits a seat showed out of and where the up
+card went), and the double dummy solver scores every legal card in that layout. The card with the best average
+result over the layouts is played.
+
+The search is anytime: layouts are solved until the time budget runs out (at least one is always solved),
+so the time a decision takes stays bounded whatever the position. BotLogic plays this way when its
+CARD_PLAY_MODE is 'pimc'.
+
+Seats are relative to the seat to play: 0 is the seat itself, 1 the opponent on its left, 2 its partner and
+3 the opponent on its right (the order of play), so seats 0 and 2 are partners like in double_dummy.
+"""
+import random
+import time
+
+try:
+    from . import card_engine as engine
+    from .double_dummy import DoubleDummySolver
+except ImportError:
+    import card_engine as engine
+    from double_dummy import DoubleDummySolver
+
+
+# Attempts at dealing a layout that respects every void before the voids are ignored
+_MAX_DEAL_ATTEMPTS = 20
+
+_random = random.Random()
+
+
+class PIMCResult:
+    """
+    Outcome of a search: the card chosen, the number of layouts solved, the time spent, and the average
+    net points and tricks (for the seat's team, from the current trick on) of every legal card
+    """
+    __slots__ = ("card", "layouts", "elapsed", "points", "tricks")
+
+    def __init__(self, card, layouts, elapsed, points, tricks):
+        self.card = card
+        self.layouts = layouts
+        self.elapsed = elapsed
+        self.points = points
+        self.tricks = tricks
+
+
+def choose_card(bot, hand, state, trump_caller, going_alone, budget_ms, max_layouts=None, rng=None, endgame=None):
+    """
+    Chooses the card bot plays from hand (card ids in hand order) with the TrickState state of the hand,
+    the solver looking up the positions endgame (an EndgameTable, see endgame_table) covers.
+    Returns a PIMCResult. Raises ValueError when the players in the tricks can't be seated around the bot
+    """
+    start = time.perf_counter()
+    deadline = start + budget_ms / 1000
+    rng = rng or _random
+
+    trump = state.trump
+    hand_mask = engine.mask_of(hand)
+    lead_card = state.trick[0][0] if state.trick else -1
+    legal = [card for card in hand if engine.is_legal(card, hand_mask, trump, lead_card)]
+
+    # Nothing to search for with one legal card, or legal cards that all win or lose the same tricks
+    if len(legal) == 1 or _all_equivalent(legal, engine.FULL_DECK & ~hand_mask & ~state.seen, trump):
+        return PIMCResult(legal[0], 0, time.perf_counter() - start, {}, {})
+
+    observation = observe(bot, hand_mask, state, trump_caller, going_alone, rng)
+    trick = [(card, observation.seats[player.name]) for card, player in state.trick]
+    leader = trick[0][1] if trick else 0
+    team_tricks = state.tricks_won(bot.team)
+    called = trump_caller.team == bot.team
+
+    solver = DoubleDummySolver(trump, endgame)
+    points = dict.fromkeys(legal, 0)
+    tricks = dict.fromkeys(legal, 0)
+    layouts = 0
+    while True:
+        hands = observation.deal(hand_mask, rng)
+        values = solver.card_values(hands, leader, trick)
+        for card in legal:
+            team_total = team_tricks + values[card]
+            points[card] += net_points(team_total, called, going_alone)
+            tricks[card] += values[card]
+        layouts += 1
+
+        if time.perf_counter() >= deadline or layouts == max_layouts:
+            break
+
+    # Best average points, then average tricks, ties going to the first card in hand order
+    card = max(legal, key=lambda card: (points[card], tricks[card]))
+    return PIMCResult(
+        card,
+        layouts,
+        time.perf_counter() - start,
+        {card: total / layouts for card, total in points.items()},
+        {card: total / layouts for card, total in tricks.items()},
+    )
+
+
+class Observation:
+    """
+    What a seat knows of the other hands: seats is {player name: relative seat}, sitting_out the seat sitting out
+    (or None), counts the number of cards every other seat holds, voids the mask of cards every seat can't hold
+    and unseen the mask of the cards in the other hands and the kitty.
+
+    up_card, trump_round and dealer (a relative seat) are those of the bidding when they are known (see
+    trick_state.Bidding). An up card turned down is in the kitty. One picked up is in the dealer's hand until the
+    dealer plays it, unless the dealer sits out or discarded it (which the dealer showing out of trump while it
+    is still unseen tells). known holds the unseen cards every seat is known to hold.
+    """
+    __slots__ = ("seats", "sitting_out", "counts", "voids", "unseen", "up_card", "trump_round", "dealer", "known")
+
+    def __init__(self, seats, sitting_out, counts, voids, unseen, up_card=-1, trump_round=None, dealer=None):
+        self.seats = seats
+        self.sitting_out = sitting_out
+        self.counts = counts
+        self.voids = voids
+        self.up_card = up_card
+        self.trump_round = trump_round
+        self.dealer = dealer
+        self.known = [0, 0, 0, 0]
+
+        bit = engine.BITS[up_card] if up_card >= 0 else 0
+        if unseen & bit:
+            if trump_round == "2":
+                unseen &= ~bit
+            elif trump_round == "1" and dealer is not None:
+                if counts[dealer] and not voids[dealer] & bit:
+                    self.known[dealer] = bit
+                else:
+                    unseen &= ~bit
+        self.unseen = unseen
+
+    def deal(self, hand_mask, rng):
+        """
+        Deals a random layout of the unseen cards (see deal_layout)
+        """
+        return deal_layout(hand_mask, self.unseen, self.counts, self.voids, rng, self.known)
+
+
+def observe(bot, hand_mask, state, trump_caller, going_alone, rng, seats=None):
+    """
+    Returns the Observation of bot, holding the cards of hand_mask, in the TrickState state
+    (see choose_card for the errors). seats ({player name: relative seat} of all the players) is the seating
+    when it is known, by default the one of state.players. Without either, the players are placed from the tricks.
+    The up card and the dealer's discard are placed from state.bidding when it is set
+    """
+    if seats is None and state.players is not None:
+        seats = relative_seats(bot, state.players)
+    if seats is None:
+        seats, sitting_out = _seats(bot, state, trump_caller, going_alone, rng)
+    else:
+        sitting_out = _sitting_out(bot, seats, trump_caller, going_alone)
+    unseen = engine.FULL_DECK & ~hand_mask & ~state.seen & ~engine.mask_of(card for card, _ in state.trick)
+    counts = _card_counts(state, seats, sitting_out)
+
+    bidding = state.bidding
+    if bidding is None:
+        return Observation(seats, sitting_out, counts, _voids(state, seats), unseen)
+
+    dealer = seats.get(bidding.dealer.name)
+    if dealer == 0 and bidding.discard is not None:
+        # The dealer knows the card it discarded is in the kitty
+        unseen &= ~engine.BITS[bidding.discard]
+    return Observation(
+        seats, sitting_out, counts, _voids(state, seats), unseen, bidding.up_card, bidding.trump_round, dealer
+    )
+
+
+def relative_seats(bot, players):
+    """
+    Returns {player name: seat relative to bot} for the players in seat order
+    """
+    seat = [player.name for player in players].index(bot.name)
+    return {player.name: (i - seat) % 4 for i, player in enumerate(players)}
+
+
+def net_points(team_tricks, called, going_alone):
+    """
+    Points of a team minus the other team's for the hand, when the team took team_tricks of the 5 tricks
+    (called is True when the team called trump, going_alone when the caller went alone)
+    """
+    if called:
+        if team_tricks == 5:
+            return 4 if going_alone else 2
+        return 1 if team_tricks >= 3 else -2
+
+    if team_tricks >= 3:
+        return 2
+    if team_tricks == 0:
+        return -4 if going_alone else -2
+    return -1
+
+
+def deal_layout(hand_mask, unseen, counts, voids, rng, known=(0, 0, 0, 0)):
+    """
+    Deals the unseen cards at random: counts[seat] cards to every other seat, starting with the unseen cards it is
+    known to hold (known[seat], a mask of cards), none of a suit the seat showed out of (voids[seat], a mask of
+    cards), the rest to the kitty. Returns the 4 hand masks, seat 0's being hand_mask
+    """
+    known = [known[seat] & unseen for seat in range(4)]
+    cards = engine.cards_in(unseen & ~(known[1] | known[2] | known[3]))
+    room = [count - bin(known[seat]).count("1") for seat, count in enumerate(counts)]
+    kitty = len(cards) - sum(room[1:])
+
+    for _ in range(_MAX_DEAL_ATTEMPTS):
+        hands = _deal_once(cards, room, voids, kitty, rng)
+        if hands is not None:
+            break
+    else:
+        # What was seen is dealt with too rarely by chance (or can't be), deal without the voids
+        hands = _deal_once(cards, room, (0, 0, 0, 0), kitty, rng)
+
+    for seat in (1, 2, 3):
+        hands[seat] |= known[seat]
+    hands[0] = hand_mask
+    return hands
+
+
+def _deal_once(cards, counts, voids, kitty, rng):
+    """
+    One attempt at deal_layout: every card goes to a random seat (or the kitty) with room for it that is not
+    void in its suit. Returns the hand masks, or None when a card has nowhere to go
+    """
+    room = list(counts)
+    hands = [0, 0, 0, 0]
+    cards = cards[:]
+    rng.shuffle(cards)
+    for card in cards:
+        bit = engine.BITS[card]
+        # Seats weighted by the room they have left, so every seat is filled at the same pace
+        choices = [seat for seat in (1, 2, 3) for _ in range(room[seat]) if not voids[seat] & bit]
+        choices.extend([None] * kitty)
+        if not choices:
+            return None
+        seat = rng.choice(choices)
+        if seat is None:
+            kitty -= 1
+        else:
+            room[seat] -= 1
+            hands[seat] |= bit
+    return hands
+
+
+def _all_equivalent(legal, cards_out, trump):
+    """
+    True when the legal cards are all of one suit with none of cards_out (the cards not in the hand or in finished
+    tricks) ranking between them
+    """
+    suits = {engine.EFFECTIVE_SUITS[trump][card] for card in legal}
+    if len(suits) != 1:
+        return False
+    ranks = engine.RANK_TABLES[trump][suits.pop()]
+    low = min(ranks[card] for card in legal)
+    high = max(ranks[card] for card in legal)
+    return not any(low < ranks[card] < high for card in engine.cards_in(cards_out))
+
+
+def _seats(bot, state, trump_caller, going_alone, rng):
+    """
+    Returns ({player name: relative seat} for the players known so far and the trump caller, seat sitting out
+    or None).
+
+    The bot's seat and its partner's are known. The opponents are placed from the order they played in:
+    an opponent playing right after the bot or right before its partner sits on its left (seat 1).
+    An opponent those don't place takes the seat left. An opponent who called trump and has not played yet is
+    placed at random (going alone, opposite the seat the play skipped once a play shows it).
+    """
+    seats = {bot.name: 0, bot.partner: 2}
+    # Seat seen to be skipped: the partner playing right before the bot (or after it) means seat 3 (or 1) is empty
+    skipped = None
+
+    sequences = [[player.name for _, player in trick] for trick in state.tricks]
+    sequences.append([player.name for _, player in state.trick] + [bot.name])
+    for names in sequences:
+        for previous, following in zip(names, names[1:]):
+            if (previous, following) == (bot.partner, bot.name):
+                skipped = 3
+            elif (previous, following) == (bot.name, bot.partner):
+                skipped = 1
+            elif previous == bot.name or previous == bot.partner:
+                seats.setdefault(following, 1 if previous == bot.name else 3)
+            elif following == bot.name or following == bot.partner:
+                seats.setdefault(previous, 1 if following == bot.partner else 3)
+
+    # Both opponents are named in the tricks once both have played
+    opponents = {name for names in sequences for name in names if name not in (bot.name, bot.partner)}
+    placed = {seat for name, seat in seats.items() if name in opponents}
+    for name in opponents - set(seats):
+        if placed >= {1, 3}:
+            raise ValueError(f"More than two opponents for {bot.name} (partner {bot.partner!r}) in the tricks played")
+        seat = ({1, 3} - placed).pop()
+        seats[name] = seat
+        placed.add(seat)
+
+    if trump_caller.name not in seats:
+        # A caller who has not played yet is an opponent not placed either. Going alone, the seat the play
+        # skipped is the caller's partner's
+        free = sorted({1, 3} - placed)
+        if not free:
+            raise ValueError(f"No seat left for {trump_caller.name}, who called trump")
+        seats[trump_caller.name] = 4 - skipped if going_alone and skipped else rng.choice(free)
+
+    return seats, _sitting_out(bot, seats, trump_caller, going_alone)
+
+
+def _sitting_out(bot, seats, trump_caller, going_alone):
+    """
+    Relative seat of the lone caller's partner, or None
+    """
+    if not going_alone:
+        return None
+    return 4 - seats[trump_caller.name] if trump_caller.name != bot.name else 2
+
+
+def _card_counts(state, seats, sitting_out):
+    """
+    Cards the other relative seats hold (0 for seat 0 itself): one per trick left, less one for a seat that
+    played to the current trick
+    """
+    counts = [0] + [5 - state.tricks_played] * 3
+    for _, player in state.trick:
+        counts[seats[player.name]] -= 1
+    if sitting_out is not None:
+        counts[sitting_out] = 0
+    return counts
+
+
+def _voids(state, seats):
+    """
+    Mask of the cards every relative seat can't hold, from the suits it didn't follow
+    """
+    follow_masks = engine.FOLLOW_MASKS[state.trump]
+    effective_suits = engine.EFFECTIVE_SUITS[state.trump]
+    voids = [0, 0, 0, 0]
+    for trick in state.tricks + [state.trick]:
+        if not trick:
+            continue
+        lead_suit = effective_suits[trick[0][0]]
+        for card, player in trick[1:]:
+            if effective_suits[card] != lead_suit:
+                voids[seats[player.name]] |= follow_masks[lead_suit]
+    voids[0] = 0
+    return voids
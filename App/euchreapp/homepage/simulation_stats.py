@@ -0,0 +1,249 @@
+"""
+Mergeable statistics for MonteCarloSimulation.
+
+SimulationStats holds plain counters (per seat and per team), so the stats of separate runs, e.g. the
+chunks of a parallel run, can be added together with merge() and the result is the same as if all the
+deals had been played in one run.
+
+RunningStats keeps the running mean and variance of a stream of values (Welford's algorithm), which the
+forced EV simulations use for standard errors and to stop once an estimate is precise enough.
+SimulationStats also keeps them over the averages of the equivalent deals of every deal when a simulation plays
+those (see deal_symmetry).
+"""
+from dataclasses import dataclass, field
+from statistics import NormalDist
+from typing import Dict, Tuple
+
+
+SEAT_NAMES = ("Bot 1", "Bot 2", "Bot 3", "Bot 4")
+TEAMS = (1, 2)
+
+
+def _per_seat():
+    return {name: 0 for name in SEAT_NAMES}
+
+
+def _per_team():
+    return {team: 0 for team in TEAMS}
+
+
+@dataclass
+class SimulationStats:
+    num_simulations: int = 0
+
+    # Calls and loner attempts per seat
+    calls_round1: Dict[str, int] = field(default_factory=_per_seat)
+    calls_round2: Dict[str, int] = field(default_factory=_per_seat)
+    loner_attempts_round1: Dict[str, int] = field(default_factory=_per_seat)
+    loner_attempts_round2: Dict[str, int] = field(default_factory=_per_seat)
+
+    # Net points (caller's team minus the other team) over the hands each seat called
+    seat_net_points: Dict[str, int] = field(default_factory=_per_seat)
+
+    # Per team number
+    calls: Dict[int, int] = field(default_factory=_per_team)
+    wins: Dict[int, int] = field(default_factory=_per_team)
+    marches: Dict[int, int] = field(default_factory=_per_team)
+    total_points: Dict[int, int] = field(default_factory=_per_team)
+    loner_attempts: Dict[int, int] = field(default_factory=_per_team)
+    loner_wins: Dict[int, int] = field(default_factory=_per_team)
+
+    # Hands by (team 1 points, team 2 points), see match_equity
+    outcomes: Dict[Tuple[int, int], int] = field(default_factory=dict)
+
+    # Averages over the equivalent deals of every deal, by statistic (see record_equivalents)
+    deal_means: Dict[str, "RunningStats"] = field(default_factory=dict)
+
+    def record_call(self, name, trump_round, going_alone):
+        """
+        Counts a trump call (and loner attempt) by the seat name in round 1 or 2
+        """
+        if trump_round == 1:
+            self.calls_round1[name] += 1
+            if going_alone:
+                self.loner_attempts_round1[name] += 1
+        else:
+            self.calls_round2[name] += 1
+            if going_alone:
+                self.loner_attempts_round2[name] += 1
+
+    def record_hand(self, trump_maker, going_alone, team1_points, team2_points):
+        """
+        Counts the result of a played hand
+        """
+        self.num_simulations += 1
+        points = {1: team1_points, 2: team2_points}
+        for team in TEAMS:
+            self.total_points[team] += points[team]
+        outcome = (team1_points, team2_points)
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+        team = trump_maker.team
+        team_points = points[team]
+        other_points = points[3 - team]
+        self.seat_net_points[trump_maker.name] += team_points - other_points
+
+        self.calls[team] += 1
+        if going_alone:
+            self.loner_attempts[team] += 1
+            if team_points == 4:
+                self.loner_wins[team] += 1
+        if team_points > other_points:
+            self.wins[team] += 1
+            if team_points == 2:
+                self.marches[team] += 1
+
+    def record_equivalents(self, results):
+        """
+        Adds the results of the hands played from the equivalent deals of one deal, [(trump maker, team 1 points,
+        team 2 points)], to the per deal averages. Those hands are correlated, so their average is one sample and
+        standard errors are over deals.
+        """
+        count = len(results)
+        values = {
+            f"{name} call rate": sum(trump_maker.name == name for trump_maker, _, _ in results) / count * 100
+            for name in SEAT_NAMES
+        }
+        values["Team 1 net points per hand"] = sum(team1 - team2 for _, team1, team2 in results) / count
+        for key, value in values.items():
+            self.deal_means.setdefault(key, RunningStats()).add(value)
+
+    def merge(self, other):
+        """
+        Adds the counts of other to these stats and returns self
+        """
+        self.num_simulations += other.num_simulations
+        for name in ("calls_round1", "calls_round2", "loner_attempts_round1", "loner_attempts_round2",
+                     "seat_net_points", "calls", "wins", "marches", "total_points", "loner_attempts", "loner_wins",
+                     "outcomes"):
+            counts = getattr(self, name)
+            for key, count in getattr(other, name).items():
+                counts[key] = counts.get(key, 0) + count
+        for key, stats in other.deal_means.items():
+            self.deal_means.setdefault(key, RunningStats()).merge(stats)
+        return self
+
+    def print_report(self):
+        """
+        Prints call, loner, win and march rates
+        """
+        num_simulations = self.num_simulations
+        if not num_simulations:
+            print("No simulations run")
+            return
+
+        def rates(counts):
+            return {name: round(count / num_simulations * 100, 2) for name, count in counts.items()}
+
+        total_calls = {name: self.calls_round1[name] + self.calls_round2[name] for name in self.calls_round1}
+        total_loners = {
+            name: self.loner_attempts_round1[name] + self.loner_attempts_round2[name]
+            for name in self.loner_attempts_round1
+        }
+
+        for title, counts in (
+            ("Round 1 call rates", self.calls_round1),
+            ("Round 2 call rates", self.calls_round2),
+            ("Total call rates", total_calls),
+            ("Loner rates in round 1", self.loner_attempts_round1),
+            ("Loner rates in round 2", self.loner_attempts_round2),
+            ("Total loner rates", total_loners),
+        ):
+            print(f"{title} after {num_simulations} simulations:")
+            for name, rate in rates(counts).items():
+                print(f"{name}: {rate}%")
+
+        # Calculate win rates
+        win_rates = {}
+        for team in TEAMS:
+            if self.calls[team] != 0:
+                print(f"Team {team} wins: {self.wins[team]}")
+                print(f"Team {team} calls: {self.calls[team]}")
+                win_rates[team] = (self.wins[team] / self.calls[team]) * 100
+            else:
+                win_rates[team] = 0
+
+        for team in TEAMS:
+            print(f"Team {team} win rate after {num_simulations} simulations: {win_rates[team]}%")
+
+        # Print points per hand for each team
+        for team in TEAMS:
+            print(f"Team {team} points per hand: {self.total_points[team] / num_simulations}")
+
+        for team in TEAMS:
+            if self.marches[team] != 0:
+                print(f"Team {team} marches: {(self.marches[team] / self.calls[team]) * 100}%")
+
+        for team in TEAMS:
+            if self.loner_attempts[team] != 0:
+                print(f"Team {team} loner success rate: {(self.loner_wins[team] / self.loner_attempts[team]) * 100:.2f}%")
+        # Total loner success rate
+        total_loner_attempts = sum(self.loner_attempts.values())
+        if total_loner_attempts != 0:
+            print(f"Total loner success rate: {sum(self.loner_wins.values()) / total_loner_attempts * 100:.2f}%")
+
+        print("Net points per call:")
+        for name, net_points in self.seat_net_points.items():
+            calls = total_calls[name]
+            print(f"{name}: {net_points / calls if calls else 0.0:.4f} ({calls} calls)")
+
+        if self.deal_means:
+            deals = next(iter(self.deal_means.values())).count
+            print(f"Standard errors over {deals} deals (the equivalent deals of a deal counted as one sample):")
+            for key, stats in self.deal_means.items():
+                print(f"{key}: {stats.mean:.4f} +/- {stats.standard_error:.4f}")
+
+
+def z_score(confidence):
+    """
+    Two-sided normal quantile for a confidence level, e.g. 1.96 for 0.95
+    """
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+@dataclass
+class RunningStats:
+    """
+    Count, mean and sum of squared deviations of the values added so far (Welford's online algorithm)
+    """
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """
+        Adds the values of other to these stats (Chan et al.'s parallel update) and returns self
+        """
+        if other.count:
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / count
+            self.m2 += other.m2 + delta * delta * self.count * other.count / count
+            self.count = count
+        return self
+
+    @property
+    def variance(self):
+        """
+        Sample variance (nan for fewer than 2 values)
+        """
+        return self.m2 / (self.count - 1) if self.count > 1 else float("nan")
+
+    @property
+    def standard_error(self):
+        """
+        Standard error of the mean (nan for fewer than 2 values)
+        """
+        return (self.variance / self.count) ** 0.5 if self.count > 1 else float("nan")
+
+    def ci_width(self, confidence=0.95):
+        """
+        Width of the normal confidence interval on the mean (inf for fewer than 2 values)
+        """
+        return 2 * z_score(confidence) * self.standard_error if self.count > 1 else float("inf")
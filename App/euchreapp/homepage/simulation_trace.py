@@ -10,6 +10,8 @@ class TraceConfig:
     enabled: bool = False
     path: str = "simulation_trace.jsonl"
     flush_each_hand: bool = False
+    # Size to cut the file back to before appending, when resuming a run from a checkpoint (see tell)
+    resume_at: Optional[int] = None
 
 
 class JSONLTraceLogger:
@@ -24,6 +26,9 @@ class JSONLTraceLogger:
         if not self.config.enabled:
             return self
         os.makedirs(os.path.dirname(self.config.path) or ".", exist_ok=True)
+        if self.config.resume_at is not None and os.path.exists(self.config.path):
+            # Drops the hands logged after the checkpoint, they are played again
+            os.truncate(self.config.path, self.config.resume_at)
         self._fh = open(self.config.path, "a", encoding="utf-8")
         return self
 
@@ -32,6 +37,15 @@ class JSONLTraceLogger:
             self._fh.close()
             self._fh = None
 
+    def tell(self) -> Optional[int]:
+        """
+        Size of the trace file with everything logged so far written, or None when tracing is disabled
+        """
+        if not self._fh:
+            return None
+        self._fh.flush()
+        return self._fh.tell()
+
     def log_hand(self, record: Dict[str, Any]) -> None:
         if not self.config.enabled:
             return
@@ -0,0 +1,179 @@
+"""
+Stratified sampling of deals for rare outcomes (loners, euchres).
+
+Loners mostly come from hands holding four or five cards of one suit, which a uniform deal gives a seat
+only a few times in a thousand. TrumpCountStrata splits deals by what one seat holds in the up card's suit
+(counting the left bower) and whether the up card is a jack, and deals directly from any stratum. The
+probability of every stratum is known exactly, so sampling the rare strata more often and weighting each
+stratum by probability / deals played keeps the estimates unbiased (see StratifiedStats).
+
+Deals are lists of 21 card ids in deal order: five cards for each seat in turn, then the up card.
+"""
+from math import comb
+
+try:
+    from . import card_engine as engine
+    from .simulation_stats import SEAT_NAMES, TEAMS, SimulationStats, z_score
+except ImportError:
+    import card_engine as engine
+    from simulation_stats import SEAT_NAMES, TEAMS, SimulationStats, z_score
+
+
+# Cards of the up card's suit left for the hands (the left bower included, the up card excluded), and the rest
+_SUIT_CARDS = 6
+_OTHER_CARDS = engine.NUM_CARDS - 1 - _SUIT_CARDS
+
+_JACKS = tuple(card for card in range(engine.NUM_CARDS) if engine.CARD_RANKS[card] == engine.JACK)
+_NON_JACKS = tuple(card for card in range(engine.NUM_CARDS) if engine.CARD_RANKS[card] != engine.JACK)
+
+
+class TrumpCountStrata:
+    """
+    Strata (up card is a jack, cards of the up card's suit in the seat's hand) for the seat at seat_index
+    """
+    def __init__(self, seat_index=0):
+        self.seat_index = seat_index
+
+        # Number of suit cards in a 5 card hand from the 23 cards left is hypergeometric,
+        # whatever the up card is
+        hands = comb(engine.NUM_CARDS - 1, 5)
+        count_probabilities = [comb(_SUIT_CARDS, k) * comb(_OTHER_CARDS, 5 - k) / hands for k in range(6)]
+        jack_probability = len(_JACKS) / engine.NUM_CARDS
+
+        self.probabilities = {
+            (up_is_jack, k): (jack_probability if up_is_jack else 1 - jack_probability) * count_probabilities[k]
+            for up_is_jack in (False, True)
+            for k in range(6)
+        }
+
+    def stratum_of(self, deal):
+        """
+        Stratum of a deal of card ids
+        """
+        up_card = deal[20]
+        up_suit = engine.CARD_SUITS[up_card]
+        effective_suits = engine.EFFECTIVE_SUITS[up_suit]
+        start = self.seat_index * 5
+        count = sum(1 for card in deal[start:start + 5] if effective_suits[card] == up_suit)
+        return engine.CARD_RANKS[up_card] == engine.JACK, count
+
+    def deal(self, stratum, rng):
+        """
+        Deals uniformly at random among the deals of a stratum, using rng (a random.Random)
+        """
+        up_is_jack, count = stratum
+        up_card = rng.choice(_JACKS if up_is_jack else _NON_JACKS)
+        up_suit = engine.CARD_SUITS[up_card]
+        effective_suits = engine.EFFECTIVE_SUITS[up_suit]
+
+        suit_cards = [card for card in range(engine.NUM_CARDS) if card != up_card and effective_suits[card] == up_suit]
+        other_cards = [card for card in range(engine.NUM_CARDS) if card != up_card and effective_suits[card] != up_suit]
+        rng.shuffle(suit_cards)
+        rng.shuffle(other_cards)
+
+        hand = suit_cards[:count] + other_cards[:5 - count]
+        rng.shuffle(hand)
+        rest = suit_cards[count:] + other_cards[5 - count:]
+        rng.shuffle(rest)
+
+        start = self.seat_index * 5
+        return rest[:start] + hand + rest[start:15] + [up_card]
+
+
+def allocate(probabilities, num_deals, min_share=0.05):
+    """
+    Splits num_deals between strata in proportion to their probability, but with at least min_share of the
+    deals (and 2 deals) for every stratum. Returns {stratum: number of deals}
+    """
+    if num_deals < 2 * len(probabilities):
+        raise ValueError(f"At least {2 * len(probabilities)} deals are needed for {len(probabilities)} strata")
+
+    shares = {stratum: max(probability, min_share) for stratum, probability in probabilities.items()}
+    total_share = sum(shares.values())
+
+    # Every stratum gets its 2 deals first and the rest is split by share, so the total is never more than num_deals
+    rest = num_deals - 2 * len(shares)
+    allocation = {stratum: 2 + int(rest * share / total_share) for stratum, share in shares.items()}
+
+    # Hand out what rounding left over to the largest shares first
+    left = num_deals - sum(allocation.values())
+    for stratum in sorted(shares, key=shares.get, reverse=True):
+        if left <= 0:
+            break
+        allocation[stratum] += 1
+        left -= 1
+    return allocation
+
+
+class StratifiedStats:
+    """
+    SimulationStats per stratum, combined into population estimates by weighting each stratum by its probability
+    """
+    def __init__(self, probabilities):
+        self.probabilities = dict(probabilities)
+        self.strata = {stratum: SimulationStats() for stratum in self.probabilities}
+
+    @property
+    def num_simulations(self):
+        return sum(stats.num_simulations for stats in self.strata.values())
+
+    def rate(self, name, key):
+        """
+        Estimated probability per deal of a counter that goes up at most once per deal, e.g.
+        rate("loner_wins", 1) or rate("calls_round1", "Bot 2"). Returns (estimate, standard error)
+        """
+        estimate = 0.0
+        variance = 0.0
+        for stratum, probability in self.probabilities.items():
+            stats = self.strata[stratum]
+            n = stats.num_simulations
+            if not n:
+                raise ValueError(f"No deals played in stratum {stratum}")
+            q = getattr(stats, name)[key] / n
+            estimate += probability * q
+            if n > 1:
+                variance += probability * probability * q * (1 - q) / (n - 1)
+        return estimate, variance ** 0.5
+
+    def mean(self, name, key):
+        """
+        Estimated mean per deal of any counter, e.g. mean("total_points", 1)
+        """
+        return sum(
+            probability * getattr(self.strata[stratum], name)[key] / self.strata[stratum].num_simulations
+            for stratum, probability in self.probabilities.items()
+        )
+
+    def ratio(self, numerator, denominator, key):
+        """
+        Ratio estimate of two per deal counters, e.g. ratio("loner_wins", "loner_attempts", 1) for a loner success rate
+        """
+        denominator_rate = self.rate(denominator, key)[0]
+        return self.rate(numerator, key)[0] / denominator_rate if denominator_rate else 0.0
+
+    def print_report(self, confidence=0.95):
+        """
+        Prints the reweighted call, loner and win rates with confidence intervals
+        """
+        z = z_score(confidence)
+
+        def line(label, estimate, se):
+            print(f"{label}: {estimate * 100:.4f}% ± {z * se * 100:.4f}%")
+
+        print(f"Stratified estimates after {self.num_simulations} simulations ({len(self.strata)} strata):")
+        for title, name in (
+            ("Round 1 call rates", "calls_round1"),
+            ("Round 2 call rates", "calls_round2"),
+            ("Loner rates in round 1", "loner_attempts_round1"),
+            ("Loner rates in round 2", "loner_attempts_round2"),
+        ):
+            print(f"{title}:")
+            for seat in SEAT_NAMES:
+                line(seat, *self.rate(name, seat))
+
+        for team in TEAMS:
+            line(f"Team {team} loner attempts per hand", *self.rate("loner_attempts", team))
+            line(f"Team {team} loner wins per hand", *self.rate("loner_wins", team))
+            print(f"Team {team} loner success rate: {self.ratio('loner_wins', 'loner_attempts', team) * 100:.2f}%")
+            print(f"Team {team} win rate: {self.ratio('wins', 'calls', team) * 100:.2f}%")
+            print(f"Team {team} points per hand: {self.mean('total_points', team)}")
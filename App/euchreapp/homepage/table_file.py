@@ -0,0 +1,44 @@
+"""
+Binary files for precomputed tables (hand strength, bidding policy).
+
+A table file is a fixed header (magic, format version, parameter digest, number of entries) followed by
+the raw entries. Files are written atomically and memory-mapped on load; a file whose header does not
+match what the caller expects is reported as missing so the caller can rebuild it.
+"""
+import mmap
+import os
+import struct
+
+
+# magic, format version, parameter digest, number of entries
+HEADER = struct.Struct("<4sI32sI")
+
+
+def write_table(path, magic, version, digest, count, data):
+    """
+    Writes the header and data (bytes) to path, replacing any existing file atomically
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(HEADER.pack(magic, version, digest, count))
+        fh.write(data)
+    os.replace(tmp_path, path)
+
+
+def map_table(path, magic, version, digest, count, item_format):
+    """
+    Memory-maps a table file and returns (mmap, memoryview of the entries cast to item_format), or None if
+    the file is missing, malformed or was built for other parameters
+    """
+    try:
+        with open(path, "rb") as fh:
+            source = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    expected_size = HEADER.size + count * struct.calcsize(item_format)
+    if len(source) != expected_size or HEADER.unpack_from(source) != (magic, version, digest, count):
+        source.close()
+        return None
+
+    return source, memoryview(source)[HEADER.size:].cast(item_format)
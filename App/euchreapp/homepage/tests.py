@@ -1,3 +1,1052 @@
-from django.test import TestCase
+import contextlib
+import copy
+import io
+import os
+import pickle
+import random
+import sys
+import tempfile
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from . import card_engine as engine
+from . import bidding_policy, checkpoint, deal_stream, deal_symmetry, endgame_table, hand_table, ismcts, match_equity, pimc
+from .bot_logic import BotLogic
+from .deal_stream import DealStream
+from .double_dummy import DoubleDummySolver
+from .simulation_stats import SEAT_NAMES, RunningStats, z_score
+from .stratified_sampling import TrumpCountStrata, allocate
+from .threshold_sweep import ThresholdSweep
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The simulation scripts import the other modules by plain name, as when they are run from this directory
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import bot_logic  # noqa: E402
+from bot_simulations import Bot, MonteCarloSimulation  # noqa: E402
+from hand_snapshot import branch  # noqa: E402
+
+
+def random_ending(rng, max_cards=3):
+    """
+    Random position at the start of a trick: (hands as 4 card masks, leader, trump), with the same number of
+    cards per hand and sometimes a seat sitting out
+    """
+    cards = rng.randint(1, max_cards)
+    sitting_out = rng.choice((None, 0, 1, 2, 3))
+    seats = [seat for seat in range(4) if seat != sitting_out]
+    dealt = rng.sample(range(engine.NUM_CARDS), cards * len(seats))
+
+    hands = [0, 0, 0, 0]
+    for i, seat in enumerate(seats):
+        hands[seat] = engine.mask_of(dealt[i * cards:(i + 1) * cards])
+    return hands, rng.choice(seats), rng.randrange(4)
+
+
+def brute_force_tricks(hands, leader, trump, trick=()):
+    """
+    Tricks seats 0 and 2 take from the current trick on with perfect play, by plain minimax over every legal
+    card. trick is the (card, seat) pairs played to the current trick so far
+    """
+    if not trick and not hands[leader]:
+        return 0
+    played_seats = {seat for _, seat in trick}
+    order = [seat for seat in ((leader + i) % 4 for i in range(4)) if hands[seat] or seat in played_seats]
+
+    if len(trick) == len(order):
+        winner = trick[engine.trick_winner([card for card, _ in trick], trump)][1]
+        return (1 if winner % 2 == 0 else 0) + brute_force_tricks(hands, winner, trump)
+
+    seat = order[len(trick)]
+    lead_card = trick[0][0] if trick else -1
+    values = []
+    for card in engine.cards_in(engine.legal_moves(hands[seat], trump, lead_card)):
+        after = list(hands)
+        after[seat] &= ~engine.BITS[card]
+        values.append(brute_force_tricks(after, leader, trump, trick + ((card, seat),)))
+    return max(values) if seat % 2 == 0 else min(values)
+
+
+class LegalMovesTests(SimpleTestCase):
+    """
+    The left bower (the other jack of trump's colour) belongs to trump, not to its printed suit
+    """
+    def cards(self, trump):
+        """
+        (left bower, a card of its printed suit, a trump, a card of a suit of the other colour)
+        """
+        left_suit = engine.SUIT_PAIRS[trump]
+        other_suit = (trump + 2) % 4
+        return (
+            engine.CARD_IDS["J", engine.SUITS[left_suit]],
+            engine.CARD_IDS["10", engine.SUITS[left_suit]],
+            engine.CARD_IDS["A", engine.SUITS[trump]],
+            engine.CARD_IDS["9", engine.SUITS[other_suit]],
+        )
+
+    def test_left_bower_does_not_follow_its_printed_suit(self):
+        for trump in range(4):
+            with self.subTest(trump=engine.SUITS[trump]):
+                left_bower, printed, _, other = self.cards(trump)
+                lead = engine.CARD_IDS["A", engine.SUITS[engine.SUIT_PAIRS[trump]]]
+                hand = engine.mask_of([left_bower, printed, other])
+                self.assertEqual(engine.legal_moves(hand, trump, lead), engine.BITS[printed])
+                self.assertFalse(engine.is_legal(left_bower, hand, trump, lead))
+                self.assertTrue(engine.is_legal(printed, hand, trump, lead))
+
+    def test_left_bower_follows_trump(self):
+        for trump in range(4):
+            with self.subTest(trump=engine.SUITS[trump]):
+                left_bower, printed, _, other = self.cards(trump)
+                lead = engine.CARD_IDS["K", engine.SUITS[trump]]
+                hand = engine.mask_of([left_bower, printed, other])
+                self.assertEqual(engine.legal_moves(hand, trump, lead), engine.BITS[left_bower])
+                self.assertTrue(engine.is_legal(left_bower, hand, trump, lead))
+                self.assertFalse(engine.is_legal(printed, hand, trump, lead))
+
+    def test_left_bower_alone_is_void_in_its_printed_suit(self):
+        for trump in range(4):
+            with self.subTest(trump=engine.SUITS[trump]):
+                left_bower, _, trump_card, other = self.cards(trump)
+                lead = engine.CARD_IDS["A", engine.SUITS[engine.SUIT_PAIRS[trump]]]
+                hand = engine.mask_of([left_bower, trump_card, other])
+                self.assertEqual(engine.legal_moves(hand, trump, lead), hand)
+                for card in (left_bower, trump_card, other):
+                    self.assertTrue(engine.is_legal(card, hand, trump, lead))
+
+
+class DoubleDummySolverTests(SimpleTestCase):
+    def test_solve_matches_brute_force(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            hands, leader, trump = random_ending(rng)
+            expected = brute_force_tricks(hands, leader, trump)
+            tricks_left = bin(hands[leader]).count("1")
+
+            solver = DoubleDummySolver(trump)
+            self.assertEqual(solver.solve(hands, leader, 0), expected)
+            self.assertEqual(solver.solve(hands, leader, 1), tricks_left - expected)
+
+    def test_shared_transposition_table(self):
+        # One solver per trump suit for every position, the way compare_trace keeps it between hands
+        rng = random.Random(2)
+        solvers = [DoubleDummySolver(trump) for trump in range(4)]
+        for _ in range(300):
+            hands, leader, trump = random_ending(rng)
+            self.assertEqual(solvers[trump].solve(hands, leader, 0), brute_force_tricks(hands, leader, trump))
+
+    def test_card_values_inside_a_trick(self):
+        rng = random.Random(3)
+        for _ in range(200):
+            hands, leader, trump = random_ending(rng)
+            solver = DoubleDummySolver(trump)
+
+            # Play a random legal start of the trick
+            order = [seat for seat in ((leader + i) % 4 for i in range(4)) if hands[seat]]
+            trick = ()
+            for seat in order[:rng.randrange(len(order))]:
+                lead_card = trick[0][0] if trick else -1
+                card = rng.choice(engine.cards_in(engine.legal_moves(hands[seat], trump, lead_card)))
+                hands[seat] &= ~engine.BITS[card]
+                trick += ((card, seat),)
+
+            seat = order[len(trick)]
+            lead_card = trick[0][0] if trick else -1
+            expected = {}
+            for card in engine.cards_in(engine.legal_moves(hands[seat], trump, lead_card)):
+                after = list(hands)
+                after[seat] &= ~engine.BITS[card]
+                expected[card] = brute_force_tricks(after, leader, trump, trick + ((card, seat),))
+            self.assertEqual(solver.card_values(hands, leader, list(trick)), expected)
+
+
+class EndgameTableTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # One card per hand keeps the table small enough to compile for every test run
+        cls.table = endgame_table.EndgameTable(endgame_table.compile_table(1), 1, endgame_table.table_digest(1))
+
+    def test_value_matches_solver(self):
+        rng = random.Random(4)
+        for _ in range(2000):
+            hands, leader, trump = random_ending(rng, max_cards=1)
+            expected = DoubleDummySolver(trump).solve(hands, leader, leader)
+            self.assertEqual(self.table.value(hands, leader, trump), expected)
+
+    def test_solver_with_table(self):
+        rng = random.Random(5)
+        for _ in range(300):
+            hands, leader, trump = random_ending(rng)
+            expected = DoubleDummySolver(trump).solve(hands, leader, 0)
+            self.assertEqual(DoubleDummySolver(trump, endgame=self.table).solve(hands, leader, 0), expected)
+
+    def test_load_builds_missing_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "endgame_table.bin")
+            self.assertIsNone(endgame_table.load_table(1, path, build=False))
+            self.assertFalse(os.path.exists(path))
+
+            table = endgame_table.load_table(1, path)
+            try:
+                self.assertTrue(os.path.exists(path))
+                self.assertEqual(bytes(table._entries), bytes(self.table._entries))
+            finally:
+                table.close()
+                del endgame_table._tables[1, path]
+
+
+class DealStreamTests(SimpleTestCase):
+    def test_deals_only_depend_on_seed_and_index(self):
+        # Deals must stay the same across versions, or seeded runs and traces can't be dealt again
+        self.assertEqual(DealStream(0).deal(0), (11, 12, 2, 23, 8, 6, 22, 13, 10, 16, 14, 0, 5, 20, 17, 15, 1, 18, 21, 3, 7))
+        self.assertEqual(DealStream("abc").deal(123456789), (13, 8, 12, 10, 19, 23, 18, 15, 20, 1, 14, 2, 4, 17, 22, 6, 5, 7, 16, 0, 11))
+
+        stream = DealStream(7)
+        deals = list(stream[:200])
+        self.assertEqual(deals, [DealStream(7).deal(index) for index in range(200)])
+        self.assertNotEqual(deals, list(DealStream(8)[:200]))
+        for deal in deals:
+            self.assertEqual(len(deal), deal_stream.DEAL_SIZE)
+            self.assertEqual(len(set(deal)), deal_stream.DEAL_SIZE)
+            self.assertTrue(all(0 <= card < engine.NUM_CARDS for card in deal))
+
+    def test_slices(self):
+        stream = DealStream(7)[:100]
+        deals = list(stream)
+        self.assertEqual(len(stream), 100)
+        self.assertEqual(list(stream[30:60]), deals[30:60])
+        self.assertEqual(list(stream[30:60][5:10]), deals[35:40])
+        self.assertEqual(stream[-1], deals[-1])
+        self.assertEqual([deal for chunk in stream.chunks(32) for deal in chunk], deals)
+        self.assertEqual([deal for shard in stream.shards(7) for deal in shard], deals)
+        with self.assertRaises(IndexError):
+            stream[100]
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_deal_array(self):
+        stream = DealStream(7)
+        self.assertEqual([tuple(row) for row in stream.deal_array(50, 150).tolist()], list(stream[50:150]))
+
+    def test_pickle(self):
+        stream = DealStream(7)[20:40]
+        copy = pickle.loads(pickle.dumps(stream))
+        self.assertEqual((copy.seed, copy.start, copy.stop), (7, 20, 40))
+        self.assertEqual(list(copy), list(stream))
+
+    def test_corpus(self):
+        stream = DealStream(7)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "deals.bin")
+            corpus = deal_stream.load_corpus(7, 50, path)
+            try:
+                # Deals past the end of the file are generated
+                self.assertEqual(list(corpus[:80]), list(stream[:80]))
+
+                copy = pickle.loads(pickle.dumps(corpus[10:30]))
+                self.assertIsInstance(copy, deal_stream.DealCorpus)
+                self.assertEqual(list(copy), list(stream[10:30]))
+            finally:
+                corpus.close()
+                del deal_stream._corpora[7, 50, path]
+
+
+def run_quietly(function, *args, **kwargs):
+    """
+    Calls function without the report it prints
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+class SimulationTestCase(SimpleTestCase):
+    """
+    Simulations bidding with the live logic, which decides exactly like the compiled policy, so the tests don't
+    build the policy file
+    """
+    def setUp(self):
+        patcher = mock.patch.object(Bot, "BIDDING_POLICY_MODE", "live")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class SimulationStatsTests(SimulationTestCase):
+    def test_merge_of_parts_matches_one_run(self):
+        simulation = MonteCarloSimulation()
+        deals = DealStream(3)[:300]
+        whole = simulation.simulate_deals(len(deals), None, deals=deals, symmetry="dealer")
+
+        for size in (1, 7, 100):
+            merged = None
+            for chunk in deals.chunks(size):
+                stats = simulation.simulate_deals(len(chunk), None, deals=chunk, symmetry="dealer")
+                merged = stats if merged is None else merged.merge(stats)
+            # Counters are exact; the per deal averages only up to rounding
+            self.assertEqual(merged.outcomes, whole.outcomes)
+            self.assertEqual(merged.seat_net_points, whole.seat_net_points)
+            self.assertEqual(merged.calls_round1, whole.calls_round1)
+            self.assertEqual(merged.num_simulations, whole.num_simulations)
+            for key, means in whole.deal_means.items():
+                self.assertEqual(merged.deal_means[key].count, means.count)
+                self.assertAlmostEqual(merged.deal_means[key].mean, means.mean)
+                self.assertAlmostEqual(merged.deal_means[key].m2, means.m2)
+
+    def test_same_stats_for_any_number_of_workers(self):
+        simulation = MonteCarloSimulation()
+        results = [
+            run_quietly(simulation.run_simulation, 2100, workers=workers, seed=3, symmetry="dealer")
+            for workers in (1, 2, 3)
+        ]
+        self.assertEqual(results[0].num_simulations, 2100 * 4)
+        self.assertEqual(results[1], results[0])
+        self.assertEqual(results[2], results[0])
+
+    def test_running_stats_merge(self):
+        rng = random.Random(6)
+        values = [rng.gauss(0, 3) for _ in range(500)]
+        whole = RunningStats()
+        for value in values:
+            whole.add(value)
+
+        merged = RunningStats()
+        for start in range(0, len(values), 64):
+            part = RunningStats()
+            for value in values[start:start + 64]:
+                part.add(value)
+            merged.merge(part)
+        merged.merge(RunningStats())
+
+        self.assertEqual(merged.count, whole.count)
+        self.assertAlmostEqual(merged.mean, whole.mean)
+        self.assertAlmostEqual(merged.variance, whole.variance)
+
+
+class CheckpointTests(SimulationTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "checkpoint.pkl")
+
+    def test_resumed_run_matches_uninterrupted_run(self):
+        simulation = MonteCarloSimulation()
+        expected = run_quietly(simulation.run_simulation, 3500, seed=4)
+
+        # Interrupt the run in its third chunk, after the first two were saved
+        simulate_deals = MonteCarloSimulation.simulate_deals
+        calls = []
+
+        def interrupted(instance, *args, **kwargs):
+            calls.append(1)
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return simulate_deals(instance, *args, **kwargs)
+
+        with mock.patch.object(MonteCarloSimulation, "simulate_deals", interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                run_quietly(simulation.run_simulation, 3500, seed=4, checkpoint_path=self.path, checkpoint_interval=0)
+
+        saved = checkpoint.load_parts(self.path, {"run": "simulation", "num_simulations": 3500, "seed": 4, "start": 0, "symmetry": None})
+        self.assertEqual(saved["simulation"]["position"], 2000)
+
+        resumed = run_quietly(simulation.run_simulation, 3500, seed=4, checkpoint_path=self.path, resume=True)
+        self.assertEqual(resumed, expected)
+
+    def test_checkpoint_of_another_run(self):
+        checkpoint.Checkpoint(self.path, {"run": "simulation", "seed": 1}).save()
+        with self.assertRaises(ValueError):
+            checkpoint.load_parts(self.path, {"run": "simulation", "seed": 2})
+
+    def test_missing_checkpoint(self):
+        self.assertEqual(checkpoint.load_parts(self.path, {"run": "simulation"}), {})
+
+
+class StratifiedSamplingTests(SimpleTestCase):
+    def test_probabilities(self):
+        strata = TrumpCountStrata()
+        self.assertAlmostEqual(sum(strata.probabilities.values()), 1.0)
+
+        counts = {stratum: 0 for stratum in strata.probabilities}
+        for deal in DealStream(9)[:20000]:
+            counts[strata.stratum_of(deal)] += 1
+        for stratum, probability in strata.probabilities.items():
+            se = (probability * (1 - probability) / 20000) ** 0.5
+            self.assertLess(abs(counts[stratum] / 20000 - probability), 5 * se + 1e-4, stratum)
+
+    def test_deals_of_a_stratum(self):
+        rng = random.Random(10)
+        for seat_index in range(4):
+            strata = TrumpCountStrata(seat_index)
+            for stratum in strata.probabilities:
+                for _ in range(20):
+                    deal = strata.deal(stratum, rng)
+                    self.assertEqual(sorted(set(deal)), sorted(deal))
+                    self.assertEqual(len(deal), 21)
+                    self.assertEqual(strata.stratum_of(deal), stratum)
+
+    def test_allocate(self):
+        probabilities = TrumpCountStrata().probabilities
+        for num_deals in (24, 25, 30, 100, 1000, 12345):
+            allocation = allocate(probabilities, num_deals)
+            self.assertEqual(sum(allocation.values()), num_deals)
+            self.assertGreaterEqual(min(allocation.values()), 2)
+
+        # Rare strata get at least min_share of the deals
+        allocation = allocate(probabilities, 10000, min_share=0.05)
+        total_share = sum(max(probability, 0.05) for probability in probabilities.values())
+        for stratum in probabilities:
+            self.assertGreaterEqual(allocation[stratum], int(10000 * 0.05 / total_share))
+
+        with self.assertRaises(ValueError):
+            allocate(probabilities, 23)
+
+
+class ThresholdSweepTests(SimulationTestCase):
+    def test_sweep_matches_runs_at_each_threshold(self):
+        simulation = MonteCarloSimulation()
+        sweep = simulation.record_threshold_sweep(500, position="first", seed=11)
+        deals = DealStream(11)[:500]
+
+        for threshold in (sweep.current, 0.25, 0.4):
+            thresholds = copy.deepcopy(Bot.BID_THRESHOLDS)
+            thresholds['round1']['first']['normal'] = threshold
+            swept_bot = type("SweptBot", (Bot,), {"BID_THRESHOLDS": thresholds})
+            players = [
+                (swept_bot if name == "Bot 1" else Bot)(name, partner=partner, team=team)
+                for name, partner, team in (("Bot 1", "Bot 3", 1), ("Bot 2", "Bot 4", 2), ("Bot 3", "Bot 1", 1), ("Bot 4", "Bot 2", 2))
+            ]
+            stats = simulation.simulate_deals(len(deals), None, deals=deals, players=players)
+
+            result = sweep.at(threshold)
+            self.assertAlmostEqual(result["ev"], (stats.total_points[1] - stats.total_points[2]) / len(deals))
+            self.assertAlmostEqual(result["call_rate"], stats.calls_round1["Bot 1"] / len(deals))
+
+    def test_at(self):
+        # Deals with critical values 0.3, 0.1 and 0.2 that gain 3, -2 and -2 points when called, and one worth 5 points
+        # that the threshold doesn't change
+        sweep = ThresholdSweep("first", "normal", 0.2, 4, 5, [(0.3, 3, 0, False), (0.1, 0, 2, True), (0.2, -1, 1, False)])
+        self.assertEqual(sweep.at(0.05), {"threshold": 0.05, "call_rate": 0.75, "ev": 7 / 4, "loner_rate": 0.25})
+        self.assertEqual(sweep.at(0.15), {"threshold": 0.15, "call_rate": 0.5, "ev": 9 / 4, "loner_rate": 0.0})
+        self.assertEqual(sweep.at(0.5), {"threshold": 0.5, "call_rate": 0.0, "ev": 8 / 4, "loner_rate": 0.0})
+
+
+class HandSnapshotTests(SimulationTestCase):
+    def play_deal(self, index):
+        """
+        Plays deal index of DealStream(12), returning (the snapshot of every card played, team 1 net points)
+        """
+        snapshots = []
+        stats = MonteCarloSimulation().simulate_deals(1, None, deals=[DealStream(12).deal(index)], snapshots=snapshots)
+        return snapshots, stats.total_points[1] - stats.total_points[2]
+
+    def test_play_out_matches_the_hand(self):
+        for index in range(20):
+            snapshots, net_points = self.play_deal(index)
+            if not snapshots:
+                # Passed out
+                continue
+            for snapshot in snapshots:
+                self.assertEqual(snapshot.play_out().net_points(1), net_points)
+
+    def test_play(self):
+        snapshots, _ = self.play_deal(0)
+        snapshot = snapshots[0]
+        hand = snapshot.hands[snapshot.to_play.name]
+        card = snapshot.legal_cards()[0]
+
+        after = snapshot.play(card)
+        self.assertNotIn(card, after.hands[snapshot.to_play.name])
+        # Snapshots never change
+        self.assertEqual(snapshot.hands[snapshot.to_play.name], hand)
+        self.assertEqual(len(snapshot.state.trick), 0)
+        self.assertEqual(len(after.state.trick), 1)
+
+        with self.assertRaises(ValueError):
+            snapshot.play(next(card for card in range(engine.NUM_CARDS) if card not in hand))
+        if len(after.legal_cards()) < len(after.hands[after.to_play.name]):
+            illegal = next(card for card in after.hands[after.to_play.name] if card not in after.legal_cards())
+            with self.assertRaises(ValueError):
+                after.play(illegal)
+
+    def test_branch(self):
+        snapshots, net_points = self.play_deal(0)
+        snapshot = snapshots[5]
+        name = snapshot.to_play.name
+        played_card, = set(snapshot.hands[name]) - set(snapshots[6].hands[name])
+        team = snapshot.to_play.team
+
+        # On the actual hands every rollout is the same
+        results = branch(snapshot, rollouts=3, resample=False)
+        self.assertEqual(list(results), snapshot.legal_cards())
+        for card, stats in results.items():
+            self.assertEqual(stats.count, 3)
+            self.assertEqual(stats.variance, 0.0)
+        self.assertEqual(results[played_card].mean, net_points if team == 1 else -net_points)
+
+        results = branch(snapshot, rollouts=20, rng=random.Random(13))
+        self.assertEqual(list(results), snapshot.legal_cards())
+        self.assertTrue(all(stats.count == 20 for stats in results.values()))
+
+
+class PIMCSamplingTests(SimulationTestCase):
+    def test_layouts_agree_with_what_the_seat_saw(self):
+        rng = random.Random(15)
+        cases = set()
+        for index in range(30):
+            snapshots = []
+            MonteCarloSimulation().simulate_deals(1, None, deals=[DealStream(12).deal(index)], snapshots=snapshots)
+            for snapshot in snapshots[::3]:
+                bot = snapshot.to_play
+                bidding = snapshot.state.bidding
+                hand_mask = engine.mask_of(snapshot.hands[bot.name])
+                observation = pimc.observe(
+                    bot, hand_mask, snapshot.state, snapshot.trump_maker, snapshot.going_alone, rng
+                )
+                seats = observation.seats
+                actual = [0] * 4
+                for player in snapshot.players:
+                    actual[seats[player.name]] = engine.mask_of(snapshot.hands.get(player.name, ()))
+                dealer = seats[bidding.dealer.name]
+                up_card = engine.BITS[bidding.up_card]
+
+                for _ in range(10):
+                    hands = observation.deal(hand_mask, rng)
+                    self.assertEqual(hands[0], hand_mask)
+                    dealt = 0
+                    for seat in (1, 2, 3):
+                        self.assertEqual(bin(hands[seat]).count("1"), observation.counts[seat])
+                        if seat != observation.sitting_out:
+                            self.assertEqual(observation.counts[seat], bin(actual[seat]).count("1"))
+                        self.assertFalse(hands[seat] & observation.voids[seat])
+                        self.assertFalse(hands[seat] & dealt)
+                        dealt |= hands[seat]
+                    self.assertEqual(dealt & ~observation.unseen, 0)
+
+                    if bidding.trump_round == "2":
+                        # Turned down: in the kitty
+                        self.assertFalse(dealt & up_card)
+                        cases.add("turned down")
+                    elif dealer != 0 and actual[dealer] & up_card:
+                        # Picked up and not played yet: in the dealer's hand
+                        self.assertTrue(hands[dealer] & up_card)
+                        cases.add("picked up")
+                    if dealer == 0 and bidding.discard is not None:
+                        self.assertFalse(dealt & engine.BITS[bidding.discard])
+                        cases.add("discard")
+        self.assertEqual(cases, {"turned down", "picked up", "discard"})
+
+
+class EndgamePlayTests(SimulationTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.table = endgame_table.EndgameTable(endgame_table.compile_table(1), 1, endgame_table.table_digest(1))
+
+    def positions(self):
+        """
+        Snapshots of the decisions with two cards left in the hands of DealStream(12)
+        """
+        positions = []
+        for index in range(10):
+            snapshots = []
+            MonteCarloSimulation().simulate_deals(1, None, deals=[DealStream(12).deal(index)], snapshots=snapshots)
+            positions.extend(snapshot for snapshot in snapshots if len(snapshot.hands[snapshot.to_play.name]) == 2)
+        return positions
+
+    def choose(self, snapshot):
+        bot = snapshot.to_play
+        hand = list(snapshot.hands[bot.name])
+        tricks_won = snapshot.state.tricks_won(bot.team)
+        return bot.determine_best_card_id(hand, snapshot.state, snapshot.trump_maker, snapshot.going_alone, tricks_won)
+
+    def test_sampling_is_seeded_from_the_position(self):
+        positions = self.positions()
+        with mock.patch.object(Bot, "ENDGAME_CARDS", 1), \
+                mock.patch("bot_logic.endgame_table.load_table", return_value=self.table), \
+                mock.patch("bot_logic.pimc._random", None), \
+                mock.patch("bot_logic.pimc.choose_card", wraps=bot_logic.pimc.choose_card) as choose_card:
+            for snapshot in positions:
+                self.assertEqual(self.choose(snapshot), self.choose(snapshot))
+        self.assertEqual(choose_card.call_count, 2 * len(positions))
+
+    def test_heuristic_without_the_table(self):
+        with mock.patch.object(Bot, "ENDGAME_CARDS", 1), mock.patch.object(Bot, "BUILD_TABLES", False), \
+                mock.patch("bot_logic.endgame_table._map_table", return_value=None), \
+                mock.patch("bot_logic.endgame_table.build_table", side_effect=AssertionError("built in a request")), \
+                mock.patch("bot_logic.pimc.choose_card", side_effect=AssertionError("sampled without the table")):
+            for snapshot in self.positions():
+                bot = snapshot.to_play
+                hand = list(snapshot.hands[bot.name])
+                tricks_won = snapshot.state.tricks_won(bot.team)
+                self.assertEqual(
+                    self.choose(snapshot),
+                    bot._determine_best_card_id(
+                        hand, snapshot.state, snapshot.trump_maker, snapshot.going_alone, tricks_won
+                    ),
+                )
+
+
+class ISMCTSTests(SimulationTestCase):
+    def decisions(self, index):
+        """
+        Snapshots of the card play decisions of the hand of deal index of DealStream(12), by player name
+        """
+        snapshots = []
+        MonteCarloSimulation().simulate_deals(1, None, deals=[DealStream(12).deal(index)], snapshots=snapshots)
+        decisions = {}
+        for snapshot in snapshots:
+            decisions.setdefault(snapshot.to_play.name, []).append(snapshot)
+        return decisions
+
+    def choose(self, search, snapshot, iterations, rng):
+        bot = snapshot.to_play
+        return search.choose_card(
+            bot, list(snapshot.hands[bot.name]), snapshot.state, snapshot.trump_maker, snapshot.going_alone,
+            iterations, rng=rng
+        )
+
+    @staticmethod
+    def tree_size(pool, node):
+        return 1 + sum(ISMCTSTests.tree_size(pool, child) for child in pool.children(node))
+
+    def test_pool_capacity(self):
+        pool = ismcts.NodePool(3)
+        root = pool.allocate(ismcts.NO_NODE, -1, 0)
+        first = pool.allocate(root, 0, 0)
+        second = pool.allocate(root, 1, 1)
+        self.assertTrue(pool.full)
+        self.assertEqual(pool.allocate(root, 2, 2), ismcts.NO_NODE)
+        self.assertEqual(list(pool.children(root)), [second, first])
+        pool.release(root)
+        self.assertEqual(pool.in_use, 0)
+
+        search = ismcts.ISMCTS(max_nodes=40)
+        snapshot = next(
+            snapshot for snapshots in self.decisions(0).values() for snapshot in snapshots
+            if len(snapshot.legal_cards()) > 1
+        )
+        self.choose(search, snapshot, 300, random.Random(18))
+        self.assertEqual(search.pool.in_use, 40)
+        self.assertEqual(self.tree_size(search.pool, search.root), 40)
+
+    def test_root_moves_down_the_cards_played(self):
+        rng = random.Random(19)
+        moves = 0
+        for index in range(6):
+            for snapshots in self.decisions(index).values():
+                for before, after in zip(snapshots, snapshots[1:]):
+                    if len(before.legal_cards()) < 2 or len(after.legal_cards()) < 2:
+                        continue
+                    search = ismcts.ISMCTS(max_nodes=20000)
+                    self.choose(search, before, 500, rng)
+                    pool = search.pool
+
+                    # Node of the cards played since the first decision, if the search reached it
+                    played = [card for trick in after.state.tricks + [after.state.trick] for card, _ in trick]
+                    node = search.root
+                    for card in played[len(search._history):]:
+                        node = pool.child(node, card)
+                        if node == ismcts.NO_NODE:
+                            break
+                    if node == ismcts.NO_NODE:
+                        continue
+                    visits = {pool.card[child]: pool.visits[child] for child in pool.children(node)}
+                    kept = self.tree_size(pool, node)
+
+                    # The tree below that node is kept, everything else is freed
+                    self.choose(search, after, 1, rng)
+                    self.assertEqual(search.root, node)
+                    self.assertIn(pool.in_use, (kept, kept + 1))
+                    self.assertEqual(pool.in_use, self.tree_size(pool, node))
+                    for child in pool.children(node):
+                        self.assertGreaterEqual(pool.visits[child], visits.get(pool.card[child], 0))
+                    if len(before.state.tricks) < len(after.state.tricks):
+                        moves += 1
+        # The root was moved from one trick to the next
+        self.assertGreater(moves, 0)
+
+
+class HandStrengthTableTests(SimpleTestCase):
+    def test_scores_match_evaluate_hand(self):
+        bot = BotLogic()
+        rng = random.Random(14)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "hand_strength.bin")
+            hand_table.build_table(BotLogic, path)
+            table = hand_table._map_table(path, hand_table.table_digest(BotLogic))
+            try:
+                for _ in range(3000):
+                    hand = rng.sample(range(engine.NUM_CARDS), 5)
+                    for trump in range(4):
+                        score = table.score(hand, trump)
+                        if bot.hand_score_order_dependent(hand, trump):
+                            self.assertIsNone(score)
+                        else:
+                            # Any order of the hand scores the same
+                            self.assertEqual(score, bot.evaluate_hand_id(hand, trump))
+                            self.assertEqual(score, bot.evaluate_hand_id(sorted(hand), trump))
+            finally:
+                table.close()
+
+    def test_scores_without_the_table(self):
+        bot = BotLogic()
+        rng = random.Random(17)
+        with mock.patch.dict(hand_table._tables, clear=True), mock.patch.object(BotLogic, "BUILD_TABLES", False), \
+                mock.patch.object(hand_table, "_map_table", return_value=None), \
+                mock.patch.object(hand_table, "build_table", side_effect=AssertionError("built in a request")):
+            for _ in range(100):
+                hand = rng.sample(range(engine.NUM_CARDS), 5)
+                for trump in range(4):
+                    self.assertEqual(bot.get_hand_score(hand, trump), bot.evaluate_hand_id(hand, trump))
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_batch_evaluator(self):
+        from .batch_evaluator import evaluate_hands
+
+        bot = BotLogic()
+        rng = random.Random(15)
+        hands = [rng.sample(range(engine.NUM_CARDS), 5) for _ in range(2000)]
+        scores = evaluate_hands(hands)
+        for hand, hand_scores in zip(hands, scores.tolist()):
+            self.assertEqual(hand_scores, [bot.evaluate_hand_id(hand, trump) for trump in range(4)])
+
+
+class BiddingPolicyTests(SimpleTestCase):
+    def test_policy_matches_determine_trump(self):
+        rng = random.Random(16)
+        hands = [rng.sample(range(engine.NUM_CARDS), 5) for _ in range(200)]
+        # Only the hands checked are compiled, with the up card in every suit
+        canonical_hands = {
+            tuple(sorted(engine.CANONICAL_CARDS[suit][card] for card in hand)) for hand in hands for suit in range(4)
+        }
+        entries = bidding_policy.compile_policy(BotLogic, canonical_hands)
+        policy = bidding_policy.BiddingPolicy(entries, bidding_policy.policy_digest(BotLogic))
+
+        self.assertEqual(bidding_policy.check_policy(BotLogic, hands=hands, policy=policy), [])
+        decisions = [
+            policy.decision(hand, up_card, position, trump_round)
+            for hand in hands
+            for up_card in range(engine.NUM_CARDS) if up_card not in hand
+            for position in bidding_policy.POSITIONS
+            for trump_round in ("1", "2")
+        ]
+        # Order dependent decisions aren't in the policy, but nearly every other one is
+        self.assertGreater(sum(decision is not None for decision in decisions), 0.9 * len(decisions))
+        self.assertTrue(any(decision is not None and decision[0] >= 0 for decision in decisions))
+
+    def test_load_without_building(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bidding_policy.bin")
+            with mock.patch.object(bidding_policy, "build_policy", side_effect=AssertionError("compiled")):
+                self.assertIsNone(bidding_policy.load_policy(BotLogic, path, build=False))
+            self.assertFalse(os.path.exists(path))
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class BatchSimulatorTests(SimulationTestCase):
+    def test_batch_matches_scalar_simulation(self):
+        # As run_batch_simulation imports it, so the stats are of the same class as the scalar simulation's
+        import batch_simulator
+
+        num_deals = 400
+        stream = DealStream(21)
+        decks = stream.deal_array(0, num_deals)
+        hands, up_cards = decks[:, :20].reshape(-1, 4, 5), decks[:, 20]
+
+        # The policy of the hands dealt only (with the up card in hearts), compared with the live bidding of
+        # the scalar simulation
+        canonical_hands = {
+            tuple(sorted(engine.CANONICAL_CARDS[engine.CARD_SUITS[up_card]][card] for card in hand))
+            for deal_hands, up_card in zip(hands.tolist(), up_cards.tolist())
+            for hand in deal_hands
+        }
+        policy = bidding_policy.BiddingPolicy(
+            bidding_policy.compile_policy(Bot, canonical_hands), bidding_policy.policy_digest(Bot)
+        )
+        with mock.patch.object(batch_simulator.bidding_policy, "load_policy", return_value=policy):
+            result = batch_simulator.play_batch(hands, up_cards, Bot)
+            stats = batch_simulator.simulate_batch(num_deals, 21, Bot)
+
+        simulation = MonteCarloSimulation()
+        self.assertEqual(stats, simulation.simulate_deals(num_deals, None, deals=stream[:num_deals]))
+        for index in range(num_deals):
+            deal_stats = simulation.simulate_deals(1, None, deals=[stream.deal(index)])
+            points = result["points"][index].tolist()
+            self.assertEqual([deal_stats.total_points[1], deal_stats.total_points[2]], points)
+            if result["maker"][index] >= 0:
+                calls = deal_stats.calls_round1 if result["round"][index] == 1 else deal_stats.calls_round2
+                self.assertEqual(calls[SEAT_NAMES[result["maker"][index]]], 1)
+
+
+class DealSymmetryTests(SimpleTestCase):
+    def test_equivalent_deals(self):
+        deal = DealStream(22).deal(0)
+        for symmetry, count in (("dealer", 4), ("suits", 8), ("full", 32)):
+            with self.subTest(symmetry=symmetry):
+                deals = deal_symmetry.equivalent_deals(deal, symmetry)
+                self.assertEqual(len(deals), count)
+                self.assertEqual(deals[0], list(deal))
+                self.assertEqual(len({tuple(equivalent) for equivalent in deals}), count)
+                for equivalent in deals:
+                    self.assertEqual(len(set(equivalent)), 21)
+
+        # Seat s is dealt the hand of seat s - rotation, the up card stays last
+        for rotation, rotated in enumerate(deal_symmetry.equivalent_deals(deal, "dealer")):
+            for seat in range(4):
+                previous = (seat - rotation) % 4
+                self.assertEqual(rotated[seat * 5:seat * 5 + 5], list(deal[previous * 5:previous * 5 + 5]))
+            self.assertEqual(rotated[20], deal[20])
+
+        with self.assertRaises(ValueError):
+            deal_symmetry.equivalent_deals(deal, "seats")
+
+    def test_suit_permutations_keep_ranks(self):
+        self.assertEqual(len(set(deal_symmetry.SUIT_PERMUTATIONS)), 8)
+        for suits, cards in zip(deal_symmetry.SUIT_PERMUTATIONS, deal_symmetry.CARD_PERMUTATIONS):
+            self.assertEqual(sorted(cards), list(range(engine.NUM_CARDS)))
+            for trump in range(4):
+                new_trump = suits[trump]
+                # The bowers stay the bowers
+                right_bower = engine.CARD_IDS["J", engine.SUITS[trump]]
+                left_bower = engine.CARD_IDS["J", engine.SUITS[engine.SUIT_PAIRS[trump]]]
+                self.assertEqual(cards[right_bower], engine.CARD_IDS["J", engine.SUITS[new_trump]])
+                self.assertEqual(cards[left_bower], engine.CARD_IDS["J", engine.SUITS[engine.SUIT_PAIRS[new_trump]]])
+
+                for lead in range(4):
+                    for card in range(engine.NUM_CARDS):
+                        self.assertEqual(
+                            engine.RANK_TABLES[new_trump][suits[lead]][cards[card]],
+                            engine.RANK_TABLES[trump][lead][card],
+                        )
+                for card in range(engine.NUM_CARDS):
+                    self.assertEqual(
+                        engine.RANK_TABLES[new_trump][engine.NO_LEAD][cards[card]],
+                        engine.RANK_TABLES[trump][engine.NO_LEAD][card],
+                    )
+
+
+class ForcedEVTests(SimulationTestCase):
+    SCENARIOS = [("R1 pass", 1, "pass"), ("R1 order_up", 1, "order_up"), ("R2 next", 2, "next")]
+
+    def forced_ev(self, forced_round, forced_action, num_simulations, **kwargs):
+        return MonteCarloSimulation().simulate_forced_ev(
+            num_simulations=num_simulations, controlled_bot_name="Bot 2", forced_round=forced_round,
+            forced_action=forced_action, seed=23, **kwargs
+        )
+
+    def test_paired_matches_separate_runs(self):
+        rows = MonteCarloSimulation().simulate_forced_ev_paired(
+            num_simulations=300, controlled_bot_name="Bot 2", scenarios=self.SCENARIOS, seed=23
+        )
+        self.assertEqual(sorted(row["scenario"] for row in rows), sorted(label for label, _, _ in self.SCENARIOS))
+        self.assertEqual([row["ev"] for row in rows], sorted((row["ev"] for row in rows), reverse=True))
+
+        # Every scenario is played on the same deals as a run of its own
+        by_label = {row["scenario"]: row for row in rows}
+        for label, forced_round, forced_action in self.SCENARIOS:
+            result = self.forced_ev(forced_round, forced_action, 300)
+            row = by_label[label]
+            self.assertEqual(row["applied"], result["applied"])
+            self.assertAlmostEqual(row["ev"], result["ev"])
+            self.assertAlmostEqual(row["se"], result["se"])
+            self.assertEqual(row["deals"], 300)
+
+        best = rows[0]
+        self.assertEqual((best["diff"], best["diff_se"], best["paired"]), (0.0, 0.0, best["applied"]))
+        for row in rows[1:]:
+            self.assertGreater(row["paired"], 0)
+            self.assertLessEqual(row["paired"], min(row["applied"], best["applied"]))
+
+        # The round 1 scenarios apply to the same deals, so their difference is the difference of their EVs
+        best, other = MonteCarloSimulation().simulate_forced_ev_paired(
+            num_simulations=300, controlled_bot_name="Bot 2", scenarios=self.SCENARIOS[:2], seed=23
+        )
+        self.assertEqual(other["paired"], other["applied"])
+        self.assertEqual(other["applied"], best["applied"])
+        self.assertAlmostEqual(other["diff"], other["ev"] - best["ev"])
+
+    def test_stops_at_target_ci_width(self):
+        full = self.forced_ev(1, "order_up", 400)
+        self.assertEqual(full["deals"], 400)
+
+        # Wide enough after the first batch
+        result = self.forced_ev(1, "order_up", 400, target_ci_width=100, batch_size=50)
+        self.assertEqual(result["deals"], 50)
+
+        # Stops after the first batch that reaches the width: the same as a run of that many deals
+        z = z_score(0.95)
+        target = 2 * z * full["se"] * (400 / 150) ** 0.5
+        result = self.forced_ev(1, "order_up", 400, target_ci_width=target, batch_size=50)
+        self.assertEqual(result["deals"] % 50, 0)
+        self.assertLess(result["deals"], 400)
+        expected = self.forced_ev(1, "order_up", result["deals"])
+        self.assertEqual(result, {**expected, "requested": 400})
+        self.assertLess(2 * z * result["se"], target)
+        previous = self.forced_ev(1, "order_up", result["deals"] - 50)
+        self.assertGreaterEqual(2 * z * previous["se"], target)
+
+        # Never stops before the target is reached
+        self.assertEqual(self.forced_ev(1, "order_up", 400, target_ci_width=1e-9, batch_size=50)["deals"], 400)
+
+    def test_paired_stops_at_target_ci_width(self):
+        simulation = MonteCarloSimulation()
+        rows = simulation.simulate_forced_ev_paired(
+            num_simulations=400, controlled_bot_name="Bot 2", scenarios=self.SCENARIOS[:2], seed=23,
+            target_ci_width=100, batch_size=50
+        )
+        self.assertTrue(all(row["deals"] == 50 for row in rows))
+
+        # Stops once the interval on the difference between the top two is narrow enough
+        full = simulation.simulate_forced_ev_paired(
+            num_simulations=400, controlled_bot_name="Bot 2", scenarios=self.SCENARIOS[:2], seed=23
+        )
+        target = 2 * z_score(0.95) * full[1]["diff_se"] * (400 / 150) ** 0.5
+        rows = simulation.simulate_forced_ev_paired(
+            num_simulations=400, controlled_bot_name="Bot 2", scenarios=self.SCENARIOS[:2], seed=23,
+            target_ci_width=target, batch_size=50
+        )
+        deals = rows[0]["deals"]
+        self.assertEqual(deals % 50, 0)
+        self.assertLess(deals, 400)
+        self.assertLess(2 * z_score(0.95) * rows[1]["diff_se"], target)
+        expected = simulation.simulate_forced_ev_paired(
+            num_simulations=deals, controlled_bot_name="Bot 2", scenarios=self.SCENARIOS[:2], seed=23
+        )
+        self.assertEqual(rows, [{**row, "requested": 400} for row in expected])
+
+        rows = simulation.simulate_forced_ev_paired(
+            num_simulations=400, controlled_bot_name="Bot 2", scenarios=self.SCENARIOS[:2], seed=23,
+            target_ci_width=1e-9, batch_size=50
+        )
+        self.assertTrue(all(row["deals"] == 400 for row in rows))
+
+
+class ParameterSearchTests(SimulationTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "parameter_cache.jsonl")
+
+    def test_scores_are_cached(self):
+        import parameter_search
+
+        current = parameter_search.current_parameters()
+        name = parameter_search.parameter_names()[0]
+        moved = {**current, name: round(current[name] + 0.1, 9)}
+
+        search = parameter_search.ParameterSearch(num_deals=20, seed=24, cache_path=self.path)
+        scores = search.score([current, moved, dict(current)])
+        # The current parameters against themselves, on the same deals with the teams swapped
+        self.assertEqual(scores[0], 0.0)
+        self.assertEqual(scores[2], scores[0])
+        self.assertEqual(search.evaluated, 2)
+
+        with mock.patch.object(parameter_search, "_score_task", side_effect=AssertionError("played again")):
+            self.assertEqual(search.score([moved, current]), [scores[1], scores[0]])
+
+            # Another search on the same deals reads the cache file, even after a line cut short
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write('{"seed": 24, "deals"')
+            search = parameter_search.ParameterSearch(num_deals=20, seed=24, cache_path=self.path)
+            self.assertEqual(search.score([moved, current]), [scores[1], scores[0]])
+            self.assertEqual(search.evaluated, 0)
+
+        # Scores of other deals aren't reused
+        for num_deals, seed in ((21, 24), (20, 25)):
+            search = parameter_search.ParameterSearch(num_deals=num_deals, seed=seed, cache_path=self.path)
+            self.assertEqual(search.cache, {})
+
+
+class MatchEquityTests(SimpleTestCase):
+    # (dealing team points, other team points): probability, with outcomes that overshoot 10 points
+    DISTRIBUTION = {(1, 0): 0.45, (2, 0): 0.15, (4, 0): 0.05, (0, 2): 0.3, (0, 4): 0.05}
+
+    def table(self, distribution, points_to_win=match_equity.POINTS_TO_WIN):
+        entries = match_equity.compile_table(distribution, points_to_win)
+        return match_equity.MatchEquityTable(entries, points_to_win, None)
+
+    def test_matches_recursion_over_hands(self):
+        table = self.table(self.DISTRIBUTION)
+        equities = {}
+
+        def equity(team1, team2, dealer):
+            if team1 >= 10:
+                return 1.0
+            if team2 >= 10:
+                return 0.0
+            if (team1, team2, dealer) not in equities:
+                total = 0.0
+                for (dealing, other), probability in self.DISTRIBUTION.items():
+                    points1, points2 = (other, dealing) if dealer % 2 else (dealing, other)
+                    total += probability * equity(team1 + points1, team2 + points2, (dealer + 1) % 4)
+                equities[team1, team2, dealer] = total
+            return equities[team1, team2, dealer]
+
+        for team1 in range(10):
+            for team2 in range(10):
+                for dealer in range(4):
+                    self.assertAlmostEqual(table.equity(team1, team2, dealer), equity(team1, team2, dealer))
+                    # The same state with the teams swapped
+                    self.assertAlmostEqual(
+                        table.equity(team1, team2, dealer) + table.equity(team2, team1, (dealer + 1) % 4), 1.0
+                    )
+
+    def test_boundary_states(self):
+        table = self.table(self.DISTRIBUTION)
+        for points in range(10):
+            for dealer in range(4):
+                self.assertEqual(table.equity(10, points, dealer), 1.0)
+                self.assertEqual(table.equity(13, points, dealer), 1.0)
+                self.assertEqual(table.equity(points, 10, dealer), 0.0)
+                self.assertEqual(table.equity(points, 13, dealer), 0.0)
+
+        # At 9-9 the next hand decides the game: the dealing team wins it unless the other team scores
+        win = sum(probability for (dealing, _), probability in self.DISTRIBUTION.items() if dealing)
+        self.assertAlmostEqual(table.equity(9, 9, 0), win)
+        self.assertAlmostEqual(table.equity(9, 9, 1), 1 - win)
+        # One point is enough at 9
+        self.assertEqual(table.expected_equity(9, 0, 0, {(1, 0): 1.0}), 1.0)
+        self.assertEqual(table.expected_equity(0, 9, 0, {(0, 1): 1.0}), 0.0)
+
+        # Only the dealing team scores, one point a hand: the first team to deal at 9 points wins
+        table = self.table({(1, 0): 1.0})
+        self.assertEqual(table.equity(9, 9, 0), 1.0)
+        self.assertEqual(table.equity(9, 9, 1), 0.0)
+        self.assertEqual(table.equity(0, 0, 0), 1.0)
+        self.assertEqual(table.equity(0, 0, 1), 0.0)
+
+        with self.assertRaises(ValueError):
+            match_equity.compile_table({(1, 0): 0.5, (0, 0): 0.5})
+
+
+class TournamentTests(SimulationTestCase):
+    def test_strategy_against_itself(self):
+        import tournament
+
+        deals = DealStream(25)[:40]
+        for strategy in (Bot, tournament.RandomCardBot):
+            for symmetry in (None, "dealer"):
+                with self.subTest(strategy=strategy.__name__, symmetry=symmetry):
+                    results = tournament.play_duplicate(strategy, strategy, deals, symmetry)
+                    self.assertEqual(results.count, 40)
+                    self.assertEqual(results.mean, 0.0)
+                    self.assertEqual(results.variance, 0.0)
+
+        summary = tournament.run_tournament(Bot, Bot, num_deals=40, seed=25, report=False)
+        self.assertEqual((summary["mean"], summary["ci"], summary["deals"]), (0.0, (0.0, 0.0), 40))
+
+    def test_swapping_the_strategies(self):
+        import tournament
+
+        deals = DealStream(26)[:40]
+        results = tournament.play_duplicate(Bot, tournament.RandomCardBot, deals)
+        swapped = tournament.play_duplicate(tournament.RandomCardBot, Bot, deals)
+        self.assertNotEqual(results.mean, 0.0)
+        self.assertAlmostEqual(swapped.mean, -results.mean)
+        self.assertAlmostEqual(swapped.variance, results.variance)
@@ -0,0 +1,78 @@
+"""
+What-if analysis of one round 1 bidding threshold from a single simulation pass.
+
+Whether a seat calls (or goes alone) in round 1 depends on the threshold only through one number per deal,
+the critical value: the seat calls when the threshold is at most that value (its hand score, less the margin
+its hand has for the next suit in first seat, see BotLogic.determine_trump_id). Every other decision of the
+deal is the same whatever the threshold, so a recording pass (MonteCarloSimulation.record_threshold_sweep)
+plays each deal the seat gets to bid on both ways once and keeps (critical value, net points calling, net points
+passing). With the deals sorted by critical value and cumulative sums of the gains, the call rate, EV and loner
+rate at any threshold are a binary search and two lookups (ThresholdSweep.at).
+
+Only round 1 thresholds ('normal' and 'loner') can be swept: a round 2 threshold also decides between suits.
+"""
+from bisect import bisect_left
+from itertools import accumulate
+
+
+class ThresholdSweep:
+    """
+    Recorded outcomes for the threshold BID_THRESHOLDS['round1'][position][kind] (kind is 'normal' or 'loner').
+
+    num_deals is the number of deals of the pass and base_net the net points of the seat's team over the deals its
+    decision did not matter in. records are (critical value, net points if the seat calls (goes alone for a
+    'loner' sweep), net points otherwise, whether the seat goes alone when it calls) for the other deals.
+    """
+    def __init__(self, position, kind, current, num_deals, base_net, records):
+        self.position = position
+        self.kind = kind
+        self.current = current
+        self.num_deals = num_deals
+        self.base_net = base_net
+
+        records = sorted(records, key=lambda record: record[0])
+        self.critical = [record[0] for record in records]
+        # Sums over the deals from index i on (the ones called at a threshold up to critical[i]), one extra 0 at the end
+        self._gains = list(accumulate(reversed([call - other for _, call, other, _ in records]), initial=0))[::-1]
+        self._loners = list(accumulate(reversed([alone for _, _, _, alone in records]), initial=0))[::-1]
+        self._pass_net = base_net + sum(other for _, _, other, _ in records)
+
+    def at(self, threshold):
+        """
+        Returns {"threshold", "call_rate", "ev", "loner_rate"} per deal of the pass with the threshold changed:
+        the rate of the seat's calls (going alone for a 'loner' sweep) it changes, the net points of the seat's team
+        and the rate the seat goes alone on those calls
+        """
+        start = bisect_left(self.critical, threshold)
+        num_deals = self.num_deals
+        return {
+            "threshold": threshold,
+            "call_rate": (len(self.critical) - start) / num_deals,
+            "ev": (self._pass_net + self._gains[start]) / num_deals,
+            "loner_rate": self._loners[start] / num_deals,
+        }
+
+    def sweep(self, thresholds):
+        """
+        at() for every threshold of a grid
+        """
+        return [self.at(threshold) for threshold in thresholds]
+
+    def grid(self, low, high, steps):
+        """
+        sweep() over steps evenly spaced thresholds from low to high
+        """
+        return self.sweep([low + (high - low) * i / (steps - 1) for i in range(steps)])
+
+    def print_table(self, rows):
+        """
+        Prints the rows of sweep(), marking the current threshold's row
+        """
+        print(f"round1 / {self.position} / {self.kind} over {self.num_deals} deals (current {self.current}):")
+        print(f"{'Threshold':>10} {'Call rate':>10} {'EV':>8} {'Loner rate':>11}")
+        for row in rows:
+            marker = " *" if abs(row["threshold"] - self.current) < 1e-9 else ""
+            print(
+                f"{row['threshold']:>10.4f} {row['call_rate'] * 100:>9.2f}% {row['ev']:>8.4f} "
+                f"{row['loner_rate'] * 100:>10.2f}%{marker}"
+            )
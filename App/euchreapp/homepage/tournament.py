@@ -0,0 +1,121 @@
+"""
+Duplicate format tournaments between two bot strategies.
+
+Every deal is played twice with the same cards, once with strategy A holding team 1's seats and once with it
+holding team 2's, so each strategy plays both sides of every deal and the luck of the cards cancels out of the
+difference: a deal's result is A's net points averaged over the two tables. With a symmetry (see deal_symmetry)
+each deal is also played as its equivalent deals, every one of them in duplicate. Deals are the consecutive
+deals of a DealStream, split into chunks that run on a process pool, so results only depend on the seed.
+
+Strategies are Bot subclasses (classes built with a name, partner and team, like bot_simulations.Bot), e.g. a
+subclass with another choose_lead_card_id, or RandomCardBot for a baseline. They must be defined at module
+level to be sent to worker processes.
+
+Run this file for the current bots against the random baseline: python tournament.py [deals] [workers]
+"""
+import random
+
+import card_engine as engine
+from bot_simulations import SIMULATION_CHUNK_SIZE, Bot, MonteCarloSimulation
+from deal_stream import DealStream
+from deal_symmetry import equivalent_deals
+from simulation_stats import RunningStats, z_score
+
+
+# (name, partner, team) of the seats, Bot 4 dealing
+_SEATS = (("Bot 1", "Bot 3", 1), ("Bot 2", "Bot 4", 2), ("Bot 3", "Bot 1", 1), ("Bot 4", "Bot 2", 2))
+
+
+class RandomCardBot(Bot):
+    """
+    Baseline that bids like Bot and plays a random legal card. The card only depends on the position, so a
+    deal is played the same way in every process
+    """
+    def determine_best_card_id(self, hand, state, trump_caller, going_alone, tricks_won):
+        lead_card = state.trick[0][0] if state.trick else -1
+        legal = engine.cards_in(engine.legal_moves(engine.mask_of(hand), state.trump, lead_card))
+        position = (self.name, sorted(hand), state.seen, [card for card, _ in state.trick])
+        return random.Random(repr(position)).choice(legal)
+
+
+def _seating(strategy_a, strategy_b, team_a):
+    return [
+        (strategy_a if team == team_a else strategy_b)(name, partner=partner, team=team)
+        for name, partner, team in _SEATS
+    ]
+
+
+def play_duplicate(strategy_a, strategy_b, deals, symmetry=None):
+    """
+    Plays the deals (lists of 21 card ids, e.g. a DealStream) in duplicate and returns the RunningStats of A's
+    net points per hand, one value per deal
+    """
+    simulation = MonteCarloSimulation()
+    seatings = [(team_a, _seating(strategy_a, strategy_b, team_a)) for team_a in (1, 2)]
+
+    results = RunningStats()
+    for deal in deals:
+        variants = equivalent_deals(deal, symmetry) if symmetry is not None else [deal]
+        net_points = 0
+        for variant in variants:
+            for team_a, players in seatings:
+                stats = simulation.simulate_deals(1, None, deals=[variant], players=players)
+                net_points += stats.total_points[team_a] - stats.total_points[3 - team_a]
+        results.add(net_points / (2 * len(variants)))
+    return results
+
+
+def _play_chunk(args):
+    """
+    Process pool entry point for play_duplicate
+    """
+    strategy_a, strategy_b, deals, symmetry = args
+    return play_duplicate(strategy_a, strategy_b, deals, symmetry)
+
+
+def run_tournament(strategy_a, strategy_b=Bot, num_deals=10000, seed=None, workers=1, symmetry=None, confidence=0.95, report=True):
+    """
+    Plays num_deals deals of DealStream(seed) in duplicate between two strategies, on a pool of workers processes
+    when workers > 1. Returns {"mean", "se", "ci", "deals"}: A's net points per hand over B, its standard
+    error and confidence interval
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 63)
+    chunks = [
+        (strategy_a, strategy_b, chunk, symmetry)
+        for chunk in DealStream(seed)[:num_deals].chunks(SIMULATION_CHUNK_SIZE)
+    ]
+
+    results = RunningStats()
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk_results in executor.map(_play_chunk, chunks):
+                results.merge(chunk_results)
+    else:
+        for chunk in chunks:
+            results.merge(_play_chunk(chunk))
+
+    margin = z_score(confidence) * results.standard_error
+    summary = {
+        "mean": results.mean,
+        "se": results.standard_error,
+        "ci": (results.mean - margin, results.mean + margin),
+        "deals": results.count,
+    }
+    if report:
+        print(
+            f"{strategy_a.__name__} vs {strategy_b.__name__} over {results.count} duplicate deals (seed {seed}): "
+            f"{summary['mean']:+.4f} points per hand, {confidence:.0%} CI [{summary['ci'][0]:+.4f}, {summary['ci'][1]:+.4f}]"
+        )
+    return summary
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    num_deals = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    run_tournament(Bot, RandomCardBot, num_deals, seed=0, workers=workers)
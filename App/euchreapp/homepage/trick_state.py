@@ -0,0 +1,159 @@
+"""
+Incremental state of the tricks played in a hand.
+
+TrickState is updated once per played card (play) and once per finished trick (finish_trick), and keeps
+everything BotLogic needs to choose a card: the cards seen in finished tricks, the highest remaining card
+of every suit, which suits have been led, and how many tricks have been played and won. When they are known,
+it also holds the players in seat order and the Bidding of the hand, which the searches that deal the hidden
+cards (see pimc) need to place the players and the up card.
+"""
+try:
+    from . import card_engine as engine
+except ImportError:
+    import card_engine as engine
+
+
+# Highest card of every suit before any card is seen, indexed [is_trump][suit]
+_INITIAL_BOSS_CARDS = tuple(
+    tuple(engine.boss_card(suit, 0, is_trump) for suit in range(4))
+    for is_trump in (False, True)
+)
+
+
+class Bidding:
+    """
+    How trump was made: dealer is the dealing player, up_card the id of the card turned up and trump_round the
+    round trump was called in ("1": the dealer picked the up card up, "2": it was turned down). discard is the id
+    of the card the dealer discarded in round 1, which only the dealer knows (None for the other players)
+    """
+    __slots__ = ("dealer", "up_card", "trump_round", "discard")
+
+    def __init__(self, dealer, up_card, trump_round, discard=None):
+        self.dealer = dealer
+        self.up_card = up_card
+        self.trump_round = trump_round
+        self.discard = discard
+
+
+class TrickState:
+    """
+    Cards played so far in a hand, for one trump suit (card ids, see card_engine)
+
+    trick is the current trick as a list of (card id, player), tricks the finished ones and seen the mask of
+    their cards. players are the four players in seat order and bidding the Bidding of the hand, or None when
+    they are not known.
+    Boss cards are cached per suit and only recomputed after a card of that suit is played.
+    """
+    __slots__ = (
+        "trump", "players", "bidding", "trick", "tricks", "seen", "led_suits", "tricks_played", "team_tricks",
+        "_boss_cards",
+    )
+
+    def __init__(self, trump, players=None, bidding=None):
+        self.trump = trump
+        self.players = players
+        self.bidding = bidding
+        self.trick = []
+        self.tricks = []
+        self.seen = 0
+        # Bit per (effective) suit led in a finished trick
+        self.led_suits = 0
+        self.tricks_played = 0
+        # Tricks won by team number
+        self.team_tricks = {}
+        self._boss_cards = [list(_INITIAL_BOSS_CARDS[0]), list(_INITIAL_BOSS_CARDS[1])]
+
+    @classmethod
+    def from_tricks(cls, trump, previous_tricks, played_cards=()):
+        """
+        Builds the state from previous tricks ({trick number: [PlayedCard, ...]}) and the cards played in the current trick
+        """
+        state = cls(trump)
+        for trick_cards in previous_tricks.values():
+            for played_card in trick_cards:
+                state.play(engine.card_id(played_card.card), played_card.player)
+            state.finish_trick()
+        for played_card in played_cards:
+            state.play(engine.card_id(played_card.card), played_card.player)
+        return state
+
+    def copy(self):
+        """
+        Returns a copy that can be played on without changing this state
+        """
+        state = TrickState.__new__(TrickState)
+        state.trump = self.trump
+        state.players = self.players
+        state.bidding = self.bidding
+        state.trick = list(self.trick)
+        state.tricks = list(self.tricks)
+        state.seen = self.seen
+        state.led_suits = self.led_suits
+        state.tricks_played = self.tricks_played
+        state.team_tricks = dict(self.team_tricks)
+        state._boss_cards = [list(self._boss_cards[0]), list(self._boss_cards[1])]
+        return state
+
+    @property
+    def trump_led(self):
+        """
+        True if trump was led in a finished trick
+        """
+        return bool(self.led_suits & (1 << self.trump))
+
+    def play(self, card, player):
+        """
+        Adds a card to the current trick
+        """
+        self.trick.append((card, player))
+
+    def finish_trick(self):
+        """
+        Ends the current trick and returns the player who won it
+        """
+        trick = self.trick
+        cards = [card for card, _ in trick]
+        winner = trick[engine.trick_winner(cards, self.trump)][1]
+
+        self.led_suits |= 1 << engine.EFFECTIVE_SUITS[self.trump][cards[0]]
+
+        # Only the suits a card was played in can have a new boss card (a jack is also the left bower of
+        # the other suit of its colour), those are recomputed the next time they are asked for
+        non_trump_bosses, trump_bosses = self._boss_cards
+        for card in cards:
+            self.seen |= engine.BITS[card]
+            suit = engine.CARD_SUITS[card]
+            non_trump_bosses[suit] = None
+            trump_bosses[suit] = None
+            if engine.CARD_RANKS[card] == engine.JACK:
+                trump_bosses[engine.SUIT_PAIRS[suit]] = None
+
+        team = getattr(winner, "team", None)
+        self.team_tricks[team] = self.team_tricks.get(team, 0) + 1
+        self.tricks_played += 1
+        self.tricks.append(trick)
+        self.trick = []
+        return winner
+
+    def tricks_won(self, team):
+        """
+        Number of finished tricks won by a team
+        """
+        return self.team_tricks.get(team, 0)
+
+    def boss_card(self, suit, is_trump):
+        """
+        Same as card_engine.boss_card(suit, seen, is_trump) for the cards seen in finished tricks
+        """
+        boss_cards = self._boss_cards[is_trump]
+        boss = boss_cards[suit]
+        if boss is None:
+            boss = boss_cards[suit] = engine.boss_card(suit, self.seen, is_trump)
+        return boss
+
+    def is_boss(self, card):
+        """
+        Same as card_engine.is_boss(card, seen, trump) for the cards seen in finished tricks
+        """
+        is_trump = engine.EFFECTIVE_SUITS[self.trump][card] == self.trump
+        return self.boss_card(engine.CARD_SUITS[card], is_trump) == card
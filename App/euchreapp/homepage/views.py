@@ -6,6 +6,8 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from random import shuffle
 from .models import start_euchre_round, Game, Player, Card, deal_hand as model_deal_hand, PlayedCard, reset_round_state, Hand, GameResult, rotate_dealer
+from . import card_engine as engine
+from .trick_state import Bidding, TrickState
 import json
 
 # Render the homepage
@@ -705,36 +707,29 @@ def play_player_card(request):
         player = Player.objects.get(is_human=True)
 
         selected_card_str = request.POST.get("selected_card")
-        if not selected_card_str or " of " not in selected_card_str:
+        if not selected_card_str or selected_card_str not in engine.CARD_IDS_BY_NAME:
             return JsonResponse({"error": "Invalid card format."}, status=400)
         r, s = selected_card_str.split(" of ")
-        card = Card.objects.get(rank=r, suit=s)
+        card = engine.CARD_IDS_BY_NAME[selected_card_str]
 
-        # Validate the player has this card in current hand
-        player_cards_qs = PlayedCard.objects.filter(player=player, hand=dealt_hand).values_list('card', flat=True)
-        if card.id not in player_cards_qs:
+        # Validate the player has this card in current hand (one query for the whole hand, as a card mask)
+        player_cards = PlayedCard.objects.filter(player=player, hand=dealt_hand).values_list('card__rank', 'card__suit')
+        hand_mask = engine.mask_of(engine.CARD_IDS[rank, suit] for rank, suit in player_cards)
+        if not engine.BITS[card] & hand_mask:
             return JsonResponse({"error": "Card not in player hand."}, status=400)
 
-        # Lead suit rule check: determine current lead suit from current_cards
+        # Lead suit rule check: follow the suit of the first card in current_cards if possible (the left bower follows trump)
         current_cards_json = request.POST.get("current_cards")
         current_cards = json.loads(current_cards_json) if current_cards_json else []
         if current_cards:
-            lr, ls = current_cards[0].split(" of ")
-            lead_card = Card.objects.get(rank=lr, suit=ls)
-            lead_suit = lead_card.next_suit() if lead_card.is_left_bower(game.trump_suit) else lead_card.suit
-
-            # Enforce follow suit if possible
-            hand_cards = Card.objects.filter(id__in=player_cards_qs)
-            has_lead = any((c.next_suit() if c.is_left_bower(game.trump_suit) else c.suit) == lead_suit for c in hand_cards)
-            if has_lead:
-                eff_sel = card.next_suit() if card.is_left_bower(game.trump_suit) else card.suit
-                if eff_sel != lead_suit:
-                    return JsonResponse({"error": "Must follow suit."}, status=400)
+            lead_card = engine.CARD_IDS_BY_NAME[current_cards[0]]
+            if not engine.is_legal(card, hand_mask, engine.SUIT_INDEX[game.trump_suit], lead_card):
+                return JsonResponse({"error": "Must follow suit."}, status=400)
 
         # Remove the card from the player's dealt hand (represents playing it)
-        PlayedCard.objects.filter(player=player, hand=dealt_hand, card=card).delete()
+        PlayedCard.objects.filter(player=player, hand=dealt_hand, card__rank=r, card__suit=s).delete()
 
-        return JsonResponse({"played_card": f"{card.rank} of {card.suit}"})
+        return JsonResponse({"played_card": selected_card_str})
     except Exception as e:
         return JsonResponse({"error": f"Internal Server Error: {str(e)}"}, status=500)
 
@@ -752,17 +747,20 @@ def play_bot_card(request):
         current_cards = json.loads(request.POST.get("current_cards") or "[]")
         current_players = json.loads(request.POST.get("current_players") or "[]")  # names, in order
 
-        # Map names to Player instances
-        name_to_player = {p.name: p for p in Player.objects.all()}
+        # Map names to Player instances (players are in seat order, see init_trick)
+        players = list(Player.objects.all())
+        name_to_player = {p.name: p for p in players}
         ordered_players = [name_to_player[name] for name in current_players if name in name_to_player]
 
-        # Build played_cards with proper player mapping for the current trick
-        played_cards = []
-        for i, s in enumerate(current_cards):
-            r, su = s.split(" of ")
-            c = Card.objects.get(rank=r, suit=su)
-            p = ordered_players[i] if i < len(ordered_players) else bot
-            played_cards.append(PlayedCard(player=p, hand=dealt_hand, card=c, order=i+1))
+        # How trump was made, for the card play searches to place the up card (the discard is the dealer's to know)
+        bidding = None
+        up_card = request.POST.get("up_card")
+        trump_round = request.POST.get("trump_round")
+        if up_card in engine.CARD_IDS_BY_NAME and trump_round in ("1", "2") and game.dealer is not None:
+            discard = request.POST.get("discarded_card") if bot.name == game.dealer.name else None
+            bidding = Bidding(
+                game.dealer, engine.CARD_IDS_BY_NAME[up_card], trump_round, engine.CARD_IDS_BY_NAME.get(discard)
+            )
 
         # Bot hand = remaining cards in dealt hand
         bot_cards_ids = PlayedCard.objects.filter(player=bot, hand=dealt_hand).values_list('card', flat=True)
@@ -770,40 +768,33 @@ def play_bot_card(request):
         if not bot_hand:
             return JsonResponse({"error": "Bot hand is empty."}, status=500)
 
-        # Previous tricks from frontend
+        # Replay the previous tricks from the frontend, then the current trick, into the trick state
+        # (cards are looked up by name, so this needs no database queries)
+        state = TrickState(engine.SUIT_INDEX[game.trump_suit], players, bidding)
         prev_tricks_json = json.loads(request.POST.get("previous_tricks") or "[]")
-        # Convert to {trick_number: [PlayedCard,...]} with correct player assignment
-        previous_tricks = {}
         for t in prev_tricks_json:
-            tnum = t.get("trick_number")
             t_players = t.get("players", [])
-            t_cards = t.get("cards", [])
-            trick_pcs = []
-            for i, s in enumerate(t_cards):
-                r, su = s.split(" of ")
-                c = Card.objects.get(rank=r, suit=su)
-                p = name_to_player.get(t_players[i], bot)
-                trick_pcs.append(PlayedCard(player=p, hand=dealt_hand, card=c, order=i+1))
-            previous_tricks[tnum or len(previous_tricks)+1] = trick_pcs
+            for i, s in enumerate(t.get("cards", [])):
+                state.play(engine.CARD_IDS_BY_NAME[s], name_to_player.get(t_players[i], bot))
+            if state.trick:
+                state.finish_trick()
+
+        for i, s in enumerate(current_cards):
+            p = ordered_players[i] if i < len(ordered_players) else bot
+            state.play(engine.CARD_IDS_BY_NAME[s], p)
 
         # Trump caller and going alone context
         trump_caller_name = request.POST.get("trump_caller")
         going_alone = request.POST.get("going_alone") == "true"
         trump_caller = name_to_player.get(trump_caller_name, None)
 
-        # Compute tricks_won per team from previous_tricks
-        team1_names = {"Player", "Team Mate"}
-        team2_names = {"Opponent1", "Opponent2"}
-        team1_tricks = sum(1 for t in prev_tricks_json if t.get("winner") in team1_names)
-        team2_tricks = sum(1 for t in prev_tricks_json if t.get("winner") in team2_names)
-        tricks_won = team1_tricks if bot.team == 1 else team2_tricks
+        # Tricks won by the bot's team in the previous tricks
+        tricks_won = state.tricks_won(bot.team)
 
         # Use the BotLogic implementation on Player (Player inherits BotLogic)
-        chosen = bot.determine_best_card(
+        chosen = bot.determine_best_card_from_state(
             bot_hand,
-            game.trump_suit,
-            played_cards,
-            previous_tricks,
+            state,
             trump_caller,
             going_alone,
             tricks_won
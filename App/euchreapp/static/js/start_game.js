@@ -5,6 +5,8 @@ $(document).ready(function () {
     let trumpSelected = false;
     let gameResponse = null;
     let kitty = [] // Store the global response object here
+    // How trump was made, sent with the bot card plays so their searches know where the up card went
+    let bidding = { upCard: null, trumpRound: null, discardedCard: null };
     let adminMode = false;
 
     $('.ui.toggle.checkbox').checkbox();
@@ -276,6 +278,7 @@ $(document).ready(function () {
         } else if (trumpRound === 2) {
             data.suit = card;
         }        
+        const calledRound = trumpRound;
         trumpRound = 1; // Reset the trump round to 1 after accepting trump
 
         $.ajax({
@@ -286,6 +289,11 @@ $(document).ready(function () {
                 trumpSelected = true;
                 currentSuit = response.trump_suit;
                 dealer = response.dealer;
+                bidding = {
+                    upCard: gameResponse.remaining_cards[0],
+                    trumpRound: calledRound,
+                    discardedCard: response.discarded_card || null
+                };
 
                 // Update and display the kitty after the dealer picks up and discards
                 kitty[0].faceup = false;
@@ -935,7 +943,10 @@ $(document).ready(function () {
                         current_players: JSON.stringify(trickContext.players),
                         previous_tricks: JSON.stringify(roundState.tricks),
                         trump_caller: roundState.trumpCaller,
-                        going_alone: roundState.goingAlone
+                        going_alone: roundState.goingAlone,
+                        up_card: bidding.upCard || "",
+                        trump_round: bidding.trumpRound || "",
+                        discarded_card: bidding.discardedCard || ""
                     },
                     success: function (response) {
                         if (response.error) {